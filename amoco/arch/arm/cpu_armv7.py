@@ -9,6 +9,7 @@ from amoco.arch.arm.v7.asm import *
 # expose "microarchitecture" (instructions semantics)
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_armv7 = type("instruction_armv7", (instruction,), {})
@@ -28,6 +29,9 @@ endian = lambda: 1 if internals["ibigend"] == 0 else -1
 
 disassemble = disassembler([spec_armv7, spec_thumb], instruction_armv7, mode, endian)
 
+if "armv7" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return pc_
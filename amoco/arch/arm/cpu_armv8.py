@@ -9,6 +9,7 @@ from amoco.arch.arm.v8.asm64 import *
 # expose "microarchitecture" (instructions semantics)
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_armv8 = type("instruction_armv8", (instruction,), {})
@@ -24,6 +25,9 @@ endian = lambda: 1 if internals["ibigend"] == 0 else -1
 
 disassemble = disassembler([spec_armv8], endian=endian, iclass=instruction_armv8)
 
+if "armv8" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return pc
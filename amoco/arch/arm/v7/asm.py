@@ -39,11 +39,11 @@ def __check_state(i, fmap):
         )
 
 
-def __mem(a, sz):
+def __mem(a, sz, disp=0):
     endian = 1
     if internals["endianstate"] == 1:
         endian = -1
-    return mem(a, sz, endian=endian)
+    return mem(a, sz, disp=disp, endian=endian)
 
 
 def __pre(i, fmap, _ld=False):
@@ -915,42 +915,36 @@ def i_STRHT(i, fmap):
 
 def i_LDM(i, fmap):
     cond, src, dests = __pre(i, fmap)
-    _adr = __mem(src, 32)
-    for _r in dests:
+    for k, _r in enumerate(dests):
+        _adr = __mem(src, 32, 4 * k)
         fmap[_r] = stst(cond, fmap(_adr), fmap(_r))
-        _adr.a.disp += 4
     if i.wback:
         fmap[src] = stst(cond, fmap(src + 4 * len(dests)), fmap(src))
 
 
 def i_LDMDB(i, fmap):
     cond, src, dests = __pre(i, fmap)
-    _adr = __mem(src, 32)
-    _adr.a.disp -= 4 * len(dests)
-    for _r in dests:
+    for k, _r in enumerate(dests):
+        _adr = __mem(src, 32, 4 * (k - len(dests)))
         fmap[_r] = stst(cond, fmap(_adr), fmap(_r))
-        _adr.a.disp += 4
     if i.wback:
         fmap[src] = stst(cond, fmap(src - 4 * len(dests)), fmap(src))
 
 
 def i_STM(i, fmap):
     cond, dest, srcs = __pre(i, fmap)
-    _adr = __mem(dest, 32)
-    for _r in srcs:
+    for k, _r in enumerate(srcs):
+        _adr = __mem(dest, 32, 4 * k)
         fmap[_adr] = stst(cond, fmap(_r), fmap(_adr))
-        _adr.a.disp += 4
     if i.wback:
         fmap[dest] = stst(cond, fmap(dest + 4 * len(srcs)), fmap(dest))
 
 
 def i_STMDB(i, fmap):
     cond, dest, srcs = __pre(i, fmap)
-    _adr = __mem(dest, 32)
-    _adr.a.disp -= 4 * len(srcs)
-    for _r in srcs:
+    for k, _r in enumerate(srcs):
+        _adr = __mem(dest, 32, 4 * (k - len(srcs)))
         fmap[_adr] = stst(cond, fmap(_r), fmap(_adr))
-        _adr.a.disp += 4
     if i.wback:
         fmap[dest] = stst(cond, fmap(dest - 4 * len(srcs)), fmap(dest))
 
@@ -13,6 +13,8 @@ for the definition of new cpu architectures:
 - the :class:`ispec` class is a function decorator that allows to define the \
         specification of an instruction.
 - the :class:`Formatter` class is used for instruction pretty printing
+- the :class:`SpecCache` class allows to save parsed ispecs and disassemblers' \
+        trees on disk to speed up later imports.
 
 """
 
@@ -20,9 +22,13 @@ for the definition of new cpu architectures:
 # Copyright (C) 2006-2014 Axel Tillequin (bdcht3@gmail.com)
 # published under GPLv2 license
 
+import os
+import sys
 import inspect
 import importlib
 import codecs
+import hashlib
+import pickle
 from types import FunctionType
 from collections import defaultdict
 from functools import reduce
@@ -30,6 +36,7 @@ import pyparsing as pp
 
 from crysp.bits import Bits, pack, unpack
 
+from amoco.config import conf
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -71,7 +78,16 @@ class icore(object):
          operands (list): the list of operands' expressions.
          misc (dict)    : a defaultdict for passing various arch-dependent infos
                           (which returns None for undefined keys.)
+
+       Note:
+         The semantics function of an instruction is bound when the instruction
+         is decoded (see :meth:`bind`) and the mapper of this semantics applied
+         to the identity mapper is compiled on demand (see :meth:`template`.)
     """
+
+    _sem = None
+    _tpl = None
+
     def __init__(self, istr=b""):
         self.bytes = bytes(istr)
         self.type = type_undefined
@@ -91,20 +107,69 @@ class icore(object):
         "returns the instruction's type as a string"
         return INSTRUCTION_TYPES[self.type]
 
+    def __getstate__(self):
+        D = dict(self.__dict__)
+        D.pop("_sem", None)
+        D.pop("_tpl", None)
+        return D
+
+    def bind(self):
+        """binds the uarch[mnemonic] semantics function (or None) to the
+           instruction. This is done by the disassembler so that calling the
+           instruction doesn't need to lookup the uarch dict.
+        """
+        uarch = getattr(self, "_uarch", {})
+        self._sem = (self.mnemonic, uarch.get("i_%s" % self.mnemonic, None))
+        self._tpl = None
+        return self._sem
+
     def __call__(self, fmap):
         """calls the uarch[mnemonic] semantics function for this instruction
            or warns if no semantics is found.
         """
         if self.type in (type_undefined, type_unpredictable):
             logger.error("%s instruction" % self.typename())
-        try:
-            i_xxx = self._uarch["i_%s" % self.mnemonic]
-        except AttributeError:
-            logger.warning("no uarch defined (%s)" % self.mnemonic)
-        except KeyError:
-            logger.warning("instruction %s not implemented" % self.mnemonic)
+        s = self._sem
+        if s is None or s[0] != self.mnemonic:
+            s = self.bind()
+        if s[1] is None:
+            if not hasattr(self, "_uarch"):
+                logger.warning("no uarch defined (%s)" % self.mnemonic)
+            else:
+                logger.warning("instruction %s not implemented" % self.mnemonic)
         else:
-            i_xxx(self, fmap)
+            s[1](self, fmap)
+
+    def template(self):
+        """returns the mapper of the instruction's semantics applied to the
+           identity mapper. This template is compiled once for the current
+           address of the instruction and configuration of the mapper (see
+           conf.Cas and conf.Arch.lazyflags) and is then shared by all mappers
+           that start with this instruction (see :class:`cas.mapper.mapper`.)
+           It must not be modified.
+        """
+        from amoco.cas.expressions import identical
+
+        a = getattr(self, "address", None)
+        if getattr(a, "_is_cst", False):
+            # addresses are compared by value (not by object):
+            a = (a.v, a.size)
+        key = (
+            self.mnemonic,
+            a,
+            conf.Cas.noaliasing,
+            conf.Cas.memtrace,
+            conf.Cas.complexity,
+            conf.Arch.lazyflags,
+        )
+        t = self._tpl
+        if t is None or not identical(t[0], key):
+            from amoco.cas.mapper import mapper
+
+            m = mapper()
+            self(m)
+            t = self._tpl = (key, m)
+        return t[1]
 
     @property
     def length(self):
@@ -214,6 +279,10 @@ class disassembler(object):
       iset: the lambda used to select the right specifications for decoding
       endian: the lambda used to define endianess.
       specs: the *tree* of :class:`ispec` objects that defines the cpu architecture.
+      ispecs: the lists of :class:`ispec` objects (sorted from high to low
+              constrained) for each set.
+      ctables: the dict of compiled dispatch tables for each (iset,endian) pair,
+               or None if the disassembler is not compiled (see :meth:`compile`.)
     """
 
     def __init__(
@@ -232,7 +301,10 @@ class disassembler(object):
         # build ispecs tree for each set:
         logger.debug("building specs tree for modules %s", [m.__name__ for m in specmodules])
         # self.indent = 0
-        self.specs = [self.setup(m.ISPECS) for m in specmodules]
+        self.specs = [speccache.tree(self, m.ISPECS) for m in specmodules]
+        self.ispecs = [m.ISPECS for m in specmodules]
+        speccache.save()
+        self.ctables = None
         # del self.indent
         # some arch like x86 require a stateful decoding due to optional prefixes,
         # so we keep an __i instruction for decoding until a non prefix ispec is used.
@@ -285,7 +357,49 @@ class disassembler(object):
         # self.indent -=2
         return (f, l)
 
+    def compile(self):
+        """compile will switch the disassembler to use flat dispatch tables
+        rather than the specs tree. For a given (iset,endian) pair, the
+        compiled table is built on first use (see :meth:`setup_table`.)
+        """
+        self.ctables = {}
+
+    def uncompile(self):
+        "switch back to the specs tree decoder."
+        self.ctables = None
+
+    def setup_table(self, ispecs, e):
+        """setup_table returns a flat dispatch table (shift,table) for the provided
+        ispecs list. All masks and fixed values are precomputed as python ints
+        (maxlen-justified in bigendian cases, like in :meth:`setup`). The table
+        is indexed by the value of the "most constrained" byte located at bit
+        offset shift in the input integer, and each entry provides the tuple of
+        (mask,fix,length,ispec) candidates ordered from high to low constrained.
+        """
+        if e == -1:
+            maxsize = self.maxlen * 8
+            adjust = lambda x: x.ival << (maxsize - x.size)
+        else:
+            adjust = lambda x: x.ival
+        C = [(adjust(s.mask), adjust(s.fix), s.fix.size // 8, s) for s in ispecs]
+        # find the byte with the highest count of fixed bits:
+        shift, w = 0, -1
+        for pos in range(0, self.maxlen * 8, 8):
+            x = sum((bin((c[0] >> pos) & 0xFF).count("1") for c in C))
+            if x > w:
+                shift, w = pos, x
+        table = []
+        shared = {}
+        for v in range(256):
+            L = tuple(
+                (c for c in C if (v & (c[0] >> shift) & 0xFF) == (c[1] >> shift) & 0xFF)
+            )
+            table.append(shared.setdefault(L, L))
+        return (shift, table)
+
     def __call__(self, bytestring, **kargs):
+        if self.ctables is not None:
+            return self.decode_compiled(bytestring, **kargs)
         e = self.endian(**kargs)
         adjust = lambda x: x.ival
         bs = bytestring[0:self.maxlen]
@@ -316,6 +430,7 @@ class disassembler(object):
                     self.__i = None
                     if "address" in kargs:
                         i.address = kargs["address"]
+                    i.bind()
                     return i
                 logger.debug(
                     "no instruction spec matching %s"
@@ -329,6 +444,70 @@ class disassembler(object):
         self.__i = None
         return None
 
+    def iter_buffer(self, buf, base_address=0, **kargs):
+        """iterator over instructions linearly decoded from the provided
+        buffer (bytes, bytearray or memoryview). Only a maxlen-bytes window
+        of the buffer is copied for each decoded instruction, and the address
+        of each instruction is set to base_address plus its offset in buf.
+
+        Yields:
+            instructions decoded from offset 0 until the end of buf or
+            until bytes at current offset can't be decoded.
+        """
+        mv = memoryview(buf)
+        n = len(mv)
+        maxlen = self.maxlen
+        p = 0
+        while p < n:
+            i = self(bytes(mv[p : p + maxlen]), **kargs)
+            if i is None:
+                break
+            i.address = base_address + p
+            p += i.length
+            yield i
+
+    def decode_compiled(self, bytestring, **kargs):
+        """decode the bytestring with the compiled dispatch tables: the input
+        bytes are converted to a python int only once, and every candidate ispec
+        is checked by integer mask comparison before its decode method (which
+        builds the Bits object) is called.
+        """
+        e = self.endian(**kargs)
+        k = (self.iset(**kargs), e)
+        try:
+            shift, table = self.ctables[k]
+        except KeyError:
+            shift, table = self.ctables[k] = self.setup_table(self.ispecs[k[0]], e)
+        bs = bytestring[0:self.maxlen]
+        if e == -1:
+            b = int.from_bytes(bs, "big") << ((self.maxlen - len(bs)) * 8)
+        else:
+            b = int.from_bytes(bs, "little")
+        n = len(bytestring)
+        for m, f, l, s in table[(b >> shift) & 0xFF]:
+            if (b & m) != f or n < l:
+                continue
+            try:
+                i = s.decode(bytestring, e, i=self.__i, iclass=self.iclass, check=False)
+            except (DecodeError, InstructionError):
+                continue
+            if i.spec.pfx is True:
+                if self.__i is None:
+                    self.__i = i
+                return self(bytestring[l:], **kargs)
+            elif i.spec.pfx == "xdata":
+                i.xdata(i,**kargs)
+            self.__i = None
+            if "address" in kargs:
+                i.address = kargs["address"]
+            i.bind()
+            return i
+        logger.debug(
+            "no instruction spec matching %s" % (codecs.encode(bytes(bs), "hex"))
+        )
+        self.__i = None
+        return None
+
 
 # -----------------------------------------
 
@@ -499,7 +678,11 @@ class ispec(object):
                     self.fargs[k] = v
             else:
                 self.iattr[k] = v
-        self.ast = self.buildspec()
+        # if specs are cached, the format is parsed when the decorated
+        # function is known, since formats are cached by its module:
+        self.ast = None
+        if not conf.Arch.cachedir:
+            self.ast = self.buildspec()
 
     def fixed(self):
         s = list(str(self.fix))
@@ -510,8 +693,8 @@ class ispec(object):
             s.reverse()
         return "".join(s)
 
-    def buildspec(self):
-        ast = specdecode.parseString(self.format, True)
+    def buildspec(self, modname=None):
+        ast = speccache.parse(self, modname)
         size, direction = ast[0]
         self.size = size
         fmt = ast[1]
@@ -609,8 +792,8 @@ class ispec(object):
         return ast
 
     # decode always receive input bytes in ascending memory order
-    def decode(self, istr, endian=1, i=None, iclass=instruction):
-        # check spec :
+    def decode(self, istr, endian=1, i=None, iclass=instruction, check=True):
+        # check spec (unless already done by a compiled disassembler):
         blen = self.fix.size // 8
         if len(istr) < blen:
             raise DecodeError
@@ -618,7 +801,7 @@ class ispec(object):
         # Bits object created with LSB to MSB byte string:
         ival = bs[::endian]
         b = Bits(ival, self.fix.size, bitorder=1)
-        if b & self.mask != self.fix:
+        if check and b & self.mask != self.fix:
             raise DecodeError
         if self.size == 0:  # variable length spec:
             if endian != 1:
@@ -663,6 +846,8 @@ class ispec(object):
 
     # decorate:
     def __call__(self, handler):
+        if self.ast is None:
+            self.ast = self.buildspec(handler.__module__)
         m = inspect.getmodule(handler)
         ispec_register(self, m)
         varnames = handler.__code__.co_varnames
@@ -751,6 +936,150 @@ specmore = pp.Optional(pp.Literal("&").setParseAction(lambda r: "xdata"), defaul
 specdecode = speclen + specformat + specoption + specmore
 
 
+class SpecCache(object):
+    """SpecCache holds the parsed formats of ispecs and the decoding trees
+    of disassemblers. If conf.Arch.cachedir is not "", these data are saved
+    in this directory so that later imports of the same spec modules avoid
+    parsing all formats (with pyparsing) and building the disassembler's trees.
+
+    The data associated to a spec module is saved in file '<module name>.specs'
+    along with a hash of the module's source (and of this core module's source.)
+    If this hash doesn't match the hash of current sources, the data is
+    stale and is just replaced by newly parsed formats and trees.
+
+    Attributes:
+        entries (dict): the cached data for each spec module name, as a dict
+                        with keys 'hash', 'specs' (the ast of each format) and
+                        'trees' (the trees of each disassembler.)
+        dirty (set): names of spec modules that need to be saved.
+    """
+
+    VERSION = 1
+
+    def __init__(self):
+        self.entries = {}
+        self.dirty = set()
+        self._core = None
+
+    def entry(self, modname, filename=None):
+        "get the cached data associated to the given spec module name"
+        e = self.entries.get(modname, None)
+        if e is not None:
+            return e
+        if filename is None:
+            filename = getattr(sys.modules.get(modname, None), "__file__", None)
+        if filename is None:
+            return None
+        if self._core is None:
+            with open(__file__, "rb") as f:
+                self._core = hashlib.sha256(f.read()).hexdigest()
+        h = hashlib.sha256(("%d:%s:" % (self.VERSION, self._core)).encode())
+        with open(filename, "rb") as f:
+            h.update(f.read())
+        h = h.hexdigest()
+        e = {"hash": h, "specs": {}, "trees": {}}
+        cached = os.path.join(os.path.expanduser(conf.Arch.cachedir), modname + ".specs")
+        if os.path.exists(cached):
+            try:
+                with open(cached, "rb") as f:
+                    D = pickle.load(f)
+            except Exception:
+                logger.warning("can't load specs cache file %s" % cached)
+            else:
+                if D.get("hash", None) == h:
+                    logger.verbose("loading %s specs from cache" % modname)
+                    e = D
+                else:
+                    logger.verbose("%s specs cache is stale" % modname)
+        self.entries[modname] = e
+        return e
+
+    def parse(self, spec, modname=None):
+        """returns the (cached) ast of the spec format. The spec module
+        modname is the module of the function decorated by the ispec.
+        """
+        if not conf.Arch.cachedir or modname is None:
+            return specdecode.parseString(spec.format, True)
+        e = self.entry(modname)
+        if e is None:
+            return specdecode.parseString(spec.format, True)
+        try:
+            ast = e["specs"][spec.format]
+        except KeyError:
+            ast = specdecode.parseString(spec.format, True).asList()
+            e["specs"][spec.format] = ast
+            self.dirty.add(modname)
+        return ast
+
+    def tree(self, d, ispecs):
+        """returns the (cached) specs tree of disassembler d for the
+        provided ispecs list. (Note that, as with the disassembler.setup
+        method, the ispecs list is sorted in place.)
+        """
+        if not conf.Arch.cachedir:
+            return d.setup(ispecs)
+        mods = []
+        for s in ispecs:
+            m = s.hook.__module__
+            if m not in mods:
+                mods.append(m)
+        E = [self.entry(m) for m in mods]
+        if None in E:
+            return d.setup(ispecs)
+        k = hashlib.sha256(
+            ("%d:%d:" % (d.maxlen, d.endian())).encode()
+            + "".join((e["hash"] for e in E)).encode()
+        ).hexdigest()
+        e = E[0]
+        try:
+            order, t = e["trees"][k]
+            assert len(order) == len(ispecs)
+        except (KeyError, AssertionError):
+            pass
+        else:
+            L = list(ispecs)
+            ispecs[:] = [L[i] for i in order]
+            return self.loadtree(t, L)
+        L = list(ispecs)
+        t = d.setup(ispecs)
+        index = dict(((id(s), i) for (i, s) in enumerate(L)))
+        e["trees"][k] = ([index[id(s)] for s in ispecs], self.dumptree(t, index))
+        self.dirty.add(mods[0])
+        return t
+
+    def dumptree(self, t, index):
+        f, l = t
+        if f == 0:
+            return (0, [index[id(s)] for s in l])
+        return (f, dict(((x, self.dumptree(st, index)) for (x, st) in l.items())))
+
+    def loadtree(self, t, L):
+        f, l = t
+        if f == 0:
+            return (0, [L[i] for i in l])
+        return (f, dict(((x, self.loadtree(st, L)) for (x, st) in l.items())))
+
+    def save(self):
+        "save all modified entries in the cache directory"
+        if not (conf.Arch.cachedir and self.dirty):
+            return
+        path = os.path.expanduser(conf.Arch.cachedir)
+        try:
+            os.makedirs(path, exist_ok=True)
+            for modname in self.dirty:
+                cached = os.path.join(path, modname + ".specs")
+                with open(cached + ".tmp", "wb") as f:
+                    pickle.dump(self.entries[modname], f)
+                os.replace(cached + ".tmp", cached)
+                logger.verbose("specs cache file %s saved" % cached)
+        except OSError as err:
+            logger.warning("can't save specs cache: %s" % err)
+        self.dirty = set()
+
+
+speccache = SpecCache()
+
+
 def ispec_register(x, module):
     F = []
     try:
@@ -6,6 +6,7 @@ from amoco.arch.riscv.rv32i.asm import *
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
 # import specifications:
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_riscv = type("instruction_riscv", (instruction,), {})
@@ -21,6 +22,9 @@ from amoco.arch.riscv.rv32i import spec_rv32i
 
 disassemble = disassembler([spec_rv32i], iclass=instruction_riscv)
 
+if "riscv" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return pc
@@ -6,6 +6,7 @@ from amoco.arch.riscv.rv64i.asm import *
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
 # import specifications:
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_riscv64 = type("instruction_riscv64", (instruction,), {})
@@ -21,6 +22,9 @@ from amoco.arch.riscv.rv64i import spec_rv64i
 
 disassemble = disassembler([spec_rv64i], iclass=instruction_riscv64)
 
+if "riscv" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return pc
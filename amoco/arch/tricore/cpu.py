@@ -6,6 +6,7 @@ from amoco.arch.tricore.asm import *
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
 # import specifications:
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_tricore = type("instruction_tricore", (instruction,), {})
@@ -20,6 +21,9 @@ from amoco.arch.tricore import spec
 
 disassemble = disassembler([spec], iclass=instruction_tricore)
 
+if "tricore" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return pc
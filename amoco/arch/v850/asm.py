@@ -575,15 +575,13 @@ def i_DISPOSE(i, fmap):
         dst = i.operands[2]
         fmap[pc] = fmap(dst)
     src, L = i.operands[0:2]
-    x = src.a.disp
+    disp = 0
     # set regs:
     for r in L:
-        fmap[r] = fmap(src)
-        src.a.disp += 4
+        fmap[r] = fmap(mem(src.a, src.size, disp=disp, endian=src.endian))
+        disp += 4
     # update sp:
-    fmap[sp] = fmap(src.a.base + src.a.disp)
-    # restore original operand:
-    src.a.disp = x
+    fmap[sp] = fmap(src.a.base + (src.a.disp + disp))
 
 
 @_pc
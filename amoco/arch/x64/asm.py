@@ -50,6 +50,88 @@ def halfborrow(x, y, c=None):
     return carry
 
 
+# ------------------------------------------------------------------------------
+# flags of arithmetic and logic instructions are given by the _flags_*
+# functions below. Unless conf.Arch.lazyflags is True, they are computed and
+# written to the mapper by _setflags, otherwise the mapper only records the
+# function and its arguments until flags are read (see mapper.lazy.)
+_ALUFLAGS = (cf, pf, af, zf, sf, of)
+_LOGICFLAGS = (cf, pf, zf, sf, of)
+
+
+def _setflags(fmap, locs, f, *args):
+    if conf.Arch.lazyflags:
+        fmap.lazy(locs, f, *args)
+    else:
+        v = f(*args)
+        for k in locs:
+            fmap[k] = v[k]
+
+
+def _add(a, b, c=None):
+    "returns the result of AddWithCarry(a, b, c) (without carry & overflow)"
+    if c is None:
+        c = bit0
+    a.sf = b.sf = True
+    x = a + b + c.zeroextend(b.size)
+    x.sf = True
+    return x
+
+
+def _sub(a, b, c=None):
+    "returns the result of SubWithBorrow(a, b, c) (without carry & overflow)"
+    if c is None:
+        c = bit0
+    a.sf = b.sf = True
+    x = a - b - c.zeroextend(b.size)
+    x.sf = True
+    return x
+
+
+def _flags_add(x, a, b, c=None):
+    _r, carry, overflow = AddWithCarry(a, b, c)
+    return {
+        cf: carry,
+        pf: parity8(x[0:8]),
+        af: halfcarry(a, b, c),
+        zf: x == 0,
+        sf: x < 0,
+        of: overflow,
+    }
+
+
+def _flags_sub(x, a, b, c=None):
+    _r, carry, overflow = SubWithBorrow(a, b, c)
+    return {
+        cf: carry,
+        pf: parity8(x[0:8]),
+        af: halfborrow(a, b, c),
+        zf: x == 0,
+        sf: x < 0,
+        of: overflow,
+    }
+
+
+def _flags_neg(x, a, b):
+    v = _flags_sub(x, a, b)
+    v[cf] = b != 0
+    return v
+
+
+def _flags_logic(x):
+    return {cf: bit0, pf: parity8(x[0:8]), zf: x == 0, sf: x < 0, of: bit0}
+
+
+def _flags_test(x):
+    return {
+        cf: bit0,
+        pf: parity8(x[0:8]),
+        zf: x == 0,
+        sf: x[x.size - 1 : x.size],
+        of: bit0,
+    }
+
+
 # see Intel doc vol.1 §3.4.1.1 about 32-bits operands.
 def _r32_zx64(op1, x):
     if op1.size == 32 and op1._is_reg:
@@ -582,13 +664,9 @@ def i_INC(i, fmap):
     op1 = i.operands[0]
     a = fmap(op1)
     b = cst(1, a.size)
-    x, carry, overflow = AddWithCarry(a, b)
+    x = _add(a, b)
     # cf not affected
-    fmap[af] = halfcarry(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    _setflags(fmap, (pf, af, zf, sf, of), _flags_add, x, a, b)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -598,13 +676,9 @@ def i_DEC(i, fmap):
     op1 = i.operands[0]
     a = fmap(op1)
     b = cst(1, a.size)
-    x, carry, overflow = SubWithBorrow(a, b)
+    x = _sub(a, b)
     # cf not affected
-    fmap[af] = halfborrow(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    _setflags(fmap, (pf, af, zf, sf, of), _flags_sub, x, a, b)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -614,13 +688,8 @@ def i_NEG(i, fmap):
     op1 = i.operands[0]
     a = cst(0, op1.size)
     b = fmap(op1)
-    x, carry, overflow = SubWithBorrow(a, b)
-    fmap[af] = halfborrow(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[cf] = b != 0
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    x = _sub(a, b)
+    _setflags(fmap, _ALUFLAGS, _flags_neg, x, a, b)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -698,13 +767,8 @@ def i_ADC(i, fmap):
     op2 = fmap(i.operands[1])
     a = fmap(op1)
     c = fmap(cf)
-    x, carry, overflow = AddWithCarry(a, op2, c)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfcarry(a, op2, c)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _add(a, op2, c)
+    _setflags(fmap, _ALUFLAGS, _flags_add, x, a, op2, c)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -714,13 +778,8 @@ def i_ADD(i, fmap):
     op1 = i.operands[0]
     op2 = fmap(i.operands[1])
     a = fmap(op1)
-    x, carry, overflow = AddWithCarry(a, op2)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfcarry(a, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _add(a, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_add, x, a, op2)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -731,13 +790,8 @@ def i_SBB(i, fmap):
     op2 = fmap(i.operands[1])
     a = fmap(op1)
     c = fmap(cf)
-    x, carry, overflow = SubWithBorrow(a, op2, c)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfborrow(a, op2, c)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _sub(a, op2, c)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, a, op2, c)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -747,13 +801,8 @@ def i_SUB(i, fmap):
     op1 = i.operands[0]
     op2 = fmap(i.operands[1])
     a = fmap(op1)
-    x, carry, overflow = SubWithBorrow(a, op2)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfborrow(a, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _sub(a, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, a, op2)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -765,11 +814,7 @@ def i_AND(i, fmap):
     if op2.size < op1.size:
         op2 = op2.signextend(op1.size)
     x = fmap(op1) & op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -779,11 +824,7 @@ def i_OR(i, fmap):
     op1 = i.operands[0]
     op2 = fmap(i.operands[1])
     x = fmap(op1) | op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -793,11 +834,7 @@ def i_XOR(i, fmap):
     op1 = i.operands[0]
     op2 = fmap(i.operands[1])
     x = fmap(op1) ^ op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     op1, x = _r32_zx64(op1, x)
     fmap[op1] = x
 
@@ -806,13 +843,8 @@ def i_CMP(i, fmap):
     fmap[rip] = fmap[rip] + i.length
     op1 = fmap(i.operands[0])
     op2 = fmap(i.operands[1])
-    x, carry, overflow = SubWithBorrow(op1, op2)
-    fmap[af] = halfborrow(op1, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
-    fmap[pf] = parity8(x[0:8])
+    x = _sub(op1, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, op1, op2)
 
 
 def i_CMPXCHG(i, fmap):
@@ -864,11 +896,7 @@ def i_TEST(i, fmap):
     op1 = fmap(i.operands[0])
     op2 = fmap(i.operands[1])
     x = op1 & op2
-    fmap[zf] = x == 0
-    fmap[sf] = x[x.size - 1 : x.size]
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_test, x)
 
 
 def i_LEA(i, fmap):
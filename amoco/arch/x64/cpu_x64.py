@@ -5,6 +5,7 @@ from amoco.arch.x64.asm import *
 # expose "microarchitecture" (instructions semantics)
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_x64 = type("instruction_x64", (instruction,), {})
@@ -18,6 +19,9 @@ from amoco.arch.x64 import spec_ia32e
 disassemble = disassembler([spec_ia32e], iclass=instruction_x64)
 disassemble.maxlen = 15
 
+if "x64" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return rip
@@ -49,6 +49,88 @@ def halfborrow(x, y, c=None):
     return carry
 
 
+# ------------------------------------------------------------------------------
+# flags of arithmetic and logic instructions are given by the _flags_*
+# functions below. Unless conf.Arch.lazyflags is True, they are computed and
+# written to the mapper by _setflags, otherwise the mapper only records the
+# function and its arguments until flags are read (see mapper.lazy.)
+_ALUFLAGS = (cf, pf, af, zf, sf, of)
+_LOGICFLAGS = (cf, pf, zf, sf, of)
+
+
+def _setflags(fmap, locs, f, *args):
+    if conf.Arch.lazyflags:
+        fmap.lazy(locs, f, *args)
+    else:
+        v = f(*args)
+        for k in locs:
+            fmap[k] = v[k]
+
+
+def _add(a, b, c=None):
+    "returns the result of AddWithCarry(a, b, c) (without carry & overflow)"
+    if c is None:
+        c = bit0
+    a.sf = b.sf = True
+    x = a + b + c.zeroextend(b.size)
+    x.sf = True
+    return x
+
+
+def _sub(a, b, c=None):
+    "returns the result of SubWithBorrow(a, b, c) (without carry & overflow)"
+    if c is None:
+        c = bit0
+    a.sf = b.sf = True
+    x = a - b - c.zeroextend(b.size)
+    x.sf = True
+    return x
+
+
+def _flags_add(x, a, b, c=None):
+    _r, carry, overflow = AddWithCarry(a, b, c)
+    return {
+        cf: carry,
+        pf: parity8(x[0:8]),
+        af: halfcarry(a, b, c),
+        zf: x == 0,
+        sf: x < 0,
+        of: overflow,
+    }
+
+
+def _flags_sub(x, a, b, c=None):
+    _r, carry, overflow = SubWithBorrow(a, b, c)
+    return {
+        cf: carry,
+        pf: parity8(x[0:8]),
+        af: halfborrow(a, b, c),
+        zf: x == 0,
+        sf: x < 0,
+        of: overflow,
+    }
+
+
+def _flags_neg(x, a, b):
+    v = _flags_sub(x, a, b)
+    v[cf] = b != 0
+    return v
+
+
+def _flags_logic(x):
+    return {cf: bit0, pf: parity8(x[0:8]), zf: x == 0, sf: x < 0, of: bit0}
+
+
+def _flags_test(x):
+    return {
+        cf: bit0,
+        pf: parity8(x[0:8]),
+        zf: x == 0,
+        sf: x[x.size - 1 : x.size],
+        of: bit0,
+    }
+
+
 # ------------------------------------------------------------------------------
 def i_AAA(i, fmap):
     fmap[eip] = fmap[eip] + i.length
@@ -647,13 +729,9 @@ def i_INC(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
     b = cst(1, a.size)
-    x, carry, overflow = AddWithCarry(a, b)
+    x = _add(a, b)
     # cf not affected
-    fmap[af] = halfcarry(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    _setflags(fmap, (pf, af, zf, sf, of), _flags_add, x, a, b)
     fmap[op1] = x
 
 
@@ -662,13 +740,9 @@ def i_DEC(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
     b = cst(1, a.size)
-    x, carry, overflow = SubWithBorrow(a, b)
+    x = _sub(a, b)
     # cf not affected
-    fmap[af] = halfborrow(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    _setflags(fmap, (pf, af, zf, sf, of), _flags_sub, x, a, b)
     fmap[op1] = x
 
 
@@ -677,13 +751,8 @@ def i_NEG(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     a = cst(0, op1.size)
     b = fmap(op1)
-    x, carry, overflow = SubWithBorrow(a, b)
-    fmap[af] = halfborrow(a, b)
-    fmap[pf] = parity8(x[0:8])
-    fmap[cf] = b != 0
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[of] = overflow
+    x = _sub(a, b)
+    _setflags(fmap, _ALUFLAGS, _flags_neg, x, a, b)
     fmap[op1] = x
 
 
@@ -740,13 +809,8 @@ def i_ADC(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
     c = fmap(cf)
-    x, carry, overflow = AddWithCarry(a, op2, c)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfcarry(a, op2, c)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _add(a, op2, c)
+    _setflags(fmap, _ALUFLAGS, _flags_add, x, a, op2, c)
     fmap[op1] = x
 
 
@@ -755,13 +819,8 @@ def i_ADD(i, fmap):
     op2 = fmap(i.operands[1])
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
-    x, carry, overflow = AddWithCarry(a, op2)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfcarry(a, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _add(a, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_add, x, a, op2)
     fmap[op1] = x
 
 
@@ -771,13 +830,8 @@ def i_SBB(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
     c = fmap(cf)
-    x, carry, overflow = SubWithBorrow(a, op2, c)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfborrow(a, op2, c)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _sub(a, op2, c)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, a, op2, c)
     fmap[op1] = x
 
 
@@ -786,13 +840,8 @@ def i_SUB(i, fmap):
     op2 = fmap(i.operands[1])
     fmap[eip] = fmap[eip] + i.length
     a = fmap(op1)
-    x, carry, overflow = SubWithBorrow(a, op2)
-    fmap[pf] = parity8(x[0:8])
-    fmap[af] = halfborrow(a, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
+    x = _sub(a, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, a, op2)
     fmap[op1] = x
 
 
@@ -803,11 +852,7 @@ def i_AND(i, fmap):
     if op2.size < op1.size:
         op2 = op2.signextend(op1.size)
     x = fmap(op1) & op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     fmap[op1] = x
 
 
@@ -816,11 +861,7 @@ def i_OR(i, fmap):
     op2 = fmap(i.operands[1])
     fmap[eip] = fmap[eip] + i.length
     x = fmap(op1) | op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     fmap[op1] = x
 
 
@@ -829,11 +870,7 @@ def i_XOR(i, fmap):
     op1 = i.operands[0]
     op2 = fmap(i.operands[1])
     x = fmap(op1) ^ op2
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_logic, x)
     fmap[op1] = x
 
 
@@ -841,13 +878,8 @@ def i_CMP(i, fmap):
     fmap[eip] = fmap[eip] + i.length
     op1 = fmap(i.operands[0])
     op2 = fmap(i.operands[1])
-    x, carry, overflow = SubWithBorrow(op1, op2)
-    fmap[af] = halfborrow(op1, op2)
-    fmap[zf] = x == 0
-    fmap[sf] = x < 0
-    fmap[cf] = carry
-    fmap[of] = overflow
-    fmap[pf] = parity8(x[0:8])
+    x = _sub(op1, op2)
+    _setflags(fmap, _ALUFLAGS, _flags_sub, x, op1, op2)
 
 
 def i_CMPXCHG(i, fmap):
@@ -879,11 +911,7 @@ def i_TEST(i, fmap):
     op1 = fmap(i.operands[0])
     op2 = fmap(i.operands[1])
     x = op1 & op2
-    fmap[zf] = x == 0
-    fmap[sf] = x[x.size - 1 : x.size]
-    fmap[cf] = bit0
-    fmap[of] = bit0
-    fmap[pf] = parity8(x[0:8])
+    _setflags(fmap, _LOGICFLAGS, _flags_test, x)
 
 
 def i_LEA(i, fmap):
@@ -4,6 +4,7 @@ from amoco.arch.x86.asm import *
 # expose "microarchitecture" (instructions semantics)
 uarch = dict(filter(lambda kv: kv[0].startswith("i_"), locals().items()))
 
+from amoco.config import conf
 from amoco.arch.core import instruction, disassembler
 
 instruction_x86 = type("instruction_x86", (instruction,), {})
@@ -16,6 +17,9 @@ from amoco.arch.x86 import spec_ia32
 disassemble = disassembler([spec_ia32], iclass=instruction_x86)
 disassemble.maxlen = 15
 
+if "x86" in conf.Arch.compiled:
+    disassemble.compile()
+
 
 def PC():
     return eip
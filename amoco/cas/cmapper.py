@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+
+# This code is part of Amoco
+# Copyright (C) 2006-2011 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+"""
+cas/cmapper.py
+==============
+
+The cmapper module implements the :class:`cmapper` class, a *concrete*
+counterpart of :class:`cas.mapper.mapper` used by the emulator to execute
+instructions' semantics when all touched values are concrete.
+
+A cmapper is bound to a (symbolic) mapper from which registers and memory
+pages are loaded lazily. Registers are kept in a flat list of python integers
+indexed by a table of register slots (with a mask of known bits), and memory
+is kept in pages of bytes (where bytes of MMIO regions are never concrete.)
+Whenever an instruction needs a symbolic value (an unknown memory byte, a
+symbolic address or a symbolic value written to memory), a :exc:`NotConcrete`
+exception is raised so that the caller can rollback the instruction and
+execute it in the symbolic mapper instead (after a :meth:`cmapper.sync`.)
+
+Note:
+    Registers with unknown bits (like a flags register for which only some
+    flags have been set) also keep the symbolic expression of these bits so
+    that they are read as a composite expression, from which concrete flags
+    can still be extracted.
+    Memory writes done by a cmapper are written back through the mapper when
+    they are synced if the mapper traces memory writes (see conf.Cas.memtrace)
+    so that previously traced values at these addresses are updated, and
+    directly in the mapper's memory map otherwise. They are also notified to
+    the observers of the mapper's memory map (see MemoryMap.subscribe)
+    when they occur.
+"""
+
+from amoco.logger import Log
+
+logger = Log(__name__)
+logger.debug("loading module")
+
+from .expressions import exp, cst, comp, mem, ptr
+from amoco.config import conf
+
+
+class NotConcrete(Exception):
+    """raised by a cmapper when a symbolic value is found"""
+    pass
+
+
+class cmapper(object):
+    """A cmapper is a concrete mapper that provides the mapper interface used
+    by instructions' semantics (getitem, setitem, call...) with registers
+    and memory bytes held as python integers and bytearrays.
+
+    Args:
+        state (mapper): the symbolic mapper from which values are loaded
+                        and to which values are written back by sync.
+
+    Attributes:
+        state  : the bound symbolic mapper.
+        icache : dict of decoded instructions indexed by keys whose first
+                 element is the instruction's address. Entries are removed
+                 when their memory page is written.
+        conds  : list of conditions (unused, for compatibility with mapper.)
+    """
+
+    __slots__ = [
+        "state",
+        "icache",
+        "conds",
+        "__ps",
+        "__slot",
+        "__regs",
+        "__vals",
+        "__known",
+        "__syms",
+        "__cexp",
+        "__dirty",
+        "__pages",
+        "__code",
+        "__log",
+        "__delayed",
+        "__asize",
+    ]
+
+    def __init__(self, state):
+        self.state = state
+        self.icache = {}
+        self.conds = []
+        self.__ps = conf.System.pagesize
+        self.__slot = {}
+        self.__regs = []
+        self.__vals = []
+        self.__known = []
+        self.__syms = []
+        self.__cexp = []
+        self.__dirty = []
+        self.__pages = {}
+        self.__code = {}
+        self.__log = None
+        self.__delayed = None
+        self.__asize = None
+
+    def clear(self):
+        "drop all values loaded from the state (without writing them back)"
+        self.icache.clear()
+        self.__slot.clear()
+        self.__regs.clear()
+        self.__vals.clear()
+        self.__known.clear()
+        self.__syms.clear()
+        self.__cexp.clear()
+        self.__dirty.clear()
+        self.__pages.clear()
+        self.__code.clear()
+        self.__log = None
+        self.__delayed = None
+        self.__asize = None
+
+    # registers:
+    # ----------
+
+    def __getslot(self, r):
+        s = self.__slot.get(r, None)
+        if s is None:
+            s = self.__slot[r] = len(self.__vals)
+            self.__regs.append(r)
+            self.__vals.append(0)
+            self.__known.append(0)
+            self.__syms.append(None)
+            self.__cexp.append(None)
+            self.__dirty.append(False)
+            # loading the slot from the state is not a change to be logged:
+            L, self.__log = self.__log, None
+            self.__setexp(s, self.state.R(r))
+            self.__log = L
+            self.__dirty[s] = False
+        return s
+
+    def __setslot(self, s, v, k, e):
+        if self.__log is not None:
+            self.__log.append(
+                ("r", s, self.__vals[s], self.__known[s], self.__syms[s], self.__dirty[s])
+            )
+        self.__vals[s] = v
+        self.__known[s] = k
+        self.__syms[s] = e
+        self.__cexp[s] = None
+        self.__dirty[s] = True
+
+    def __setexp(self, s, x):
+        # set slot s from expression x: known bits are extracted from its
+        # cst parts and x is kept for the other bits.
+        if x._is_cst:
+            return self.__setslot(s, x.v, x.mask, None)
+        v = k = 0
+        if x._is_cmp:
+            for (i, j), p in x.parts.items():
+                if p._is_cst:
+                    v |= p.v << i
+                    k |= ((1 << (j - i)) - 1) << i
+        self.__setslot(s, v, k, x)
+
+    def __getexp(self, s, size):
+        # returns the expression of slot s, as a comp if some bits are unknown.
+        v, k, e = self.__vals[s], self.__known[s], self.__syms[s]
+        if e is None:
+            return cst(v, size)
+        res = self.__cexp[s]
+        if res is None:
+            if k == 0:
+                res = e
+            else:
+                res = comp(size)
+                i = 0
+                while i < size:
+                    b = (k >> i) & 1
+                    j = i + 1
+                    while j < size and ((k >> j) & 1) == b:
+                        j += 1
+                    if b:
+                        res[i:j] = cst(v >> i, j - i)
+                    else:
+                        res[i:j] = e[i:j]
+                    i = j
+            self.__cexp[s] = res
+        return res
+
+    def R(self, x):
+        "get the expression of register x"
+        s = self.__getslot(x)
+        if self.__syms[s] is None:
+            return cst(self.__vals[s], x.size)
+        return self.__getexp(s, x.size)[0 : x.size]
+
+    # memory:
+    # -------
+
+    def __getpage(self, n):
+        p = self.__pages.get(n, None)
+        if p is None:
+            ps = self.__ps
+            data = bytearray(ps)
+            known = None
+            try:
+                parts = self.state.mmap.read(n * ps, ps)
+            except MemoryError:
+                parts = [exp(ps * 8)]
+            o = 0
+            for x in parts:
+                if isinstance(x, bytes):
+                    data[o : o + len(x)] = x
+                    o += len(x)
+                else:
+                    if known is None:
+                        known = bytearray(b"\x01") * ps
+                    l = x.length
+                    known[o : o + l] = bytes(l)
+                    o += l
+            # MMIO regions bytes are never concrete:
+            for sta, sto, _, _ in self.state.mmap.mmio_at(n * ps, ps):
+                if known is None:
+                    known = bytearray(b"\x01") * ps
+                i, j = max(sta - n * ps, 0), min(sto - n * ps, ps)
+                known[i:j] = bytes(j - i)
+            p = self.__pages[n] = [data, known, None]
+        return p
+
+    def fetch(self, vaddr, l):
+        """returns at most l concrete bytes at address vaddr (stops at the
+        first unknown byte), raises NotConcrete if no byte is known."""
+        res = b""
+        while l > 0:
+            n, o = divmod(vaddr, self.__ps)
+            data, known, _ = self.__getpage(n)
+            sz = min(l, self.__ps - o)
+            if known is not None:
+                u = known.find(0, o, o + sz)
+                if u != -1:
+                    res += data[o:u]
+                    break
+            res += data[o : o + sz]
+            vaddr += sz
+            l -= sz
+        if len(res) == 0:
+            raise NotConcrete(vaddr)
+        return bytes(res)
+
+    def read(self, vaddr, l):
+        "returns the l concrete bytes at address vaddr or raises NotConcrete"
+        res = self.fetch(vaddr, l)
+        if len(res) < l:
+            raise NotConcrete(vaddr + len(res))
+        return res
+
+    def write(self, vaddr, data):
+        "write concrete bytes data at address vaddr"
+        i = 0
+        l = len(data)
+        if self.state.mmap.mmio_at(vaddr, l):
+            raise NotConcrete(vaddr)
+        while i < l:
+            n, o = divmod(vaddr + i, self.__ps)
+            p = self.__getpage(n)
+            sz = min(l - i, self.__ps - o)
+            data_, known, written = p
+            if self.__log is not None:
+                self.__log.append(
+                    (
+                        "m",
+                        n,
+                        o,
+                        bytes(data_[o : o + sz]),
+                        known and bytes(known[o : o + sz]),
+                        bytes(written[o : o + sz]) if written else bytes(sz),
+                    )
+                )
+            data_[o : o + sz] = data[i : i + sz]
+            if known is not None:
+                known[o : o + sz] = b"\x01" * sz
+            if written is None:
+                written = p[2] = bytearray(self.__ps)
+            written[o : o + sz] = b"\x01" * sz
+            if n in self.__code:
+                for key in self.__code.pop(n):
+                    self.icache.pop(key, None)
+            i += sz
+        # let the state's memory observers know about this write:
+        self.state.mmap.notify(None, vaddr, l)
+
+    def setcode(self, key, i):
+        "cache instruction i with given key (vaddr,...)"
+        self.icache[key] = i
+        vaddr = key[0]
+        n0 = vaddr // self.__ps
+        n1 = (vaddr + i.length - 1) // self.__ps
+        for n in range(n0, n1 + 1):
+            self.__code.setdefault(n, set()).add(key)
+
+    def __address(self, a):
+        if a._is_ptr:
+            b = a.base
+            if b._is_cst:
+                return (b.v + a.disp) & ((1 << b.size) - 1)
+        elif a._is_cst:
+            return a.v
+        raise NotConcrete(a)
+
+    def M(self, k):
+        """get the expression of a memory location expression k"""
+        if k.size % 8:
+            raise NotConcrete(k)
+        data = self.read(self.__address(k.a), k.size // 8)
+        res = cst(int.from_bytes(data, "little" if k.endian == 1 else "big"), k.size)
+        res.sf = k.sf
+        return res
+
+    # mapper interface:
+    # -----------------
+
+    def __getitem__(self, k):
+        "just a convenient wrapper around M/R"
+        if k._is_mem:
+            return self.M(k)
+        if k._is_reg:
+            return self.R(k)
+        return k.eval(self)
+
+    def __setitem__(self, k, v):
+        if k._is_ptr or k._is_mem:
+            loc = k if k._is_ptr else k.addr(self)
+            a = self.__address(loc)
+            self.__asize = (loc.base if loc._is_ptr else loc).size
+            v = v.simplify()
+            if not v._is_cst or v.size % 8:
+                raise NotConcrete(v)
+            endian = k.endian if k._is_mem else 1
+            self.write(a, v.v.to_bytes(v.size // 8, "little" if endian == 1 else "big"))
+            return
+        if k.size != v.size:
+            raise ValueError("size mismatch")
+        try:
+            loc = k.addr(self)
+        except TypeError:
+            logger.error("setitem ignored (invalid left-value expression: %s)" % k)
+            return
+        if not loc._is_reg:
+            raise ValueError("memory location slc is not supported")
+        s = self.__getslot(loc)
+        v = v.simplify()
+        pos = k.pos if k._is_slc else 0
+        if v._is_cst:
+            m = ((1 << k.size) - 1) << pos
+            known = self.__known[s] | m
+            e = self.__syms[s]
+            if known == loc.mask:
+                e = None
+            self.__setslot(s, (self.__vals[s] & ~m) | (v.v << pos), known, e)
+            return
+        if pos == 0 and k.size == loc.size:
+            r = v
+        else:
+            r = comp(loc.size)
+            r[0 : loc.size] = self.__getexp(s, loc.size)
+            r[pos : pos + k.size] = v
+            if len(r.index) == 1:
+                r = r.parts[r.index[0]]
+        self.__setexp(s, r)
+
+    def __call__(self, x):
+        "evaluation of expression x in this map"
+        return x.eval(self)
+
+    def use(self, *args, **kargs):
+        # only used by mem.eval (without aliasing mods in a cmapper):
+        if args or kargs:
+            raise NotConcrete(args)
+        return self
+
+    def delayed(self, k, v):
+        self.__delayed = (k, v)
+
+    def update_delayed(self):
+        kv = self.__delayed
+        if kv is not None:
+            self.__delayed = None
+            self.__setitem__(*kv)
+
+    def lazy(self, locs, f, *args):
+        # concrete flags are cheap: no need to defer their update.
+        v = f(*args)
+        for k in locs:
+            self.__setitem__(k, v[k])
+
+    def update_lazy(self, x=None):
+        pass
+
+    # transactions:
+    # -------------
+
+    def begin(self):
+        "start logging changes so that they can be cancelled by rollback"
+        self.__log = []
+
+    def commit(self):
+        self.__log = None
+
+    def rollback(self):
+        "cancel all changes since last begin"
+        L, self.__log = self.__log, None
+        for e in reversed(L or []):
+            if e[0] == "r":
+                _, s, v, k, x, d = e
+                self.__vals[s] = v
+                self.__known[s] = k
+                self.__syms[s] = x
+                self.__cexp[s] = None
+                self.__dirty[s] = d
+            else:
+                _, n, o, data, known, written = e
+                p = self.__pages[n]
+                l = len(data)
+                p[0][o : o + l] = data
+                if known is not None:
+                    p[1][o : o + l] = known
+                p[2][o : o + l] = written
+        self.__delayed = None
+
+    def sync(self):
+        """write all modified registers and memory bytes back to the state
+        mapper (values remain loaded in the cmapper.)"""
+        m = self.state
+        for s, r in enumerate(self.__regs):
+            if self.__dirty[s]:
+                m[r] = self.__getexp(s, r.size)
+                self.__dirty[s] = False
+        ps = self.__ps
+        asize = self.__asize
+        if asize is not None and conf.Cas.noaliasing and not conf.Cas.memtrace:
+            asize = None
+        for n, p in self.__pages.items():
+            data, _, written = p
+            if written is None:
+                continue
+            o = written.find(1)
+            while o != -1:
+                e = written.find(0, o)
+                if e == -1:
+                    e = ps
+                if asize is None:
+                    m.mmap.write(n * ps + o, bytes(data[o:e]))
+                else:
+                    # update the memory traced in the mapper as well:
+                    l = 8 * (e - o)
+                    v = int.from_bytes(data[o:e], "little")
+                    m[mem(cst(n * ps + o, asize), l)] = cst(v, l)
+                o = written.find(1, e)
+            p[2] = None
@@ -9,6 +9,22 @@ cas/expressions.py
 
 The expressions module implements all above :class:`exp` classes.
 All symbolic representation of data in amoco rely on these expressions.
+
+Expressions are hashed structurally: the hash of a node is computed from
+its own attributes and the hashes of its sub-expressions, and is cached in
+the node for composite expressions (op, uop, tst, slc, comp, vec). Methods
+that modify a node in place (simplify, restruct, etc) clear its cached hash,
+but sub-expressions of an already hashed expression should not be modified.
+Note that the sign flag of an expression is not part of its hash.
+
+If conf.Cas.hashcons is True, the :func:`hashcons` function maintains a pool
+of unique cst, reg, op, slc, mem, ptr and comp objects so that structurally
+equal expressions returned by operators are the same python object.
+
+Simplified op and uop expressions are flagged as being in normal form so that
+simplifying them again returns immediately, and the module's :data:`memo`
+(a :class:`SimplifyMemo` instance bounded by conf.Cas.memo) associates already
+simplified (operator, left, right) triples with their result.
 """
 
 from amoco.config import conf
@@ -18,6 +34,10 @@ logger = Log(__name__)
 logger.debug("loading module")
 from amoco.ui import render
 import operator
+import weakref
+import copyreg
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right, insort
 
 
 # decorators:
@@ -109,9 +129,11 @@ class exp(object):
 
     Note:
         len(exp) returns the byte size, assuming that size is a multiple of 8.
+        The structural hash of the expression is cached in the _hash slot
+        (see :meth:`hkey`.)
     """
     etype = 0
-    __slots__ = ["size", "sf"]
+    __slots__ = ["size", "sf", "_hash", "__weakref__"]
 
     def __init__(self, size=0, sf=False):
         self.size = size
@@ -171,6 +193,15 @@ class exp(object):
         self = loads(s)
         return self
 
+    # the cached hash is not pickled since python's str hashes are
+    # randomized for each process:
+    def __getstate__(self):
+        S = {}
+        for k in copyreg._slotnames(self.__class__):
+            if k != "_hash" and hasattr(self, k):
+                S[k] = getattr(self, k)
+        return (getattr(self, "__dict__", None), S)
+
     def __unicode__(self):
         if self._is_top:
             return render.icons.top+("%d" % self.size)
@@ -351,13 +382,34 @@ class exp(object):
     # WARNING: comparison operators cmp returns a python bool
     # but any other operators always return an expression !
     def __hash__(self):
-        return hash("%s" % self) + self.size
+        try:
+            return self._hash
+        except AttributeError:
+            h = self._hash = hash(self.hkey()) + self.size
+            return h
+
+    def hkey(self):
+        "returns the tuple from which the (cached) hash of the expression is computed"
+        return (self.etype,)
+
+    def skey(self):
+        "returns the tuple that defines the structure of the expression (see :func:`identical`)"
+        return self.hkey()
+
+    def _clearhash(self):
+        "clear the cached hash (for methods that modify the expression in place)"
+        try:
+            del self._hash
+        except AttributeError:
+            pass
 
     # An expression defaults to False, and only bit1 will return True.
     def __bool__(self):
         return False
 
     def __eq__(self, n):
+        if self is n:
+            return bit1
         # we inline checkarg_numeric only here:
         if isinstance(n, int):
             n = cst(n, self.size)
@@ -481,7 +533,6 @@ class cst(exp):
     """
     __slots__ = ["v"]
     etype = et_cst
-    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, v, size=32):
@@ -499,6 +550,14 @@ class cst(exp):
         else:
             return self.v
 
+    # cst hash is not cached: v and size attributes are sometimes adjusted
+    # by decoders, and cst equality doesn't depend on the sign flag.
+    def __hash__(self):
+        return hash(self.v) + self.size
+
+    def skey(self):
+        return (self.v,)
+
     # for slicing purpose:
     def __index__(self):
         return self.value
@@ -758,13 +817,18 @@ assert bool(bit1)
 class sym(cst):
     "symbol expression extends cst with a reference name for pretty printing"
     __slots__ = ["ref"]
-    __hash__ = cst.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, ref, v, size=32):
         self.ref = ref
         cst.__init__(self, v, size)
 
+    def __hash__(self):
+        return hash(("#", self.ref)) + self.size
+
+    def skey(self):
+        return (self.ref, self.v)
+
     def __unicode__(self):
         return "#%s" % self.ref
 
@@ -772,7 +836,6 @@ class sym(cst):
 class cfp(exp):
     "floating point concrete value expression"
     __slots__ = ["v"]
-    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_cst
 
@@ -780,6 +843,12 @@ class cfp(exp):
         self.size = size
         self.v = float(v)
 
+    def __hash__(self):
+        return hash(("f", self.v)) + self.size
+
+    def skey(self):
+        return (self.v,)
+
     @property
     def value(self):
         return self.v
@@ -922,7 +991,6 @@ class cfp(exp):
 class reg(exp):
     "symbolic register expression"
     __slots__ = ["ref", "etype", "_subrefs", "__protect"]
-    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, refname, size=32):
@@ -937,6 +1005,12 @@ class reg(exp):
     def __unicode__(self):
         return "%s" % self.ref
 
+    def __hash__(self):
+        return hash(self.ref) + self.size
+
+    def skey(self):
+        return (self.ref, self.etype)
+
     def toks(self, **kargs):
         return [(render.Token.Register, "%s" % self)]
 
@@ -1006,7 +1080,6 @@ is_reg_other = regtype(regtype.OTHER)
 
 class ext(reg):
     "external reference to a dynamic (lazy or non-lazy) symbol"
-    __hash__ = reg.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, refname, **kargs):
@@ -1026,6 +1099,9 @@ class ext(reg):
     def __unicode__(self):
         return "@%s" % self.ref
 
+    def __hash__(self):
+        return hash(("@", self.ref)) + self.size
+
     def toks(self, **kargs):
         tk = render.Token.Tainted if "!" in self.ref else render.Token.Name
         return [(tk, "%s" % self)]
@@ -1067,6 +1143,64 @@ class lab(ext):
 
 # ------------------------------------------------------------------------------
 
+def identical(x, y):
+    """
+    identical returns True if expressions x and y have the same structure.
+    Unlike x==y, it never builds a new expression and does not rely on
+    hashes only (which can collide, e.g. for cst(1,64) and cst(2**61,64).)
+    Tuples of expressions (and other python values) are also supported.
+    """
+    if x is y:
+        return True
+    if not isinstance(x, exp):
+        return _identical(x, y)
+    if x.__class__ is not y.__class__:
+        return False
+    if x.size != y.size or x.sf != y.sf or hash(x) != hash(y):
+        return False
+    return _identical(x.skey(), y.skey())
+
+def _identical(u, v):
+    # compare skey elements, possibly nested in tuples:
+    if isinstance(u, exp) or isinstance(v, exp):
+        return isinstance(u, exp) and isinstance(v, exp) and identical(u, v)
+    if isinstance(u, tuple):
+        return (
+            isinstance(v, tuple)
+            and len(u) == len(v)
+            and all(_identical(a, b) for a, b in zip(u, v))
+        )
+    return u == v
+
+_hashcons = weakref.WeakValueDictionary()
+_hashcons_types = ("cst", "reg", "op", "slc", "mem", "ptr", "comp")
+
+def hashcons(e):
+    """
+    hashcons returns the unique expression structurally equal to e if
+    conf.Cas.hashcons is True, otherwise e is returned unchanged.
+    Only cst, reg, op, slc, mem, ptr and comp expressions are pooled, and
+    a pooled expression is returned only if it is :func:`identical` to e.
+
+    Note:
+        Since the returned expression may be shared, it should never be
+        modified in place (use a copy).
+    """
+    if not conf.Cas.hashcons:
+        return e
+    if e.__class__.__name__ not in _hashcons_types:
+        return e
+    k = (e.__class__, e.size, e.sf, hash(e))
+    x = _hashcons.get(k, None)
+    if x is None:
+        _hashcons[k] = e
+        return e
+    if identical(x, e):
+        return x
+    return e
+
+# ------------------------------------------------------------------------------
+
 def composer(parts):
     """
     composer returns a comp object (see below) constructed with parts from low
@@ -1083,7 +1217,7 @@ def composer(parts):
     for x in parts:
         c[pos : pos + x.size] = x
         pos += x.size
-    return c.simplify()
+    return hashcons(c.simplify())
 
 # ------------------------------------------------------------------------------
 
@@ -1095,12 +1229,13 @@ class comp(exp):
         parts (dict): expressions parts dictionary.
                       Each key is a tuple (pos,sz) and value is the exp part.
                       pos is the bit position for this part, and sz is its size.
-        smask (list): mapping of bit index to the part's key that defines this bit.
+        index (list): sorted list of the parts' keys, used to find by bisection
+                      the parts that define a given range of bits.
     Note:
         Each part can be accessed by 'slicing' the comp to obtain another
         comp or the part if the given slice indices match the part position.
     """
-    __slots__ = ["smask", "parts"]
+    __slots__ = ["index", "parts"]
     __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_cmp
@@ -1108,7 +1243,7 @@ class comp(exp):
     def __init__(self, s):
         self.size = s
         self.sf = False
-        self.smask = [None] * self.size
+        self.index = []
         self.parts = {}
         # the symp is only obtained after a restruct !
 
@@ -1121,6 +1256,9 @@ class comp(exp):
             cur += nv.size
         return s + " }"
 
+    def hkey(self):
+        return ("C",) + tuple([(nk, self.parts[nk]) for nk in self.index])
+
     def toks(self, **kargs):
         if "indent" in kargs:
             p = kargs.get("indent", 0)
@@ -1146,7 +1284,7 @@ class comp(exp):
     def eval(self, env):
         res = comp(self.size)
         res.sf = self.sf
-        res.smask = self.smask[:]
+        res.index = self.index[:]
         for nk, nv in iter(self.parts.items()):
             res.parts[nk] = nv.eval(env)
         # now there may be raw numeric value in enode dict, so tiddy up:
@@ -1158,13 +1296,13 @@ class comp(exp):
 
     def copy(self):
         res = comp(self.size)
-        res.smask = self.smask[:]
-        for nk, nv in iter(self.parts.items()):
-            res.parts[nk] = nv
+        res.index = self.index[:]
+        res.parts = dict(self.parts)
         res.sf = self.sf
         return res
 
     def simplify(self, **kargs):
+        self._clearhash()
         for nk, nv in iter(self.parts.items()):
             self.parts[nk] = nv.simplify(**kargs)
         self.restruct()
@@ -1185,23 +1323,12 @@ class comp(exp):
         l = stop - start
         res = comp(l)
         res.sf = self.sf
-        b = 0
-        while b < l:
-            # select symbol index and object:
-            idx = self.smask[start]
-            if idx is None:
-                b += 1
-                start += 1
-                continue
-            else:  # idx is a slice keyed in enode dict
-                s = self.parts[idx]
-                # get slice for this symbol:
-                deb = start - idx[0]
-                fin = min(idx[1], stop) - idx[0]
-                d = fin - deb
-                res[b : b + d] = s[deb:fin]
-                b += d
-                start += d
+        for idx in self.overlaps(start, stop):
+            s = self.parts[idx]
+            # get slice for this symbol:
+            deb = max(start, idx[0])
+            fin = min(idx[1], stop)
+            res[deb - start : fin - start] = s[deb - idx[0] : fin - idx[0]]
         res.restruct()
         if len(res.parts.keys()) == 0:
             return slicer(self, start, stop - start)
@@ -1216,6 +1343,7 @@ class comp(exp):
         l = sto - sta
         if v.size != l:
             raise ValueError("size mismatch")
+        self._clearhash()
         # make cmp always flat:
         if v._is_cmp:
             for vp, vv in v.parts.items():
@@ -1226,8 +1354,17 @@ class comp(exp):
             if (sta, sto) in self.parts.keys():
                 self.parts[(sta, sto)] = v
             else:
-                self.parts[(sta, sto)] = v
                 self.cut(sta, sto)
+                self.parts[(sta, sto)] = v
+                insort(self.index, (sta, sto))
+
+    def overlaps(self, start, stop):
+        "returns the sorted list of parts' keys that overlap the (start,stop) range"
+        i = bisect_right(self.index, (start, self.size + 1)) - 1
+        if i < 0 or self.index[i][1] <= start:
+            i += 1
+        j = bisect_left(self.index, (stop, 0), i)
+        return self.index[i:j]
 
     def cut(self, start, stop):
         """
@@ -1238,29 +1375,28 @@ class comp(exp):
         Note:
             cut is in in-place method (affects self).
         """
+        self._clearhash()
         # list parts that cover (start,stop) range:
-        maskset = []
-        for nk in filter(None, self.smask[start:stop]):
-            if not nk in maskset:
-                maskset.append(nk)
+        maskset = self.overlaps(start, stop)
+        if not maskset:
+            return
+        i = bisect_left(self.index, maskset[0])
         # for each listed part, remove its covering in this range
-        # and update parts and smask dicts accordingly:
+        # and update parts and index accordingly:
+        keep = []
         for nk in maskset:
             nv = self.parts.pop(nk)
             if nk[0] < start:
                 self.parts[(nk[0], start)] = nv[0 : start - nk[0]]
-                self.smask[nk[0] : start] = [(nk[0], start)] * (start - nk[0])
+                keep.append((nk[0], start))
             if nk[1] > stop:
                 self.parts[(stop, nk[1])] = nv[stop - nk[0] : nk[1] - nk[0]]
-                self.smask[stop : nk[1]] = [(stop, nk[1])] * (nk[1] - stop)
-        self.smask[start:stop] = [(start, stop)] * (stop - start)
+                keep.append((stop, nk[1]))
+        self.index[i : i + len(maskset)] = keep
 
     def __iter__(self):
-        # gather cst as possible:
-        part = list(self.parts.keys())
-        part.sort(key=operator.itemgetter(0))
         cur = 0
-        for p in part:
+        for p in self.index:
             assert p[0] == cur
             yield self.parts[p]
             cur = p[1]
@@ -1270,10 +1406,11 @@ class comp(exp):
         restruct will aggregate consecutive cst expressions in order
         to minimize the number of parts.
         """
+        self._clearhash()
         # gather cst as possible:
-        part = list(self.parts.keys())
-        part.sort(key=operator.itemgetter(0))
-        for i in range(len(part) - 1):
+        part = self.index
+        i = 0
+        while i < len(part) - 1:
             ra = part[i]
             rb = part[i + 1]
             if ra[1] == rb[0]:
@@ -1281,19 +1418,18 @@ class comp(exp):
                 nb = self.parts[rb]
                 if na._is_cst and nb._is_cst:
                     v = (nb.v << na.size) | (na.v)
-                    self.parts[(ra[0], rb[1])] = cst(v, na.size + nb.size)
-                    self.parts.pop(ra)
-                    self.parts.pop(rb)
-                    self.smask[ra[0] : rb[1]] = [(ra[0], rb[1])] * (rb[1] - ra[0])
-                    self.restruct()
-                    break
+                    nv = cst(v, na.size + nb.size)
                 elif not (na._is_def or nb._is_def):
-                    self.parts[(ra[0], rb[1])] = top(rb[1] - ra[0])
-                    self.parts.pop(ra)
-                    self.parts.pop(rb)
-                    self.smask[ra[0] : rb[1]] = [(ra[0], rb[1])] * (rb[1] - ra[0])
-                    self.restruct()
-                    break
+                    nv = top(rb[1] - ra[0])
+                else:
+                    i += 1
+                    continue
+                self.parts.pop(ra)
+                self.parts.pop(rb)
+                self.parts[(ra[0], rb[1])] = nv
+                part[i : i + 2] = [(ra[0], rb[1])]
+            else:
+                i += 1
 
     def depth(self):
         return sum((p.depth() for p in self))
@@ -1315,7 +1451,6 @@ class mem(exp):
         and adjust the eval result accordingly.
     """
     __slots__ = ["a", "mods", "endian"]
-    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_mem
 
@@ -1331,6 +1466,14 @@ class mem(exp):
         n = "$%d" % n if n > 0 else ""
         return "M%d%s%s" % (self.size, n, self.a)
 
+    # mem and ptr hashes are not cached since their address is
+    # often adjusted in place by instructions semantics.
+    def __hash__(self):
+        return hash(("M", self.a, len(self.mods))) + self.size
+
+    def skey(self):
+        return (self.a, self.endian, tuple(self.mods))
+
     def toks(self, **kargs):
         return [(render.Token.Memory, "%s" % self)]
 
@@ -1399,7 +1542,6 @@ class ptr(exp):
         seg  (reg): segment register (or None if unused.)
     """
     __slots__ = ["base", "disp", "seg"]
-    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_ptr
 
@@ -1420,6 +1562,12 @@ class ptr(exp):
         seg = "" if self.seg is None else self.seg
         return "%s(%s%s)" % (seg, self.base, d)
 
+    def __hash__(self):
+        return hash(("P", self.seg, self.base, self.disp)) + self.size
+
+    def skey(self):
+        return (self.seg, self.base, self.disp)
+
     def disp_tostring(self, base10=True):
         if hasattr(self.disp, "_is_cst"):
             # When allowing label in expressions, e.g. when parsing
@@ -1478,7 +1626,7 @@ def slicer(x, pos, size):
             res = x[pos : pos + size]
             res.sf = x.sf
             return res
-        return slc(x, pos, size)
+        return hashcons(slc(x, pos, size))
 
 # ------------------------------------------------------------------------------
 
@@ -1492,6 +1640,7 @@ class slc(exp):
         ref (str): an alternative symbolic name for this part.
     """
     __slots__ = ["x", "pos", "ref", "__protect", "etype"]
+    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, x, pos, size, ref=None):
@@ -1536,8 +1685,8 @@ class slc(exp):
         subpart = [(render.Token.Literal, "[%d:%d]" % (self.pos, self.pos + self.size))]
         return self.x.toks(**kargs) + subpart
 
-    def __hash__(self):
-        return hash(self.raw())  # lgtm [py/equals-hash-mismatch]
+    def hkey(self):
+        return ("S", self.x, self.pos)
 
     def depth(self):
         return 2 * self.x.depth()
@@ -1551,6 +1700,7 @@ class slc(exp):
     # slc of mem objects are simplified by adjusting the disp offset of
     # the sliced mem object.
     def simplify(self, **kargs):
+        self._clearhash()
         self.x = self.x.simplify(**kargs)
         if not self.x._is_def:
             return top(self.size)
@@ -1643,6 +1793,9 @@ class tst(exp):
     def __unicode__(self):
         return "(%s ? %s : %s)" % (self.tst, self.l, self.r)
 
+    def hkey(self):
+        return ("T", self.tst, self.l, self.r)
+
     def toks(self, **kargs):
         ttest = self.tst.toks(**kargs)
         ttest.append((render.Token.Literal, " ? "))
@@ -1678,6 +1831,7 @@ class tst(exp):
             return r
 
     def simplify(self, **kargs):
+        self._clearhash()
         self.tst = self.tst.simplify(**kargs)
         widening = kargs.get("widening", False)
         if widening or not self.tst._is_def:
@@ -1697,11 +1851,105 @@ class tst(exp):
 
 # ------------------------------------------------------------------------------
 
+def _dup(e):
+    "returns a shallow copy of expression e (registers are not copied)"
+    if e._is_reg:
+        return e
+    cls = e.__class__
+    c = cls.__new__(cls)
+    for k in copyreg._slotnames(cls):
+        if k != "__weakref__" and hasattr(e, k):
+            object.__setattr__(c, k, getattr(e, k))
+    return c
+
+class _memokey(object):
+    # wraps a SimplifyMemo key tuple so that table lookups compare keys with
+    # identical() rather than with exp.__eq__ (which builds expressions.)
+    __slots__ = ["k", "h"]
+
+    def __init__(self, k):
+        self.k = k
+        self.h = hash(k)
+
+    def __hash__(self):
+        return self.h
+
+    def __eq__(self, other):
+        return self is other or (self.h == other.h and _identical(self.k, other.k))
+
+class SimplifyMemo(object):
+    """
+    A bounded table that associates the (operator, operands) key of an
+    op or uop expression with its simplified result, so that subtrees
+    that reappear (typically during mapper compositions) are not
+    simplified again. Results are stored and returned as shallow copies
+    to protect the table from in-place modifications of the returned
+    expression (like its sign flag.) Keys are compared with :func:`identical`
+    so that the sign flags of their sub-expressions are taken into account.
+
+    Attributes:
+        hits (int): number of simplifications found in the table.
+        misses (int): number of simplifications that had to be computed.
+
+    Note:
+        The table size is given by conf.Cas.memo (0 disables the memo and
+        the normal form flag.) Results that are comp, vec or top
+        expressions are not memoized.
+    """
+
+    __slots__ = ["hits", "misses", "_table"]
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._table = OrderedDict()
+
+    def __len__(self):
+        return len(self._table)
+
+    def __repr__(self):
+        return "<%s len=%d, hits=%d, misses=%d (%.1f%%)>" % (
+            self.__class__.__name__,
+            len(self._table),
+            self.hits,
+            self.misses,
+            100.0 * self.hitrate(),
+        )
+
+    def hitrate(self):
+        "returns the ratio of hits over all lookups"
+        n = self.hits + self.misses
+        return (self.hits / n) if n > 0 else 0.0
+
+    def get(self, k):
+        k = _memokey(k)
+        try:
+            res = self._table[k]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._table.move_to_end(k)
+        self.hits += 1
+        return _dup(res)
+
+    def put(self, k, res, size):
+        if res._is_cmp or res._is_vec or not res._is_def:
+            return
+        self._table[_memokey(k)] = _dup(res)
+        while len(self._table) > size:
+            self._table.popitem(last=False)
+
+    def clear(self):
+        self._table.clear()
+        self.hits = self.misses = 0
+
+memo = SimplifyMemo()
+
 def oper(opsym, l, r=None):
     "wrapper of the operator expression that detects unary operations"
     if r is None:
-        return uop(opsym, l).simplify()
-    return op(opsym, l, r).simplify()
+        return hashcons(uop(opsym, l).simplify())
+    return hashcons(op(opsym, l, r).simplify())
 
 
 # ------------------------------------------------------------------------------
@@ -1716,12 +1964,13 @@ class op(exp):
         l (exp): left-hand expression of the operator
         r (exp): right-hand expression of the operator
     """
-    __slots__ = ["op", "l", "r", "prop"]
+    __slots__ = ["op", "l", "r", "prop", "_nf"]
     __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_eqn
 
     def __init__(self, op, l, r):
+        self._nf = False
         self.op = _operator(op)
         self.prop = self.op.type
         if self.prop < 4:
@@ -1755,6 +2004,9 @@ class op(exp):
     def __unicode__(self):
         return "(%s%s%s)" % (self.l, render.icons.op(self.op.symbol), self.r)
 
+    def hkey(self):
+        return ("O", self.op.symbol, self.l, self.r)
+
     def toks(self, **kargs):
         l = self.l.toks(**kargs)
         l.insert(0, (render.Token.Literal, "("))
@@ -1763,8 +2015,17 @@ class op(exp):
         return l + [(render.Token.Literal, self.op.symbol)] + r
 
     def simplify(self, **kargs):
+        if self._nf and not kargs:
+            return self
+        self._clearhash()
         l = self.l.simplify(**kargs)
         r = self.r.simplify(**kargs)
+        msize = 0 if kargs else conf.Cas.memo
+        if msize > 0:
+            k = (self.op.symbol, l, r, self.sf, conf.Cas.complexity)
+            res = memo.get(k)
+            if res is not None:
+                return res
         if self.prop < 4 and self.op.symbol not in (OP_DIV, OP_MOD):
             if l._is_top:
                 return l
@@ -1793,7 +2054,12 @@ class op(exp):
                         l, r = r, l
         self.l = l
         self.r = r
-        return eqn2_helpers(self, **kargs)
+        res = eqn2_helpers(self, **kargs)
+        if msize > 0:
+            if res._is_eqn:
+                res._nf = True
+            memo.put(k, res, msize)
+        return res
 
     def depth(self):
         return self.l.depth() + self.r.depth()
@@ -1811,12 +2077,13 @@ class uop(exp):
         l (None): returns None in case uop is treated as an op instance.
         r (exp): right-hand expression of the operator
     """
-    __slots__ = ["op", "r", "prop"]
+    __slots__ = ["op", "r", "prop", "_nf"]
     __hash__ = exp.__hash__
     __eq__ = exp.__eq__
     etype = et_eqn
 
     def __init__(self, op, r):
+        self._nf = False
         self.op = _operator(op, unary=1)
         self.prop = self.op.type
         self.r = r
@@ -1839,17 +2106,34 @@ class uop(exp):
     def __unicode__(self):
         return "(%s%s)" % (render.icons.op(self.op.symbol), self.r)
 
+    def hkey(self):
+        return ("U", self.op.symbol, self.r)
+
     def toks(self, **kargs):
         r = self.r.toks(**kargs)
         r.append((render.Token.Literal, ")"))
         return [(render.Token.Literal, "(%s" % self.op.symbol)] + r
 
     def simplify(self, **kargs):
+        if self._nf and not kargs:
+            return self
+        self._clearhash()
         r = self.r.simplify(**kargs)
         if r._is_top:
             return r
         self.r = r
-        return eqn1_helpers(self, **kargs)
+        msize = 0 if kargs else conf.Cas.memo
+        if msize > 0:
+            k = (self.op.symbol, r, self.sf)
+            res = memo.get(k)
+            if res is not None:
+                return res
+        res = eqn1_helpers(self, **kargs)
+        if msize > 0:
+            if res._is_eqn:
+                res._nf = True
+            memo.put(k, res, msize)
+        return res
 
     def depth(self):
         return self.r.depth()
@@ -2295,6 +2579,9 @@ class vec(exp):
         s = ",".join(["%s" % x for x in self.l])
         return "[%s]" % (s)
 
+    def hkey(self):
+        return ("V",) + tuple(self.l)
+
     def toks(self, **kargs):
         t = []
         for x in self.l:
@@ -2307,6 +2594,7 @@ class vec(exp):
         return t
 
     def simplify(self, **kargs):
+        self._clearhash()
         widening = kargs.get("widening", False)
         l = []
         for e in self.l:
@@ -2379,6 +2667,9 @@ class vecw(top):
         s = ",".join(["%s" % x for x in self.l])
         return "[%s, %s]" % (s,render.icons.dots)
 
+    def hkey(self):
+        return ("W",) + tuple(self.l)
+
     def toks(self, **kargs):
         t = []
         for x in self.l:
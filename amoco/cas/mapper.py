@@ -22,7 +22,6 @@ from .expressions import *
 
 from amoco.cas.tracker import generation
 from amoco.system.memory import MemoryMap
-from amoco.arch.core import Bits
 from amoco.ui.views import mapperView
 
 
@@ -40,19 +39,19 @@ class mapper(object):
         __map  : is an ordered list of mappings of expressions associated with a
                  location (register or memory pointer). The order is relevant
                  only to reflect the order of write-to-memory instructions in
-                 case of pointer aliasing.
+                 case of pointer aliasing. (See tracker.generation for how
+                 locations are indexed.)
         __Mem  : is a memory model where symbolic memory pointers are addressing
                  separated memory zones. See MemoryMap and MemoryZone classes.
         conds  : is the list of conditions that must be True for the mapper
         cur    : is the optional interface to a task.
     """
 
-    __slots__ = ["__map", "__Mem", "conds", "cur", "view"]
+    __slots__ = ["__map", "__Mem", "__undo", "conds", "cur", "view"]
 
     def __init__(self, instrlist=None, cur=None):
         self.__map = generation()
-        self.__map.lastw = 0
-        self.__map.delayed = None
+        self.__undo = None
         self.__Mem = MemoryMap()
         self.conds = []
         self.cur = cur
@@ -60,19 +59,30 @@ class mapper(object):
         # if the __map needs to be inited before executing instructions
         # one solution is to prepend the instrlist with a function dedicated
         # to this init phase...
-        for instr in instrlist or []:
+        for n, instr in enumerate(instrlist or []):
+            if n == 0 and hasattr(instr, "template"):
+                # the mapper of the first instruction is a copy of its
+                # (cached) template:
+                m = instr.template().copy()
+                self.__map, self.__Mem, self.conds = m.__map, m.__Mem, m.conds
+                continue
             # call the instruction with this mapper:
             instr(self)
         self.view = mapperView(self)
 
     def __len__(self):
-        return len(self.__map)
+        n = len(self.__map)
+        for r in self.__map.lazy:
+            if r not in self.__map:
+                n += 1
+        return n
 
     def __str__(self):
         return "\n".join(["%s <- %s" % x for x in self])
 
     def inputs(self):
         "list antecedent locations (used in the mapping)"
+        self.update_lazy()
         r = []
         for l, v in iter(self.__map.items()):
             if (l==v):
@@ -86,6 +96,7 @@ class mapper(object):
 
     def outputs(self):
         "list image locations (modified in the mapping)"
+        self.update_lazy()
         L = []
         for l in sum([locations_of(e) for e in self.__map], []):
             if l._is_reg and (l.etype & (regtype.PC | regtype.FLAGS)):
@@ -99,10 +110,7 @@ class mapper(object):
 
     def has(self, loc):
         "check if the given location expression is touched by the mapper"
-        for l in self.__map.keys():
-            if loc == l:
-                return True
-        return False
+        return loc in self.__map or loc in self.__map.lazy
 
     def history(self, loc):
         k, v = self.__map.hist
@@ -120,6 +128,35 @@ class mapper(object):
             self.__map.delayed = None
             self.__setitem__(*kv)
 
+    def lazy(self, locs, f, *args):
+        """defer the update of locations locs (slices of registers) with
+           values given by the dict returned by f(*args). The update of all
+           pending slices of a register occurs only when this register is
+           read or when the mapper's locations are iterated (see update_lazy.)
+           Pending slices are dropped when they are overwritten.
+        """
+        rec = (f, args)
+        L = self.__map.lazy
+        for k in locs:
+            L.setdefault(k.x, {})[k] = rec
+
+    def update_lazy(self, x=None):
+        "update pending lazy slices of register x (or of all registers)"
+        L = self.__map.lazy
+        if not L:
+            return
+        for r in [x] if x is not None else list(L):
+            P = L.pop(r, None)
+            if not P:
+                continue
+            vals = {}
+            for k, rec in P.items():
+                v = vals.get(id(rec), None)
+                if v is None:
+                    f, args = rec
+                    v = vals[id(rec)] = f(*args)
+                self[k] = v[k]
+
     def rw(self):
         "get the read sizes and written sizes tuple"
         r = filter(lambda x: x._is_mem, self.inputs())
@@ -132,8 +169,25 @@ class mapper(object):
         "clear the current mapper, reducing it to the identity transform"
         self.__map.clear()
         self.__Mem = MemoryMap()
+        self.__undo = None
         self.conds = []
 
+    def copy(self):
+        """return a copy of the mapper. Register values are copied while
+           the memory map is a copy-on-write copy (see MemoryMap.copy.)
+        """
+        m = mapper(cur=self.cur)
+        g = m.__map
+        for loc, v in iter(self.__map.items()):
+            g[loc] = v.copy() if v._is_cmp else v
+        g.delayed = self.__map.delayed
+        g.lazy = {r: dict(L) for (r, L) in self.__map.lazy.items()}
+        if hasattr(self.__map, "hist"):
+            g.hist = self.__map.hist
+        m.setmemory(self.mmap.copy())
+        m.conds = list(self.conds)
+        return m
+
     def getmemory(self):
         "get the local :class:`MemoryMap` associated to the mapper"
         return self.__Mem
@@ -148,20 +202,27 @@ class mapper(object):
         return self.__map
 
     def __cmp__(self, m):
+        self.update_lazy()
+        m.update_lazy()
         d = cmp(self.__map.lastdict(), m.__map.lastdict())
         return d
 
     def __eq__(self, m):
+        self.update_lazy()
+        m.update_lazy()
         d = self.__map.lastdict() == m.__map.lastdict()
         return d
 
     # iterate over ordered correspondances:
     def __iter__(self):
+        self.update_lazy()
         for (loc, v) in iter(self.__map.items()):
             yield (loc, v)
 
     def R(self, x):
         "get the expression of register x"
+        if x in self.__map.lazy:
+            self.update_lazy(x)
         return self.__map.get(x, x)
 
     def M(self, k):
@@ -172,34 +233,55 @@ class mapper(object):
             return k.a.base
         n = self.aliasing(k)
         if n > 0:
-            f = lambda e: e[0]._is_ptr
-            items = filter(f, list(self.__map.items())[0:n])
-            res = mem(k.a, k.size, mods=list(items), endian=k.endian)
+            items = [(l, self.__map[l]) for l in self.__map.pointers()]
+            res = mem(k.a, k.size, mods=items, endian=k.endian)
         else:
             res = self._Mem_read(k.a, k.length, k.endian)
             res.sf = k.sf
         return res
 
+    def read_many(self, addresses, size, endian=1):
+        """returns the list of expressions of memory locations of given
+        size (in bits) at each of the given address expressions, ie.
+        [self(mem(a, size, endian=endian)) for a in addresses].
+        Raw bytes at concrete addresses are taken directly from the memory
+        buffer shared by consecutive addresses within the same object.
+        """
+        l = size // 8
+        order = "little" if endian == 1 else "big"
+        M = self.__Mem
+        res = []
+        buf, sta = None, 0
+        noaliasing = conf.Cas.noaliasing
+        for a in addresses:
+            o = None
+            if a._is_cst:
+                o = a.v
+            elif a._is_ptr and a.base._is_cst:
+                o = (a.base.v + a.disp) & a.base.mask
+            if o is not None:
+                if noaliasing or self.aliasing(mem(a, size)) == 0:
+                    if not M.mmio_at(o, l):
+                        if buf is None or not (sta <= o < sta + len(buf)):
+                            buf, sta = M.getbuffer(o), o
+                        if buf is not None and sta <= o and o + l <= sta + len(buf):
+                            x = int.from_bytes(buf[o - sta : o - sta + l], order)
+                            res.append(cst(x, size))
+                            continue
+            res.append(self(mem(a, size, endian=endian)))
+        return res
+
     def aliasing(self, k):
         """check if location k is possibly aliased in the mapper:
         i.e. the mapper writes to some other symbolic location expression
         after writing to k which might overlap with k."""
         if conf.Cas.noaliasing:
             return 0
-        K = list(self.__map.keys())
-        n = self.__map.lastw
-        try:
-            i = K.index(k.a)
-        except ValueError:
-            # k has never been written to explicitly
-            # but it is maybe in a zone that was written to
-            i = -1
-        for l in K[i + 1 : n]:
-            if not l._is_ptr:
-                continue
-            if l.base == k.a.base:
-                continue
-            return n
+        # if k has never been written to explicitly, it is maybe
+        # in a zone that was written to so that any pointer with
+        # another base is a possible alias:
+        if self.__map.aliased(k.a):
+            return self.__map.lastw
         return 0
 
     def _Mem_read(self, a, l, endian=1):
@@ -208,6 +290,11 @@ class mapper(object):
             res = self.__Mem.read(a, l)
         except MemoryError:  # no zone for location a;
             res = [exp(l * 8)]
+        if len(res) == 1 and isinstance(res[0], bytes):
+            # fast path for a single raw chunk (unless it is MMIO):
+            if not self.__Mem.mmio_at(a, l):
+                order = "little" if endian == 1 else "big"
+                return cst(int.from_bytes(res[0], order), l * 8)
         if endian == -1:
             res.reverse()
         P = []
@@ -215,16 +302,39 @@ class mapper(object):
         for p in res:
             plen = len(p)
             if isinstance(p, bytes):
-                p = cst(Bits(p[::endian], bitorder=1).int(), plen * 8)
+                p = cst(int.from_bytes(p, "little" if endian == 1 else "big"), plen * 8)
             elif isinstance(p, exp):
                 if p._is_def == 0:
                     # p is "bottom":
                     p = mem(a, p.size, disp=cur)
-                elif p.etype==et_ext and p._subrefs.get("mmio_r",None):
-                    p = p.stub(self,mode="r")
             P.append(p)
             cur += plen
-        return composer(P)
+        res = composer(P)
+        for sta, sto, read, _ in self.__Mem.mmio_at(a, l):
+            if read is not None:
+                res = self.__mmio_read(res, a, l, endian, sta, sto, read)
+        return res
+
+    def __mmio_read(self, res, a, l, endian, sta, sto, read):
+        # overlay the value of MMIO region [sta,sto[ on expression res
+        # of the l bytes read at address a:
+        v = read(self, sta, sto - sta)
+        if v is None:
+            return res
+        o = self.__Mem.reference(a)[1]
+        lo, hi = max(o, sta), min(o + l, sto)
+        v = v[(lo - sta) * 8 : (hi - sta) * 8]
+        pos = lo - o
+        if endian == -1:
+            pos = o + l - hi
+            if v.size > 8:
+                v = composer([v[i : i + 8] for i in range(v.size - 8, -1, -8)])
+        if v.size == res.size:
+            return v
+        x = comp(res.size)
+        x[0 : res.size] = res
+        x[pos * 8 : pos * 8 + v.size] = v
+        return x.simplify()
 
     def _Mem_write(self, a, v, endian=1):
         "write expression v at memory address a with given endianness"
@@ -233,13 +343,14 @@ class mapper(object):
         else:
             locs = (a,)
         for l in locs:
-            try:
-                oldv = self.__Mem.read(l,len(v))[0]
-            except MemoryError:
-                oldv = l
-            if isinstance(oldv,ext) and oldv._subrefs.get("mmio_w",None):
-                oldv.stub(self,mode="w")
+            W = [w for (_, _, _, w) in self.__Mem.mmio_at(l, v.length) if w]
+            if W:
+                # the write is handled by MMIO regions' callbacks:
+                for w in W:
+                    w(self, l, v)
             else:
+                if self.__undo is not None:
+                    self.__journal(l, v.length)
                 self.__Mem.write(l, v, endian)
             if l in self.__map:
                 del self.__map[l]
@@ -280,15 +391,24 @@ class mapper(object):
             if conf.Cas.memtrace or not conf.Cas.noaliasing:
                 # if we assume that aliasing may exists, we
                 # need to keep tracks of the memory writes ordering
-                # in the mapper:
-                self.__map.lastw = len(self.__map) + 1 #this is O(1) AFAIK...
+                # in the mapper (see generation.lastw):
                 self.__map[loc] = r
         else:
-            r = self.R(loc)
+            P = self.__map.lazy.get(loc, None)
+            pos = k.pos if k._is_slc else 0
+            if P:
+                # drop pending lazy slices overwritten by k:
+                for x in [x for x in P if x.pos < pos + k.size and pos < x.pos + x.size]:
+                    del P[x]
+                if not P:
+                    del self.__map.lazy[loc]
+            r = self.__map.get(loc, loc)
             if r._is_reg:
                 r = comp(loc.size)
                 r[0 : loc.size] = loc
-            pos = k.pos if k._is_slc else 0
+            elif r._is_cmp and self.__undo is not None:
+                # keep the journaled value unchanged:
+                r = r.copy()
             r[pos : pos + k.size] = v.simplify()
             self.__map[loc] = r
 
@@ -298,15 +418,86 @@ class mapper(object):
 
     def safe_update(self, instr):
         "update of the self mapper with instruction *only* if no exception occurs"
-        if not isinstance(instr,ext):
-            try:
-                m = mapper()
-                instr(m)
-                _ = self >> m
-            except Exception as e:
-                logger.error("instruction @ %s raises exception %s" % (instr.address, e))
-                raise e
-        self.update(instr)
+        if isinstance(instr,ext) or self.__undo is not None:
+            return self.update(instr)
+        self.begin()
+        try:
+            instr(self)
+        except Exception as e:
+            self.rollback()
+            logger.error("instruction @ %s raises exception %s" % (instr.address, e))
+            raise e
+        self.commit()
+
+    def begin(self):
+        """start a transaction: all updates of the mapper are journaled
+           until :meth:`commit` or cancelled by :meth:`rollback`.
+           (Transactions are not nested.)
+        """
+        self.__map.begin()
+        M = self.__Mem
+        # the MMIO registry is never modified in place, so that keeping its
+        # current lists is enough to restore it:
+        self.__undo = [
+            len(self.conds),
+            dict(M._zones),
+            (M._mmio, M._mmio_sta, M._mmio_ext),
+        ]
+
+    def __journal(self, l, n):
+        # journal the parts (with their endianness) of the n bytes at l
+        # that are going to be overwritten:
+        try:
+            r, o = self.__Mem.reference(l)
+        except MemoryError:
+            return
+        z = self.__Mem._zones.get(r, None)
+        if z is not None and z is self.__undo[1].get(r, None):
+            self.__undo.append((r, z.parts(o, n)))
+
+    def commit(self):
+        "end the current transaction, keeping all its updates"
+        self.__map.commit()
+        self.__undo = None
+
+    def rollback(self):
+        """cancel all updates since :meth:`begin`.
+           Note: the previous memory contents are written back (with their
+           endianness), zones that were created or copied (see MemoryMap.copy)
+           are dropped and the MMIO regions are restored, but side-effects of
+           mmio stubs are not cancelled.
+        """
+        U, self.__undo = self.__undo, None
+        self.__map.rollback()
+        if U is None:
+            return
+        del self.conds[U[0]:]
+        M = self.__Mem
+        Z = U[1]
+        R = set()
+        for r, z in list(M._zones.items()):
+            z0 = Z.get(r, None)
+            if z0 is z:
+                continue
+            # z is a new zone or a private copy of shared zone z0 (which
+            # has not been modified), so we just drop z:
+            if z._refs > 0:
+                z._refs -= 1
+            if z0 is None:
+                del M._zones[r]
+            else:
+                z0._refs += 1
+                M._zones[r] = z0
+                R.add(r)
+            if M._observers:
+                for o in z._map:
+                    M.notify(r, o.vaddr, len(o.data))
+        for r, parts in reversed(U[3:]):
+            if r in R:
+                continue
+            for o, v, endian in parts:
+                M.write(o if r is None else ptr(r, disp=o), v, endian)
+        M._mmio, M._mmio_sta, M._mmio_ext = U[2]
 
     def __call__(self, x):
         """evaluation of expression x in this map:
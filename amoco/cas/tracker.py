@@ -7,17 +7,148 @@
 from collections import deque
 
 class generation(dict):
+    """
+    A generation is the ordered dict of (location, expression) mappings of
+    a mapper, where locations are registers or pointers. In addition to the
+    dict, locations are indexed by insertion ordinals and pointer locations
+    are indexed by their base expression so that the mapper can check for
+    pointer aliasing and get its memory writes without iterating over all
+    its locations.
+
+    Attributes:
+        hist (tuple): the (location, previous value) of the last update.
+        lastw (int): the ordinal of the last written pointer location
+                     (0 if no pointer location was written.)
+        delayed (tuple): an optional delayed (location, value) update.
+        lazy (dict): the pending lazy updates of slices of registers, as a
+                     dict of {slice: (function, args)} for each register
+                     (see mapper.lazy.)
+        journal (dict): the previous (value, ordinal) of every location
+                        updated since :meth:`begin` (or None if changes
+                        are not journaled.)
+    """
+
+    def __init__(self, *args, **kargs):
+        super().__init__()
+        self.lastw = 0
+        self.delayed = None
+        self.lazy = {}
+        self.journal = None
+        self.__n = 0
+        self.__ord = {}
+        self.__ptrs = {}
+        self.__bases = {}
+        for k, v in dict(*args, **kargs).items():
+            self[k] = v
+
+    def __reduce__(self):
+        state = {"delayed": self.delayed, "lazy": self.lazy}
+        if hasattr(self, "hist"):
+            state["hist"] = self.hist
+        return (self.__class__, (list(self.items()),), state)
 
     def lastdict(self):
         return self
 
     def __setitem__(self, k, v):
         self.hist = (k, self.get(k,k))
+        if self.journal is not None and k not in self.journal:
+            self.journal[k] = (self.get(k, None), self.__ord.get(k, 0))
+        o = self.__ord.get(k, None)
+        if o is None:
+            self.__n += 1
+            o = self.__ord[k] = self.__n
+            if k._is_ptr:
+                self.__ptrs[k] = o
+                self.__bases.setdefault(k.base, {})[k] = o
+        if k._is_ptr:
+            self.lastw = o
         return super().__setitem__(k, v)
 
     def __getitem__(self, k):
         return self.get(k, None)
 
+    def __delitem__(self, k):
+        if self.journal is not None and k not in self.journal:
+            self.journal[k] = (self.get(k, None), self.__ord.get(k, 0))
+        super().__delitem__(k)
+        del self.__ord[k]
+        if k._is_ptr:
+            del self.__ptrs[k]
+            P = self.__bases[k.base]
+            del P[k]
+            if not P:
+                del self.__bases[k.base]
+
+    def clear(self):
+        super().clear()
+        self.lastw = 0
+        self.lazy = {}
+        self.journal = None
+        self.__ord.clear()
+        self.__ptrs.clear()
+        self.__bases.clear()
+
+    def begin(self):
+        "start journaling updates so that they can be cancelled by rollback"
+        self.journal = {}
+        lazy = {r: dict(L) for (r, L) in self.lazy.items()}
+        self.__saved = (self.__n, self.lastw, self.delayed, lazy, getattr(self, "hist", None))
+
+    def commit(self):
+        "stop journaling updates (and keep them)"
+        self.journal = None
+
+    def rollback(self):
+        "cancel all updates since last begin and stop journaling"
+        J, self.journal = self.journal, None
+        if J is None:
+            return
+        self.__n, self.lastw, self.delayed, self.lazy, hist = self.__saved
+        if hist is not None:
+            self.hist = hist
+        reorder = False
+        for k, (v, o) in J.items():
+            if k in self:
+                self.__delitem__(k)
+            if v is not None:
+                super().__setitem__(k, v)
+                self.__ord[k] = o
+                reorder = True
+        if reorder:
+            # restored locations must get back to their initial positions:
+            items = sorted(self.items(), key=lambda kv: self.__ord[kv[0]])
+            super().clear()
+            self.__ptrs.clear()
+            self.__bases.clear()
+            for k, v in items:
+                super().__setitem__(k, v)
+                if k._is_ptr:
+                    o = self.__ord[k]
+                    self.__ptrs[k] = o
+                    self.__bases.setdefault(k.base, {})[k] = o
+
+    def ordinal(self, k):
+        "returns the insertion ordinal of location k (0 if k is not a location)"
+        return self.__ord.get(k, 0)
+
+    def pointers(self):
+        "iterator over pointer locations in insertion order"
+        return iter(self.__ptrs)
+
+    def aliased(self, a):
+        """returns True if a pointer location with another base than pointer a
+        has been inserted after a (or at all if a is not a location.)
+        """
+        i = self.__ord.get(a, 0)
+        for b, P in self.__bases.items():
+            if b == a.base:
+                continue
+            # last inserted pointer with base b:
+            if next(reversed(P.values())) > i:
+                return True
+        return False
+
 
 class nextgeneration(object):
     def __init__(self, *args, **kargs):
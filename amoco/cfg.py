@@ -20,12 +20,174 @@ from amoco.logger import Log
 logger = Log(__name__)
 logger.debug("loading module")
 
+import os
+import sys
+import pickle
+import hashlib
 from grandalf.graphs import Vertex, Edge, Graph
+from amoco.config import conf
 from amoco.cas.mapper import mapper
 from amoco.system.memory import MemoryZone
-from collections import defaultdict
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict, OrderedDict
 from amoco.code import _code_misc_default
 
+# ------------------------------------------------------------------------------
+class MapperCache(object):
+    """
+    A bounded cache of the mappers of blocks of instructions, shared by all
+    nodes (see :attr:`node.map`) and by the static analysis classes.
+    Mappers are keyed by the content of the block rather than by the block
+    object: the instructions' class and spec modules (ie. cpu and instruction
+    set), the raw bytes of the block and the address of the block if the
+    mapper is made *absolute* by setting the pc value to this address
+    (otherwise the mapper is address-relative and its key has no address.)
+    The key also includes the parameters that affect mappers (conf.Cas
+    noaliasing, complexity, memtrace and conf.Arch.lazyflags.)
+
+    If conf.Code.mapcachedir is not "", mappers are also pickled in this
+    directory so that identical blocks found in other programs (or in
+    later sessions) are not executed again. The filename of a mapper is a
+    hash of its key and of the sources of the instructions' semantics and
+    of the modules that build mappers from them (see :attr:`MODULES`.)
+
+    Note:
+        Instructions' semantics are assumed to depend on the instruction's
+        address only through the pc register (this is how all amoco
+        semantics are written.)
+
+    Attributes:
+        hits (int): number of mappers returned from the cache (or disk).
+        misses (int): number of mappers that had to be computed.
+    """
+
+    VERSION = 2
+    MODULES = (
+        "amoco.arch.core",
+        "amoco.cas.expressions",
+        "amoco.cas.mapper",
+        "amoco.cas.tracker",
+    )
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._srcs = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return "<%s len=%d, hits=%d, misses=%d>" % (
+            self.__class__.__name__,
+            len(self),
+            self.hits,
+            self.misses,
+        )
+
+    def clear(self):
+        self._cache.clear()
+
+    def key(self, block, pc=None):
+        """returns the cache key of the mapper of block, made absolute
+           if pc is provided.
+        """
+        I = block.instr
+        c = I[0].__class__
+        specs = sorted({i.spec.hook.__module__ for i in I if i.spec is not None})
+        a = None
+        if pc is not None:
+            a = block.address
+            a = a.value if a._is_cst else str(a)
+        return (
+            "%s.%s" % (c.__module__, c.__name__),
+            tuple(specs),
+            block.raw(),
+            a,
+            (conf.Cas.noaliasing, conf.Cas.complexity, conf.Cas.memtrace),
+            conf.Arch.lazyflags,
+        )
+
+    def get(self, block, pc=None):
+        """returns a (private) copy of the mapper of block, or of the mapper
+           of block where the pc register is replaced by the block's address
+           if pc is provided.
+        """
+        size = conf.Code.mapcache
+        cachedir = conf.Code.mapcachedir
+        if size <= 0 and not cachedir:
+            self.misses += 1
+            return self.compute(block, pc)
+        k = self.key(block, pc)
+        m = self._cache.get(k, None)
+        if m is not None:
+            self.hits += 1
+            self._cache.move_to_end(k)
+            return m.copy()
+        if cachedir:
+            filename = self.filename(k, block)
+            m = self.load(filename)
+        if m is None:
+            self.misses += 1
+            m = self.compute(block, pc)
+            if cachedir:
+                self.save(filename, m)
+        else:
+            self.hits += 1
+        if size > 0:
+            self._cache[k] = m
+            while len(self._cache) > size:
+                self._cache.popitem(last=False)
+            m = m.copy()
+        return m
+
+    @staticmethod
+    def compute(block, pc=None):
+        m = mapper(block.instr)
+        if pc is not None:
+            m = m.use((pc, block.address))
+        return m
+
+    def filename(self, k, block):
+        c = block.instr[0].__class__
+        h = self._srcs.get(c, None)
+        if h is None:
+            # hash of the sources of the instructions' semantics:
+            h = hashlib.sha256(b"%d" % self.VERSION)
+            uarch = getattr(c, "_uarch", {})
+            M = {f.__module__ for f in uarch.values() if callable(f)}
+            for mn in sorted(M) + list(self.MODULES):
+                fn = getattr(sys.modules.get(mn, None), "__file__", None)
+                if fn is not None:
+                    with open(fn, "rb") as f:
+                        h.update(f.read())
+            h = self._srcs[c] = h.hexdigest()
+        h = hashlib.sha256(("%s:%s" % (h, repr(k))).encode()).hexdigest()
+        return os.path.join(os.path.expanduser(conf.Code.mapcachedir), h + ".map")
+
+    @staticmethod
+    def load(filename):
+        if os.path.exists(filename):
+            try:
+                with open(filename, "rb") as f:
+                    return pickle.load(f)
+            except Exception:
+                logger.warning("can't load mapper cache file %s" % filename)
+        return None
+
+    @staticmethod
+    def save(filename, m):
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename, "wb") as f:
+                pickle.dump(m, f, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.warning("can't save mapper cache file %s" % filename)
+
+
+mapcache = MapperCache()
+
 # ------------------------------------------------------------------------------
 class node(Vertex):
     """A node is a graph vertex that embeds a :mod:`code` object.
@@ -42,7 +204,8 @@ class node(Vertex):
         c (graph_core): reference to the connected component that contains this
             node.
         view: the block or func view object associated with our data.
-        map(mapper): the map object associated with out data.
+        map(mapper): the map object associated with out data (obtained
+            from the :class:`MapperCache` mapcache for blocks.)
 
     Methods:
         cut(address): reduce the block size up to given address if data is block.
@@ -87,7 +250,7 @@ class node(Vertex):
             return self._map
         else:
             if self.data._is_block:
-                self._map = mapper(self.data.instr)
+                self._map = mapcache.get(self.data)
             return self._map
 
     def cut(self, address):
@@ -217,7 +380,11 @@ class graph(Graph):
         get_by_name(name): get the node with the given name (as string).
 
         get_with_address(vaddr): get the node that contains the given *vaddr*
-            :class:`~cas.expressions.cst` expression.
+            :class:`~cas.expressions.cst` expression (or int).
+
+        callers(vaddr): get the nodes that link to the node(s) at address *vaddr*.
+
+        callees(vaddr): get the nodes linked from the node(s) at address *vaddr*.
 
         add_vertex(v,[support=None]): add node v to the graph and declare
             node support in the default MemoryZone or the overlay zone if
@@ -262,7 +429,88 @@ class graph(Graph):
     def __init__(self, *args, **kargs):
         self.support = MemoryZone()
         self.overlay = None
+        self.__names = {}
+        self.__starts = []
+        self.__blocks = {}
+        self.__maxlen = 0
+        self.__xto = defaultdict(list)
+        self.__xfrom = defaultdict(list)
         super(graph, self).__init__(*args, **kargs)
+        for v in self.V():
+            self.__index_vertex(v)
+        for e in self.E():
+            self.__index_edge(e)
+
+    # indexes:
+    # --------
+
+    @staticmethod
+    def __key(a):
+        if isinstance(a, int):
+            return a
+        return a.value if a._is_cst else a
+
+    def __index_vertex(self, v):
+        self.__names.setdefault(v.name, v)
+        if v.data._is_block and v.data.address._is_cst:
+            a = v.data.address.value
+            L = self.__blocks.get(a, None)
+            if L is None:
+                L = self.__blocks[a] = []
+                insort(self.__starts, a)
+            L.append(v)
+            self.__maxlen = max(self.__maxlen, len(v))
+
+    def __unindex_vertex(self, v):
+        if self.__names.get(v.name, None) is v:
+            del self.__names[v.name]
+        if v.data._is_block and v.data.address._is_cst:
+            a = v.data.address.value
+            L = self.__blocks.get(a, [])
+            if v in L:
+                L.remove(v)
+            # another (overlay) node may have the same name:
+            for n in L:
+                self.__names.setdefault(n.name, n)
+            if not L:
+                self.__blocks.pop(a, None)
+                i = bisect_left(self.__starts, a)
+                if i < len(self.__starts) and self.__starts[i] == a:
+                    del self.__starts[i]
+
+    def __index_edge(self, e):
+        for D, v in ((self.__xfrom, e.v[0]), (self.__xto, e.v[1])):
+            L = D[self.__key(v.data.address)]
+            if not any(x is e for x in L):
+                L.append(e)
+
+    def __unindex_edge(self, e):
+        for D, v in ((self.__xfrom, e.v[0]), (self.__xto, e.v[1])):
+            k = self.__key(v.data.address)
+            L = [x for x in D.get(k, []) if x is not e]
+            if L:
+                D[k] = L
+            else:
+                D.pop(k, None)
+
+    def __add_vertex(self, v):
+        # add v as a new component if v is not already in the graph:
+        if v in self:
+            return v
+        g = self.component_class(directed=self.directed)
+        v = g.add_single_vertex(v)
+        self.C.append(g)
+        self.__index_vertex(v)
+        return v
+
+    def __contains__(self, v):
+        if isinstance(v, node):
+            n = self.__names.get(v.name, None)
+            if n is v:
+                return True
+            if n is None:
+                return False
+        return super(graph, self).__contains__(v)
 
     def __cut_add_vertex(self, v, mz, vaddr, mo):
         oldnode = mo.data.val
@@ -274,24 +522,28 @@ class graph(Graph):
         if not cutdone:
             if mz is self.overlay:
                 logger.warning("double overlay block at %s" % vaddr)
-                v = super(graph, self).add_vertex(v)
+                v = self.__add_vertex(v)
                 v.misc["double-overlay"] = 1
                 return v
             overlay = self.overlay or MemoryZone()
             return self.add_vertex(v, support=overlay)
         else:
             oldnode.misc["cut"] = cutdone
-            v = super(graph, self).add_vertex(v)  # ! avoid recursion for add_edge
+            v = self.__add_vertex(v)  # ! avoid recursion for add_edge
             mz.write(vaddr, v)
+            # move outgoing links of oldnode to v before linking them:
+            succ = oldnode.N(+1)
             self.add_edge(link(oldnode, v))
-            for n in oldnode.N(+1):
+            for n in succ:
                 self.add_edge(link(v, n))
                 self.remove_edge(oldnode.e_to(n))
             return v
 
     def add_vertex(self, v, support=None):
+        if v in self:
+            return v
         if v.data._is_func:
-            return super(graph, self).add_vertex(v)
+            return self.__add_vertex(v)
         # insert block:
         vaddr = v.data.address
         if support is None:
@@ -323,28 +575,53 @@ class graph(Graph):
                             if support is self.overlay:
                                 # we already are in overlay...
                                 logger.warning("double overlay block at %s" % vaddr)
-                                v = super(graph, self).add_vertex(v)
+                                v = self.__add_vertex(v)
                                 v.misc["double-overlay"] = 1
                                 return v
                             support = self.overlay or MemoryZone()
-        v = super(graph, self).add_vertex(v)  # before support write !!
+        v = self.__add_vertex(v)  # before support write !!
         support.write(vaddr, v)
         return v
 
+    def remove_vertex(self, v):
+        for e in v.e:
+            self.__unindex_edge(e)
+        self.__unindex_vertex(v)
+        return super(graph, self).remove_vertex(v)
+
+    def add_edge(self, e):
+        e = super(graph, self).add_edge(e)
+        self.__index_edge(e)
+        return e
+
+    def remove_edge(self, e):
+        self.__unindex_edge(e)
+        return super(graph, self).remove_edge(e)
+
     def get_by_name(self, name):
-        for v in self.V():
-            if v.name == name:
-                return v
-        return None
+        return self.__names.get(name, None)
 
     def get_with_address(self, vaddr):
-        i = self.support.locate(vaddr)
-        if i is not None:
-            mo = self.support._map[i]
-            if vaddr in mo:
-                return mo.data.val
+        if not isinstance(vaddr, int):
+            if not vaddr._is_cst:
+                return None
+            vaddr = vaddr.value
+        i = bisect_right(self.__starts, vaddr)
+        j = bisect_left(self.__starts, vaddr - self.__maxlen + 1, 0, i)
+        for a in reversed(self.__starts[j:i]):
+            for v in self.__blocks[a]:
+                if vaddr < a + len(v):
+                    return v
         return None
 
+    def callers(self, vaddr):
+        "returns the list of nodes that have a link to the node(s) at address vaddr"
+        return [e.v[0] for e in self.__xto.get(self.__key(vaddr), [])]
+
+    def callees(self, vaddr):
+        "returns the list of nodes linked from the node(s) at address vaddr"
+        return [e.v[1] for e in self.__xfrom.get(self.__key(vaddr), [])]
+
     def to_dot(self, name=None, full=True):
         dot = "digraph G {\n"
         dot += "    graph [orientation=landscape, labeljust=left];\n"
@@ -20,6 +20,7 @@ all provide a common API with:
 """
 
 from heapq import heappush
+from collections import defaultdict
 
 from amoco.logger import Log
 
@@ -180,16 +181,24 @@ class func(acode):
     Attributes:
         cfg (graph_core): the :class:`graph_core` CFG of the function
                           (see :mod:`cfg`.)
+        name (str): the name of the function (or None.)
+        map (mapper): the mapper of the function (see :meth:`makemap`),
+                      or None if the function is not completed.
+        misc (dict): various properties of the function, like the mappers
+                     of its exit nodes ("heads").
         blocks (list[block]): the list of blocks in the CFG
         support (tuple): the memory footprint of the function
     """
 
     _is_func = True
-    __slots__ = ["cfg", "view"]
+    __slots__ = ["cfg", "name", "map", "misc", "view"]
 
     # the init of a func takes a core_graph and creates a map of it:
     def __init__(self, g=None):
         self.cfg = g
+        self.name = None
+        self.map = None
+        self.misc = defaultdict(_code_misc_default)
         if self.cfg:
             roots = self.cfg.roots()
             if len(roots) > 1:
@@ -219,11 +228,67 @@ class func(acode):
     def __str__(self):
         return "%s{%d}" % (self.address, len(self.blocks))
 
+    def makemap(self, widening=True):
+        """computes the mapper of the function from the maps of its nodes.
+        Nodes are visited in topological order (feedback links of loops are
+        ignored) so that the mapper at the end of every node is its own map
+        composed with the merge of the mappers of its parents.
+        The mappers at the end of exit nodes (without successors) are stored
+        in misc["heads"] and the returned mapper is their merge.
+        Nodes that embed a func (calls) use the func map if it is already
+        computed (the call is ignored otherwise.)
+
+        Args:
+            widening (bool): use widening when merging mappers (default True.)
+
+        Returns:
+            mapper: the merge of all exit nodes' mappers.
+        """
+        from amoco.cas.mapper import merge
+
+        root = self.cfg.roots()[0]
+        # depth-first search for the topological order and feedback links:
+        order, back, seen = [], set(), {root: True}
+        stack = [(root, iter(root.N(+1)))]
+        while stack:
+            n, it = stack[-1]
+            for c in it:
+                if c not in seen:
+                    seen[c] = True
+                    stack.append((c, iter(c.N(+1))))
+                    break
+                if seen[c]:
+                    back.add((n, c))
+            else:
+                stack.pop()
+                seen[n] = False
+                order.append(n)
+        order.reverse()
+        M, heads = {}, {}
+        for n in order:
+            P = [M[p] for p in n.N(-1) if p in M and (p, n) not in back]
+            m = None
+            for x in P:
+                m = x if m is None else merge(m, x, widening=widening)
+            nm = n.map if n.data._is_block else getattr(n.data, "map", None)
+            if nm is not None:
+                m = nm.copy() if m is None else (m >> nm)
+            M[n] = m
+            if all(((n, c) in back) for c in n.N(+1)):
+                heads[n] = m
+        self.misc["heads"] = heads
+        res = None
+        for m in heads.values():
+            if m is not None:
+                res = m if res is None else merge(res, m, widening=widening)
+        return res
+
     def __getstate__(self):
-        return self.cfg
+        return (self.cfg, self.name, self.map, dict(self.misc))
 
     def __setstate__(self, state):
-        self.cfg = state
+        self.cfg, self.name, self.map, misc = state
+        self.misc = defaultdict(_code_misc_default, misc)
         self.view = funcView(self)
 
 
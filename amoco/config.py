@@ -21,6 +21,8 @@ Attributes:
             - 'bytecode' will show the hex encoded bytecode string of every instruction if True (default)
             - 'padding' will add the specified amount of blank chars to between address/bytecode/instruction (default 4).
             - 'hist' number of instruction's history shown in emulator view (default 3).
+            - 'mapcache' max number of blocks' mappers kept in memory by cfg.mapcache (default 4096, 0 disables.)
+            - 'mapcachedir' directory where cfg.mapcache also saves blocks' mappers if not "" (default "").
 
         - 'Cas' which deals with parameters of the algebra system:
 
@@ -28,6 +30,8 @@ Attributes:
             - 'complexity' threshold for expressions (default 100). See `cas.expressions` for details.
             - 'memtrace' store memory writes as mapper items if True (default).
             - 'unicode' will use math unicode symbols for expressions operators if True (default False).
+            - 'hashcons' will share structurally equal expressions built by operators if True (default False).
+            - 'memo' max number of memoized expressions' simplifications (default 16384, 0 disables.)
 
         - 'DB' which deals with database backend options:
 
@@ -57,18 +61,33 @@ Attributes:
 
             - 'hist' defines the size of the emulator's instructions' history list (defaults to 100.)
             - 'stacksize' defines the size in bytes of the emulator's frame view that displays the stack.
+            - 'concrete' will execute instructions with concrete values when possible if True (default False).
+
+        - 'System' which deals with amoco's system parameters:
+
+            - 'pagesize' defines the default memory page size in bytes (defaults to 4096.)
+            - 'icache' defines the max number of decoded instructions cached by a task (0 disables the cache.)
+            - 'memzone' selects the memory zones implementation, 'sorted' (default) or 'list'.
+            - 'columnar' min number of entries of ELF symbol/relocation tables decoded as
+              columnar tables (default 0 which disables columnar tables.)
 
         - 'Arch' which allows to configure assembly format parameters:
 
             - 'assemble' (unused)
             - 'format_x86' one of 'Intel' (default), 'ATT'
             - 'format_x64' one of 'Intel' (default), 'ATT'
+            - 'compiled' list of cpu names ('x86', 'x64', 'armv7', 'armv8', 'riscv', 'tricore')
+              for which the disassembler uses compiled dispatch tables (default []).
+            - 'cachedir' directory where parsed specs and disassemblers' trees are cached
+              (default '' which disables the cache.)
+            - 'lazyflags' x86/x64 arithmetic flags are computed only when read if True
+              (default False.)
 """
 
 
 import os
 from traitlets.config import Configurable,PyFileConfigLoader
-from traitlets import Integer, Unicode, Bool, observe
+from traitlets import Integer, Unicode, Bool, List, observe
 
 # -----------------------
 
@@ -98,6 +117,10 @@ class Code(Configurable):
         padding (int): add space-padding bytes to bytecode (default=4).
         hist (int): number of history instructions to show in
                     emulator's code frame view.
+        mapcache (int): max number of blocks' mappers kept in memory by
+                        cfg.mapcache (defaults to 4096, 0 disables.)
+        mapcachedir (str): if not "" (default), the directory where cfg.mapcache
+                           saves blocks' mappers (see cfg.MapperCache.)
     """
     helper = Bool(True, config=True)
     header = Bool(True, config=True)
@@ -106,6 +129,8 @@ class Code(Configurable):
     segment = Bool(True, config=True)
     padding = Integer(4, config=True)
     hist = Integer(3, config=True)
+    mapcache = Integer(0x1000, config=True)
+    mapcachedir = Unicode("", config=True)
 
 
 class Cas(Configurable):
@@ -119,11 +144,18 @@ class Cas(Configurable):
         noaliasing (Bool): If True (default), then assume that symbolic memory
                            expressions (pointers) are **never** aliased.
         memtrace (Bool): keep memory writes in mapper in addition to MemoryMap (default).
+        hashcons (Bool): If True, expressions returned by oper, slicer and composer
+                         are pooled so that structurally equal expressions are the
+                         same object (see cas.expressions.hashcons.) Defaults to False.
+        memo (int): max number of op/uop simplifications kept in the table of
+                    cas.expressions.memo (defaults to 16384, 0 disables memoization.)
     """
     complexity = Integer(0, config=True)
     unicode = Bool(False, config=True)
     noaliasing = Bool(True, config=True)
     memtrace = Bool(True, config=True)
+    hashcons = Bool(False, config=True)
+    memo = Integer(0x4000, config=True)
 
 
 class Log(Configurable):
@@ -186,8 +218,21 @@ class Arch(Configurable):
         assemble (Bool): unused yet.
         format_x86 (str): select disassembly flavor: Intel (default) vs. AT&T (att).
         format_x64 (str): select disassembly flavor: Intel (default) vs. AT&T (att).
+        compiled (list): names of cpus ('x86', 'x64', 'armv7', 'armv8', 'riscv', 'tricore')
+                         for which the disassembler uses compiled dispatch tables
+                         rather than the specs tree (see arch.core.disassembler.compile.)
+        cachedir (str): if not "" (default), the directory where parsed ispecs and
+                        disassemblers' trees are saved to speed up later imports
+                        (see arch.core.SpecCache.)
+        lazyflags (Bool): if True, x86/x64 semantics record the operation and
+                          operands of the last flags update in the mapper, and
+                          flags are computed only when read (see mapper.lazy.)
+                          Defaults to False.
     """
     assemble = Bool(False, config=True)
+    compiled = List(Unicode(), default_value=[], config=True)
+    cachedir = Unicode("", config=True)
+    lazyflags = Bool(False, config=True)
     format_x86 = Unicode("Intel", config=True)
 
     @observe("format_x86")
@@ -212,9 +257,13 @@ class Emu(Configurable):
     Attributes:
         hist (int): size of the emulated instruction history list (defaults to 100.)
         stacksize (int): max-size of the stack frame displayed by the emulator (defaults to 256.)
+        concrete (Bool): If True, emulators execute instructions in a concrete
+                         state (see cas.cmapper) and fall back to the symbolic
+                         state only when needed. Defaults to False.
     """
     hist = Integer(100, config=True)
     stacksize = Integer(256, config=True)
+    concrete = Bool(False, config=True)
 
 
 class System(Configurable):
@@ -226,11 +275,23 @@ class System(Configurable):
         aslr (Bool): simulates ASLR if True. (not supported yet.)
         nx (Bool): unused.
         romfile (Unicode): path to ROM file.
+        icache (int): max number of decoded instructions cached by each task
+                      (defaults to 16384, 0 disables the cache.)
+        memzone (Unicode): class of memory zones created by MemoryMaps, either
+                           'sorted' (default) for SortedMemoryZone or 'list' for
+                           MemoryZone (see system.memory.memoryzone.)
+        columnar (int): ELF symbol and relocation tables with at least this
+                        number of entries are decoded as columnar tables
+                        (see system.elf.SymTable, defaults to 0 which
+                        disables columnar tables.)
     """
     pagesize = Integer(4096, config=True)
     aslr = Bool(False, config=True)
     nx = Bool(False, config=True)
     romfile = Unicode("apple2.rom",config=True)
+    icache = Integer(0x4000, config=True)
+    memzone = Unicode("sorted", config=True)
+    columnar = Integer(0, config=True)
 
 
 class Config(object):
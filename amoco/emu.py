@@ -13,10 +13,13 @@ The emu module of amoco implements the emulator class :class:`emul`.
 
 """
 
+import time
+from bisect import bisect_left
 from collections import deque
 
 from amoco.config import conf
 from amoco.arch.core import DecodeError
+from amoco.cas.cmapper import cmapper, NotConcrete
 from amoco.sa import lsweep
 from amoco.ui.views import emulView
 from amoco.logger import Log
@@ -35,6 +38,9 @@ class emul(object):
         self.pc = task.cpu.PC()
         self.psz = self.pc.size
         self.hooks = []
+        self.__hooks = None
+        self.__nhooks = 0
+        self.__mmap = None
         self.watch = {}
         self.handlers = {}
         if task.OS is not None:
@@ -46,8 +52,84 @@ class emul(object):
         self.view = emulView(self)
         self.handlers[EmulError] = self.stop
         self.handlers[DecodeError] = self.stop
+        self.cstate = None
+        if conf.Emu.concrete:
+            self.use_concrete()
+
+    def use_concrete(self, flag=True):
+        """enable (or disable) the execution of instructions in a concrete
+           state (see :class:`cas.cmapper.cmapper`) rather than in the task's
+           symbolic state. Instructions that need symbolic values are still
+           executed in the task's state.
+
+           Note: with a concrete state, the task's state is updated only
+                 when :meth:`sync` is called.
+        """
+        self.sync()
+        self.cstate = cmapper(self.task.state) if flag else None
+
+    def sync(self):
+        """write the concrete state (if any) back into the task's state
+           and drop its cached values so that they are reloaded from the
+           task's state (which can thus be modified after a sync.)
+        """
+        if self.cstate is not None:
+            self.cstate.sync()
+            self.cstate.clear()
+            self.cstate.state = self.task.state
+
+    def cstepi(self):
+        """execute the next instruction in the concrete state and return it,
+           or return None if the instruction needs the symbolic state.
+        """
+        cm = self.cstate
+        try:
+            addr = cm.R(self.pc)
+            if not addr._is_cst:
+                return None
+            d = self.cpu.disassemble
+            i = cm.icache.get((addr.v, d.iset(), d.endian()), None)
+            if i is None:
+                i = self.cdecode(addr)
+            cm.begin()
+            i(cm)
+            if i.misc.get('delayed',False):
+                islot = self.cdecode(addr+i.length)
+                islot(cm)
+            else:
+                islot = None
+            cm.commit()
+        except (NotConcrete, DecodeError):
+            # let the symbolic state handle (and report) it:
+            cm.rollback()
+            return None
+        except Exception:
+            cm.rollback()
+            raise
+        self.hist.append(i)
+        if islot is not None:
+            self.hist.append(islot)
+        return i
+
+    def cdecode(self, addr):
+        cm = self.cstate
+        d = self.cpu.disassemble
+        b = cm.fetch(addr.v, d.maxlen)
+        i = d(b)
+        if i is None:
+            raise NotConcrete(addr)
+        if i.address is None:
+            i.address = addr
+        cm.setcode((addr.v, d.iset(), d.endian()), i)
+        return i
 
     def stepi(self,trace=False):
+        if self.cstate is not None:
+            if not trace:
+                i = self.cstepi()
+                if i is not None:
+                    return i
+            self.sync()
         addr = self.task.state(self.pc)
         if addr._is_top:
             logger.warning("%s has reached top value")
@@ -70,6 +152,26 @@ class emul(object):
             raise DecodeError(addr)
         return i
 
+    def snapshot(self):
+        """returns a snapshot of the emulated task's state and of the
+           instructions' history. The state's memory is shared with the
+           task until either writes into it (copy-on-write).
+        """
+        self.sync()
+        return (self.task.state.copy(), list(self.hist))
+
+    def restore(self,snap):
+        """restore the task's state and history from the provided snapshot.
+           The snapshot remains valid and can be restored again.
+        """
+        state, hist = snap
+        self.task.state = state.copy()
+        if self.cstate is not None:
+            self.cstate.clear()
+            self.cstate.state = self.task.state
+        self.hist.clear()
+        self.hist.extend(hist)
+
     def iterate(self,trace=False):
         lasti = None
         while True:
@@ -78,18 +180,10 @@ class emul(object):
                 logger.info("stop iteration due to %s"%reason.__doc__)
                 break
             try:
-                addr = self.task.state(self.pc)
-                if addr._is_top:
-                    raise EmulError()
-                print("%s: %s"%(type(addr),addr))
-                lasti = i = self.task.read_instruction(addr)
+                self.__update()
+                lasti = i = self.stepi(trace)
                 if trace:
-                    ops_v = [(self.task.state(o),o) for o in i.operands]
-                    i.misc['trace'] = ops_v
-                self.task.state.update(i)
-                self.hist.append(i)
-                if trace:
-                    yield lasti,ops_v
+                    yield lasti,i.misc['trace']
                 else:
                     yield lasti
             except Exception as e:
@@ -98,6 +192,65 @@ class emul(object):
                 if not self.exception_handler(e):
                     break
 
+    def run(self, max_steps=None, until=None, trace=False):
+        """execute instructions in a loop until a breakpoint or watchpoint
+           is reached, until the *until* condition is met or until max_steps
+           instructions have been executed.
+
+           Arguments:
+           max_steps (int): the maximum number of instructions to execute.
+           until (int/cst/callable): a pc address at which execution stops,
+               or a callable f(emul,i) that returns True to stop after
+               instruction i.
+           trace (bool): log every instruction with its operands' values
+               (at INFO level.)
+
+           Returns:
+           the tuple (count, seconds, reason) where count is the number of
+           executed instructions and reason is the docstring of the hook that
+           stopped the execution or a string describing why it stopped.
+
+           Note: hooks are checked after every instruction with
+                 :meth:`checkstate` like in :meth:`iterate`.
+        """
+        if until is not None and not callable(until):
+            if not isinstance(until, int):
+                until = until.v
+            until = (lambda e, i, a=until: e.pcvalue() == a)
+        count = 0
+        reason = "max_steps"
+        t0 = time.time()
+        while max_steps is None or count < max_steps:
+            try:
+                self.__update()
+                i = self.stepi(trace)
+            except Exception as e:
+                # we stop only if the handler returns False:
+                if not self.exception_handler(e):
+                    reason = "%s %s" % (type(e).__name__, e)
+                    break
+                continue
+            count += 1
+            if trace:
+                ops_v = ["%s (%s)" % (v, o) for v, o in i.misc["trace"]]
+                logger.info(
+                    "%s: %s %s"
+                    % (i.address, "{: <8}".format(i.mnemonic.lower()), ", ".join(ops_v))
+                )
+            status, who = self.checkstate(i)
+            if status:
+                reason = who.__doc__
+                break
+            if until is not None and until(self, i):
+                reason = "until"
+                break
+        dt = time.time() - t0
+        logger.info(
+            "stopped after %d steps (%.1f steps/s): %s"
+            % (count, count / dt if dt > 0 else 0.0, reason)
+        )
+        return (count, dt, reason)
+
     def exception_handler(self, e):
         te = type(e)
         logger.verbose("exception %s received" % te)
@@ -105,19 +258,103 @@ class emul(object):
             return self.handlers[te](self, e)
         raise (e)
 
+    def pcvalue(self):
+        "returns the current pc address as an int (or None if not concrete)"
+        if self.cstate is not None:
+            x = self.cstate.R(self.pc)
+        else:
+            x = self.task.state(self.pc)
+        return x.v if x._is_cst else None
+
     def checkstate(self, prev=None):
         """returns True iff the current state matches a condition that stops
            iterations of instructions. Breakpoints typically return True.
+
+           Note: hooks are indexed (see :meth:`reindex`) so that breakpoints
+                 on pc addresses cost a single dict lookup, mnemonic
+                 breakpoints are checked only after an instruction with this
+                 mnemonic, and watchpoints on memory at constant addresses are
+                 checked only after a write that overlaps them (or after
+                 a write at a symbolic address.)
         """
-        res = False
-        who = None
-        if prev is not None:
-            for f in self.hooks:
-                res |= f(self, prev)
-                if res == True:
-                    who = f
-                    break
-        return res,who
+        self.__update()
+        if prev is None:
+            return False,None
+        if self.__bps:
+            f = self.__bps.get(self.pcvalue(),None)
+            if f is not None:
+                return True,f
+        H = self.__ibps.get(prev.mnemonic.lower(),None)
+        if self.__pending:
+            H = (H or [])+self.__pending
+            self.__pending = []
+        if self.__others:
+            H = (H or [])+self.__others
+        if H:
+            if self.cstate is not None:
+                self.cstate.sync()
+            for f in H:
+                if f(self, prev):
+                    return True,f
+        return False,None
+
+    def __update(self):
+        # watchpoints need to observe the task's memory map before the next
+        # instruction is executed:
+        if self.hooks is not self.__hooks or len(self.hooks)!=self.__nhooks:
+            self.reindex()
+        elif self.__wps and self.task.state.mmap is not self.__mmap:
+            self.__observe(self.task.state.mmap)
+
+    def reindex(self):
+        """build the indexes of hooks used by :meth:`checkstate`.
+           (This is done automatically before every instruction executed by
+           :meth:`iterate` or :meth:`run` when the hooks list is replaced or
+           when its length changes.)
+        """
+        self.__hooks = self.hooks
+        self.__nhooks = len(self.hooks)
+        self.__bps = {}
+        self.__ibps = {}
+        self.__wps = []
+        self.__pending = []
+        self.__others = []
+        for f in self.hooks:
+            a = getattr(f, "address", None)
+            m = getattr(f, "mnemonic", None)
+            w = getattr(f, "range", None)
+            if a is not None:
+                self.__bps.setdefault(a, f)
+            elif m:
+                self.__ibps.setdefault(m, []).append(f)
+            elif w is not None:
+                self.__wps.append((w[0], w[0]+w[1], f))
+            else:
+                self.__others.append(f)
+        self.__wps.sort(key=lambda w: w[0])
+        self.__wsta = [w[0] for w in self.__wps]
+        self.__wlen = max((w[1]-w[0] for w in self.__wps), default=0)
+        self.__observe(self.task.state.mmap if self.__wps else None)
+
+    def __observe(self, mmap):
+        if self.__mmap is not None:
+            self.__mmap.unsubscribe(self.__written)
+        self.__mmap = mmap
+        if mmap is not None:
+            mmap.subscribe(self.__written)
+
+    def __written(self, r, o, l):
+        # memory map observer: watchpoints that overlap [o,o+l[ are pending
+        if r is not None:
+            # a write at a symbolic address may alias any watched address:
+            W = self.__wps
+        else:
+            i = bisect_left(self.__wsta, o-self.__wlen+1)
+            j = bisect_left(self.__wsta, o+l)
+            W = self.__wps[i:j]
+        for sta, sto, f in W:
+            if (r is not None or o < sto) and f not in self.__pending:
+                self.__pending.append(f)
 
     def breakpoint(self,x=''):
         """add breakpoint hook associated with the provided expression.
@@ -131,7 +368,7 @@ class emul(object):
                  excludes expressions related to instruction bytes,
                  mnemonic or operands. See ibreakpoint method.
         """
-        if x == '':
+        if isinstance(x,str):
             for index,f in enumerate(self.hooks):
                 if f.__doc__.startswith('break'):
                     x += "[% 2d] %s\n"%(index,f.__doc__)
@@ -142,6 +379,9 @@ class emul(object):
             x = self.pc==x
         f = lambda e,prev,expr=x: bool(e.task.state(expr))
         f.__doc__ = 'breakpoint: %s'%x
+        if x._is_eqn and x.op.symbol=='==' and x.l is self.pc and x.r._is_cst:
+            # allows checkstate to check this breakpoint from the pc value:
+            f.address = x.r.v
         self.hooks.append(f)
         return x
 
@@ -154,7 +394,7 @@ class emul(object):
                Otherwise, break occurs when state(x) changes value.
                Initial value is taken from the watchpoint creation state.
         """
-        if x == '':
+        if isinstance(x,str):
             for index,f in enumerate(self.hooks):
                 if f.__doc__.startswith('watch'):
                     x += "[% 2d] %s\n"%(index,f.__doc__)
@@ -163,9 +403,15 @@ class emul(object):
             x = self.task.cpu.cst(x,self.pc.size)
         if x._is_cst:
             x = self.task.cpu.mem(x,8)
+        if self.cstate is not None:
+            self.cstate.sync()
         self.watch[x] = self.task.state(x)
         f = lambda e,prev,expr=x: bool(e.task.state(expr)!=e.watch[expr])
         f.__doc__ = 'watchpoint: %s'%x
+        if x._is_mem and x.a.base._is_cst and x.size%8==0:
+            # allows checkstate to check this watchpoint only when memory
+            # bytes [address, address+length[ are written:
+            f.range = ((x.a.base.v+x.a.disp)&x.a.base.mask, x.length)
         self.hooks.append(f)
         return x
 
@@ -193,6 +439,7 @@ class emul(object):
             return x
         dst = cast(dst)
         src = cast(src)
+        mnemonic = mnemonic.lower()
         def check(e,prev,mnemo=mnemonic,xdest=dst,xsrc=src):
             if mnemo:
                 cond = (prev.mnemonic.lower()==mnemo)
@@ -209,12 +456,15 @@ class emul(object):
                     cond = any((bool(e.task.state(x==xsrc)) for _,x in m))
                     if not cond:
                         return False
-            return False
+            return True
         doc = 'breakpoint: '
         if mnemonic: doc += "%s "%mnemonic
         if dst: doc += "dst: %s "%str(dst)
-        if src: doc += "src: %s"%str(dst)
+        if src: doc += "src: %s"%str(src)
         check.__doc__ = doc
+        # allows checkstate to check this breakpoint only after
+        # instructions with this mnemonic:
+        check.mnemonic = mnemonic
         self.hooks.append(check)
 
     def stop(self,*args,**kargs):
@@ -13,7 +13,14 @@ The backward module of amoco implements backward CFG recovery strategies.
 # Copyright (C) 2006-2014 Axel Tillequin (bdcht3@gmail.com)
 # published under GPLv2 license
 
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from importlib import import_module
+
 from .forward import *
+from amoco.config import conf
+from amoco.cas.expressions import exp, ext
+from amoco.system.core import CoreExec
+from amoco.system.memory import MemoryMap
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -56,7 +63,7 @@ class fbackward(lforward):
         n = node
         mpc = pc
         while True:
-            m = n.data.map.use((pc, n.data.address))
+            m = n.map.use((pc, n.data.address))
             mpc = m(mpc)
             T = target(mpc, node).expand()
             if len(T) > 0:
@@ -67,11 +74,11 @@ class fbackward(lforward):
                 break  # we are at function entry node
         # create func nodes:
         xpc = []
-        if n.data.misc[code.tag.FUNC_START]:
-            if node.data.misc[code.tag.FUNC_END]:
-                n.data.misc[code.tag.FUNC_START] += 1
+        if n.misc[code.tag.FUNC_START]:
+            if node.misc[code.tag.FUNC_END]:
+                n.misc[code.tag.FUNC_START] += 1
             try:
-                fsym = n.data.misc["callers"][0].data.misc["to"].ref
+                fsym = n.misc["callers"][0].misc["to"].ref
             except (IndexError, TypeError, AttributeError):
                 fsym = "f"
             func = code.func(n.c)
@@ -85,13 +92,14 @@ class fbackward(lforward):
                 logger.verbose("pc is memory aliased in %s %s" % (str(func), pol))
                 if self.policy["frame-aliasing"] == False:
                     mpc.mods = []
+            func.map = mapper()
             func.map[pc] = mpc
-            for cn in n.data.misc["callers"]:
-                cnpc = cn.data.map.use((pc, cn.data.address))(mpc)
+            for cn in n.misc["callers"]:
+                cnpc = cn.map.use((pc, cn.data.address))(mpc)
                 f = cfg.node(func)
-                e = cn.c.add_edge(cfg.link(cn, f))
+                e = self.G.add_edge(cfg.link(cn, f))
                 xpc.extend(target(cnpc, e.v[1]).expand())
-            n.data.misc["func"] = func
+            n.misc["func"] = func
         else:
             xpc.extend(target(mpc, node).expand())
         return xpc
@@ -106,6 +114,12 @@ class lbackward(fforward):
     Note:
       This is currently the most advanced stategy for performing cfg recovery
       in amoco.
+      The 'workers' policy indicates the number of worker processes used to
+      recover functions in parallel: every new function root found in the
+      spool is sent to a worker that explores it with an image of the
+      program's memory, up to the calls to other new roots. The recovered cfg
+      components and function mappers are merged back in the graph and the
+      calls are scheduled again. Default is 0 (serial recovery.)
     """
 
     policy = {
@@ -113,15 +127,22 @@ class lbackward(fforward):
         "branch-lazy": False,
         "frame-aliasing": False,
         "complexity": 100,
+        "workers": 0,
     }
 
+    def init_spool(self, loc):
+        super(lbackward, self).init_spool(loc)
+        # parked is the list of targets waiting for a function root
+        # to be recovered (see :meth:`iterfunc`):
+        self.parked = []
+
     def check_func(self, node):
         """Check if vtx node creates a function. In the fforward method
         this method does nothing.
         """
         if node is None:
             return
-        for t in self.spool:
+        for t in self.spool + self.parked:
             if t.parent in node.c:
                 return
         # create func object:
@@ -136,6 +157,7 @@ class lbackward(fforward):
         pc = self.prog.cpu.PC()
         mpc = m(pc)
         T = target(mpc, node).expand()
+        X = []
         # if a target is defined here, it means that func cfg is not completed
         # so we can return now :
         if len(T) > 0:
@@ -144,30 +166,37 @@ class lbackward(fforward):
                 for k, v in f.misc["heads"].items():
                     if v(pc) == t.cst:
                         t.parent = k
+            # targets of feedback links are already explored:
+            T = [t for t in T if not self.is_linked(t)]
         else:
             logger.info("lbackward: function %s done" % f)
             f.map = m
             # self.prog.codehelper(func=f)
             mpc = f.map(pc)
-            roots = f.view.layout.layers[0]
-            assert len(roots) > 0
-            nroot = roots[0]
-            nroot.data.misc["func"] = f
+            nroot = f.cfg.roots()[0]
+            nroot.misc["func"] = f
             try:
-                fsym = nroot.data.misc["callers"][0].data.misc["to"].ref
+                fsym = nroot.misc["callers"][0].misc["to"].ref
             except (IndexError, TypeError, AttributeError):
                 fsym = "f"
             f.name = "%s:%s" % (fsym, nroot.name)
-            self.prog.codehelper(func=f)
-            for cn in nroot.data.misc["callers"]:
-                cnpc = cn.data.map(mpc)
+            if hasattr(self.prog, "codehelper"):
+                self.prog.codehelper(func=f)
+            for cn in nroot.misc["callers"]:
+                cnpc = cn.map(mpc)
                 fn = cfg.node(f)
-                e = cn.c.add_edge(cfg.link(cn, fn))
+                e = self.G.add_edge(cfg.link(cn, fn))
                 logger.verbose("edge %s added" % str(e))
-                T.extend(target(cnpc, e.v[1]).expand())
+                Tn = target(cnpc, e.v[1]).expand()
+                if len(Tn) == 0:
+                    # the call does not return, check the caller's function:
+                    X.append(e.v[1])
+                T.extend(Tn)
         conf.Cas.noaliasing = alf
         conf.Cas.complexity = cxl
         self.spool.extend(T)
+        for fn in X:
+            self.check_func(fn)
 
     def get_targets(self, node, parent):
         """Computes expression of target address in the given node, based
@@ -189,9 +218,280 @@ class lbackward(fforward):
         conf.Cas.complexity = self.policy["complexity"]
         conf.Cas.noaliasing = not self.policy["frame-aliasing"]
         # make pc value explicit in every block:
-        node.data.map = node.data.map.use((pc, node.data.address))
+        node._map = cfg.mapcache.get(node.data, pc)
+        self.check_call(node, pc)
         # try fforward:
         T = super(lbackward, self).get_targets(node, parent)
         conf.Cas.noaliasing = alf
         conf.Cas.complexity = cxl
         return T
+
+    def check_call(self, node, pc):
+        """Tags the node as a FUNC_CALL if its map saves the address that
+        follows the block (the return address) while pc goes elsewhere.
+        """
+        if node.misc[code.tag.FUNC_CALL] or not node.data._is_block:
+            return
+        nxt = node.data.address + node.data.length
+        if not nxt._is_cst:
+            return
+        m = node.map
+        x = m(pc)
+        if x._is_cst and x.value == nxt.value:
+            return
+        for loc, v in m:
+            if (loc is not pc) and v._is_cst and v.value == nxt.value:
+                node.misc[code.tag.FUNC_CALL] = 1
+                node.misc["retto"] = nxt
+                return
+
+    def is_linked(self, t):
+        """Returns True if the parent of target t is already linked to
+        the node located at the target address.
+        """
+        if t.parent is None or not t.cst._is_cst:
+            return False
+        for n in t.parent.N(+1):
+            a = n.data.address
+            if a._is_cst and a.value == t.cst.value:
+                return True
+        return False
+
+    def itercfg(self, loc=None):
+        """The lbackward explorer: uses the generic (serial) *forward*
+        explorer unless the 'workers' policy is set, in which case the
+        functions are recovered by a pool of worker processes
+        (see :meth:`itercfg_pool`.)
+        """
+        if self.policy["workers"] > 0:
+            return self.itercfg_pool(loc)
+        return super(lbackward, self).itercfg(loc)
+
+    def itercfg_pool(self, loc=None):
+        """The parallel explorer: targets of calls to new function roots
+        are parked and the roots are sent to worker processes. Each worker
+        recovers its function with :meth:`iterfunc` from an image of the
+        program's memory, and the parked targets are explored again once the
+        function's cfg component and mapper have been merged in the graph.
+
+        Arguments:
+            loc (Optional[cst]): the address to start the cfg recovery
+                (defaults to the program's entrypoint).
+
+        Yields:
+            :class:`cfg.node`: every nodes added to the graph.
+        """
+        p = self.prog
+        policy = dict(self.policy, workers=0)
+        args = (p.cpu.__name__, _task_image(p.state.mmap), policy)
+        order = -1 if self.policy["depth-first"] else 0
+        lazy = self.policy["branch-lazy"]
+        # tasks maps function root addresses to their future:
+        tasks = {}
+        self.init_spool(loc)
+        with ProcessPoolExecutor(
+            self.policy["workers"], initializer=_task_init, initargs=args
+        ) as pool:
+            while len(self.spool) > 0 or len(tasks) > 0:
+                if len(self.spool) == 0:
+                    F = dict((fu, a) for (a, fu) in tasks.items())
+                    done, _ = wait(F, return_when=FIRST_COMPLETED)
+                    for fu in done:
+                        a = F[fu]
+                        del tasks[a]
+                        for vtx in self.merge(fu.result(), a):
+                            yield vtx
+                        T = [t for t in self.parked if t.cst.value == a]
+                        self.parked = [t for t in self.parked if t.cst.value != a]
+                        for t in T:
+                            for vtx in self.itertarget(t, lazy):
+                                yield vtx
+                    continue
+                t = self.spool.pop(order)
+                a = self.get_root(t)
+                if a is None:
+                    for vtx in self.itertarget(t, lazy):
+                        yield vtx
+                    continue
+                self.parked.append(t)
+                if a not in tasks:
+                    logger.verbose("function root 0x%x sent to worker" % a)
+                    tasks[a] = pool.submit(_task_recover, a)
+
+    def iterfunc(self, loc):
+        """The function explorer used by worker processes: recovers the
+        function rooted at loc but does not follow calls to other function
+        roots. The targets of these calls are parked and returned by
+        :meth:`export` for the parent process to schedule them.
+
+        Arguments:
+            loc (cst): the address of the function's root node.
+
+        Yields:
+            :class:`cfg.node`: every nodes added to the graph.
+        """
+        order = -1 if self.policy["depth-first"] else 0
+        lazy = self.policy["branch-lazy"]
+        self.init_spool(loc)
+        while len(self.spool) > 0:
+            t = self.spool.pop(order)
+            if self.get_root(t) is not None:
+                self.parked.append(t)
+                continue
+            for vtx in self.itertarget(t, lazy):
+                yield vtx
+
+    def get_root(self, t):
+        """Returns the address of the target t if it calls a new function
+        root (not yet in the graph), or None otherwise.
+        """
+        parent = t.parent
+        if parent is None or not parent.misc[code.tag.FUNC_CALL]:
+            return None
+        if t.cst is None or not t.cst._is_cst:
+            return None
+        if self.G.get_with_address(t.cst) is not None:
+            return None
+        return t.cst.value
+
+    def export(self):
+        """Returns the graph's nodes and links in a picklable form
+        (see :meth:`merge`.)
+        Nodes are given as (data, misc, callers) tuples where func nodes
+        data is replaced by the index of the function's root node, and
+        links are given as (source index, destination index, econd).
+        Function names and mappers are given by root node index, and
+        parked targets as (parent index, address, econd).
+        """
+        V = list(self.G.V())
+        index = dict((v, i) for (i, v) in enumerate(V))
+        nodes, funcs = [], {}
+        for v in V:
+            data = v.data
+            if data._is_func:
+                data = index[data.cfg.roots()[0]]
+            misc = dict(v.misc)
+            callers = [index[c] for c in misc.pop("callers", None) or []]
+            f = misc.pop("func", None)
+            if f:
+                funcs[index[v]] = (f.name, f.map)
+            nodes.append((data, misc, callers))
+        links = [(index[e.v[0]], index[e.v[1]], e.data) for e in self.G.E()]
+        parked = [(index[t.parent], t.cst, t.econd) for t in self.parked]
+        return (nodes, links, funcs, parked)
+
+    def merge(self, res, root):
+        """Merges the cfg components recovered by a worker (see
+        :meth:`export`) into the graph. Nodes already in the graph are
+        left untouched, and only links from new nodes are added.
+
+        Parked targets of new nodes are added to the spool.
+
+        Arguments:
+            res (tuple): the exported nodes, links, functions and parked
+                targets.
+            root (int): the address of the function root of the task.
+
+        Yields:
+            :class:`cfg.node`: every nodes added to the graph.
+        """
+        nodes, links, funcs, parked = res
+        pc = self.prog.cpu.PC()
+        V = [None] * len(nodes)
+        new = set()
+        for i, (data, misc, callers) in enumerate(nodes):
+            if isinstance(data, int):
+                continue
+            vtx = cfg.node(data)
+            n = self.G.get_by_name(vtx.name)
+            if n is not None:
+                V[i] = n
+                continue
+            vtx.misc.update(misc)
+            if data._is_block:
+                vtx._map = cfg.mapcache.get(data, pc)
+                if data.address._is_cst and data.address.value == root:
+                    # callers of the task root are the parked targets:
+                    vtx.misc[code.tag.FUNC_START] = 0
+            V[i] = self.G.add_vertex(vtx)
+            new.add(i)
+        for i in new:
+            callers = [V[c] for c in nodes[i][2] if V[c] is not None]
+            V[i].misc["callers"] = callers
+        for (i, j, econd) in links:
+            if (i in new) and (j in new):
+                self.G.add_edge(cfg.link(V[i], V[j], data=econd))
+        # create the functions of new root nodes:
+        for r, (name, fmap) in funcs.items():
+            if r not in new:
+                continue
+            nroot = V[r]
+            f = code.func(nroot.c)
+            f.name = name
+            f.map = fmap
+            nroot.misc["func"] = f
+            logger.info("lbackward: function %s merged" % f)
+            if hasattr(self.prog, "codehelper"):
+                self.prog.codehelper(func=f)
+        # add func nodes (one per call) and their links:
+        for (i, j, econd) in links:
+            if i not in new:
+                continue
+            if isinstance(nodes[j][0], int) and (V[j] is None):
+                f = V[nodes[j][0]].misc["func"]
+                if not f:
+                    continue
+                V[j] = cfg.node(f)
+                new.add(j)
+                self.G.add_edge(cfg.link(V[i], V[j], data=econd))
+        for (i, j, econd) in links:
+            if isinstance(nodes[i][0], int) and (i in new) and (j in new):
+                self.G.add_edge(cfg.link(V[i], V[j], data=econd))
+        for (i, x, econd) in parked:
+            if i in new:
+                self.spool.append(target(x, V[i], econd))
+        for i in sorted(new):
+            yield V[i]
+
+
+# -----------------------------------------------------------------------------
+# lbackward worker processes:
+
+_task = None
+
+
+def _task_image(mmap):
+    """Returns a picklable image of the absolute memory zone of mmap:
+    external symbols are replaced by bare :class:`ext` expressions
+    (without their task and stub.)
+    """
+    mm = MemoryMap()
+    for o in mmap._zones[None]._map:
+        v = o.data.val
+        if isinstance(v, exp) and v._is_ext:
+            v = ext(v.ref, size=v.size)
+        mm.write(o.vaddr, v, o.data.endian)
+    return mm
+
+
+def _task_init(cpu, image, policy):
+    """Initializer of lbackward worker processes: the task's program is a
+    :class:`CoreExec` that only holds the cpu module and a mapper of the
+    program's memory image (memory is never written by the analysis.)
+    """
+    global _task
+    p = CoreExec(None, import_module(cpu))
+    p.state.setmemory(image)
+    _task = (p, policy)
+
+
+def _task_recover(loc):
+    """Recovers the function rooted at address loc in a worker process and
+    returns the exported graph (see :meth:`lbackward.export`.)
+    """
+    p, policy = _task
+    z = lbackward(p)
+    z.policy = policy
+    for vtx in z.iterfunc(p.cpu.cst(loc, p.cpu.PC().size)):
+        pass
+    return z.export()
@@ -191,9 +191,9 @@ class fforward(lsweep):
         vtx.misc[code.tag.FUNC_START] += 1
         parent.misc[code.tag.FUNC_CALL] += 1
         if vtx.misc["func"]:
-            logger.verbose("function %s called" % b.misc["func"])
+            logger.verbose("function %s called" % vtx.misc["func"])
             vtx = cfg.node(vtx.misc["func"])
-            e = parent.c.add_edge(cfg.link(parent, vtx, data=econd))
+            e = self.G.add_edge(cfg.link(parent, vtx, data=econd))
             vtx = e.v[1]
         else:
             vtx = self.G.add_vertex(vtx)
@@ -219,7 +219,7 @@ class fforward(lsweep):
             b = code.xfunc(t.cst)
             vtx = cfg.node(b)
             e = cfg.link(t.parent, vtx, data=t.econd)
-            e = t.parent.c.add_edge(e)
+            e = self.G.add_edge(e)
             self.update_spool(e.v[1], t.parent)
             self.check_func(e.v[1])
             return True
@@ -259,7 +259,6 @@ class fforward(lsweep):
         Yields:
             :class:`cfg.node`: every nodes added to the graph.
         """
-        G = self.G
         # spool is the list of targets (target_ instances) to be analysed
         self.init_spool(loc)
         # order is the index to pop elements from spool
@@ -269,36 +268,52 @@ class fforward(lsweep):
         # proceed with exploration of every spool element:
         while len(self.spool) > 0:
             t = self.spool.pop(order)
-            parent = t.parent
-            econd = t.econd
-            if self.check_ext_target(t):
-                continue
-            for b in self.iterblocks(loc=t.cst):
-                vtx = G.get_by_name(b.name) or cfg.node(b)
-                do_update = vtx not in G
-                # if block is a FUNC_START, we add it as a new graph component (no link to parent),
-                # otherwise we add the new (parent,vtx) edge.
-                if parent is None:
-                    self.add_root_node(vtx)
-                elif parent.misc[code.tag.FUNC_CALL]:
-                    vtx = self.add_call_node(vtx, parent, econd)
-                else:
-                    if parent.misc["cut"]:
-                        continue
-                    e_ = cfg.link(parent, vtx, data=econd)
-                    e = G.add_edge(e_)
-                    if e is e_:
-                        logger.verbose("edge %s added" % e)
-                # now we try to populate spool with target addresses of current block:
-                if do_update:
-                    self.update_spool(vtx, parent)
-                self.check_func(vtx)
+            for vtx in self.itertarget(t, lazy):
                 yield vtx
-                if not do_update or not lazy or vtx.misc[code.tag.FUNC_END]:
-                    break
-                logger.verbose("lsweep fallback at %s" % vtx.data.address)
-                parent = vtx
-                econd = None
+
+    def itertarget(self, t, lazy=False):
+        """Extends the cfg with the block(s) located at the given target.
+
+        Arguments:
+            t (target): the target popped from the spool.
+            lazy (bool): proceed with linear sweep when the target of the
+                new block does not evaluate to a constant address.
+
+        Yields:
+            :class:`cfg.node`: every nodes added to the graph.
+        """
+        G = self.G
+        parent = t.parent
+        econd = t.econd
+        if self.check_ext_target(t):
+            return
+        for b in self.iterblocks(loc=t.cst):
+            vtx = cfg.node(b)
+            vtx = G.get_by_name(vtx.name) or vtx
+            do_update = vtx not in G
+            # if block is a FUNC_START, we add it as a new graph component (no link to parent),
+            # otherwise we add the new (parent,vtx) edge.
+            if parent is None:
+                self.add_root_node(vtx)
+            elif parent.misc[code.tag.FUNC_CALL]:
+                vtx = self.add_call_node(vtx, parent, econd)
+            else:
+                if parent.misc["cut"]:
+                    continue
+                e_ = cfg.link(parent, vtx, data=econd)
+                e = G.add_edge(e_)
+                if e is e_:
+                    logger.verbose("edge %s added" % e)
+            # now we try to populate spool with target addresses of current block:
+            if do_update:
+                self.update_spool(vtx, parent)
+            self.check_func(vtx)
+            yield vtx
+            if not do_update or not lazy or vtx.misc[code.tag.FUNC_END]:
+                break
+            logger.verbose("lsweep fallback at %s" % vtx.data.address)
+            parent = vtx
+            econd = None
 
 
 # -----------------------------------------------------------------------------
@@ -329,9 +344,9 @@ class lforward(fforward):
         """
         pc = self.prog.cpu.PC()
         if parent is None:
-            pc = node.map.use((pc, node.data.address))(pc)
+            pc = cfg.mapcache.get(node.data, pc)(pc)
         else:
-            m = parent.map.use((pc, parent.data.address))  # work on copy
+            m = cfg.mapcache.get(parent.data, pc)  # work on copy
             m[pc] = node.data.address
             pc = m(node.map(pc))
         return target(pc, node).expand()
@@ -79,6 +79,11 @@ class lsweep(object):
         Yields:
             instructions from given address, until a non-instruction
             byte sequence is reached.
+
+        Note:
+            When the program's memory holds raw bytes at current address,
+            instructions are decoded directly from this buffer with
+            the disassembler's iter_buffer method.
         """
         p = self.prog
         if loc is None:
@@ -87,7 +92,31 @@ class lsweep(object):
                 loc = m(p.cpu.PC())
             except (TypeError, ValueError):
                 loc = 0
+        try:
+            mmap = p.state.mmap
+        except AttributeError:
+            mmap = None
         while True:
+            buf = None
+            if mmap is not None:
+                try:
+                    buf = mmap.getbuffer(loc)
+                except MemoryError:
+                    pass
+            if buf is not None:
+                # the last maxlen bytes of buf are left to read_instruction
+                # since an instruction could continue in the next memory object:
+                lim = len(buf) - p.cpu.disassemble.maxlen
+                o = 0
+                for i in p.cpu.disassemble.iter_buffer(buf, loc):
+                    yield i
+                    loc += i.length
+                    o += i.length
+                    if o > lim:
+                        break
+                else:
+                    if o <= lim:
+                        break
             i = p.read_instruction(loc)
             if i is None:
                 break
@@ -5,7 +5,7 @@
 # published under GPLv2 license
 
 from amoco.system.structs import StructDefine,StructFormatter
-from amoco.system.core import BinFormat, CoreExec, DefineStub
+from amoco.system.core import BinFormat, CoreExec, DefineStub, DefineLoader
 from amoco.system.memory import MemoryMap
 from amoco.arch.avr import cpu
 from amoco.logger import Log
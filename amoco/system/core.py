@@ -14,6 +14,9 @@ the :mod:`amoco.system` package.
 
 """
 
+from collections import OrderedDict
+
+from amoco.config import conf
 from amoco.arch.core import Bits
 from amoco.ui.views import execView, dataView
 from amoco.logger import Log
@@ -50,9 +53,12 @@ class CoreExec(object):
              of the executable program, including mapping of registers as well
              as the :class:`MemoryMap` instance that represents the virtual
              memory of the program.
+
+        icache: the :class:`InstructionCache` of instructions already decoded
+             by :meth:`read_instruction`.
     """
 
-    __slots__ = ["bin", "cpu", "OS", "state", "view"]
+    __slots__ = ["bin", "cpu", "OS", "state", "view", "icache"]
 
     def __init__(self, p, cpu=None):
         self.bin = p
@@ -60,6 +66,7 @@ class CoreExec(object):
         self.OS = None
         self.state = self.initstate()
         self.view = execView(of=self)
+        self.icache = InstructionCache(conf.System.icache)
 
     def __repr__(self):
         c = self.__class__.__name__
@@ -101,9 +108,8 @@ class CoreExec(object):
         if self.cpu is None:
             logger.error("no cpu imported")
             raise ValueError
-        if "mmap" in kargs:
-            mmap = kargs[mmap]
-        else:
+        mmap = kargs.pop("mmap", None)
+        if mmap is None:
             mmap = self.state.mmap
         maxlen = self.cpu.disassemble.maxlen
         if isinstance(vaddr, int):
@@ -113,6 +119,11 @@ class CoreExec(object):
             return vaddr
         else:
             addr = vaddr
+        key = self.icache.key(vaddr, self.cpu, mmap, kargs)
+        if key is not None:
+            i = self.icache.get(key)
+            if i is not None:
+                return i
         try:
             istr = mmap.read(vaddr, maxlen)
         except MemoryError as e:
@@ -128,13 +139,21 @@ class CoreExec(object):
                     return istr[0]
                 else:
                     return None
-        i = self.cpu.disassemble(istr[0], **kargs)
+        # bytes can be split in several parts (see datadiv):
+        b = istr[0]
+        for p in istr[1:]:
+            if not isinstance(p, bytes):
+                break
+            b += p
+        i = self.cpu.disassemble(b, **kargs)
         if i is None:
             logger.warning("disassemble failed at vaddr %s" % addr)
             return None
         else:
             if i.address is None:
                 i.address = addr
+            if key is not None:
+                self.icache.put(key, i)
             return i
 
     def symbol_for(self,address):
@@ -258,6 +277,135 @@ class CoreExec(object):
         return bytes(A)
 
 
+# ------------------------------------------------------------------------------
+
+class InstructionCache(object):
+    """
+    A bounded cache of instructions decoded by :meth:`CoreExec.read_instruction`.
+    Instructions are keyed by their (integer) address and by the disassembler's
+    instruction set and endianness selected for the given keyword arguments,
+    so that mode-dependent decoders (ARM/Thumb, etc) are handled correctly.
+    The cache is bound to the :class:`MemoryMap` that holds the instructions'
+    bytes: any write in this map that overlaps a cached instruction
+    invalidates it, so that self-modifying code is decoded again.
+
+    Args:
+        size (int): maximum number of cached instructions. When full, the least
+                    recently used instruction is dropped. A size of 0 disables
+                    the cache.
+
+    Attributes:
+        size (int): maximum number of cached instructions.
+        hits (int): number of instructions returned from the cache.
+        misses (int): number of instructions that had to be decoded.
+
+    Note:
+        Cached instructions are shared by all fetchers of the task, hence
+        they should be considered read-only objects.
+    """
+
+    __slots__ = ["size", "hits", "misses", "_cache", "_index", "_mmap", "_cpu"]
+
+    def __init__(self, size=0):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._index = {}
+        self._mmap = None
+        self._cpu = None
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return "<%s size=%d, len=%d, hits=%d, misses=%d>" % (
+            self.__class__.__name__,
+            self.size,
+            len(self),
+            self.hits,
+            self.misses,
+        )
+
+    def clear(self):
+        self._cache.clear()
+        self._index.clear()
+
+    def bind(self, mmap, cpu):
+        "(re)attach the cache to the given memory map and cpu module."
+        if self._mmap is not None:
+            self._mmap.unsubscribe(self.invalidate)
+        self.clear()
+        self._mmap = mmap
+        self._cpu = cpu
+        if mmap is not None:
+            mmap.subscribe(self.invalidate)
+
+    def key(self, vaddr, cpu, mmap, kargs):
+        """returns the cache key of the instruction at address vaddr or
+           None if this instruction can't be cached.
+        """
+        if self.size <= 0:
+            return None
+        if not isinstance(vaddr, int):
+            if not vaddr._is_cst:
+                return None
+            vaddr = vaddr.v
+        if mmap is not self._mmap or cpu is not self._cpu:
+            self.bind(mmap, cpu)
+        d = cpu.disassemble
+        try:
+            k = (vaddr, d.iset(**kargs), d.endian(**kargs))
+            if kargs:
+                k += tuple(sorted(kargs.items()))
+            hash(k)
+        except TypeError:
+            return None
+        return k
+
+    def get(self, key):
+        i = self._cache.get(key, None)
+        if i is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return i
+
+    def put(self, key, i):
+        self._cache[key] = i
+        self._index.setdefault(key[0], []).append(key)
+        while len(self._cache) > self.size:
+            k, _ = self._cache.popitem(last=False)
+            self._unindex(k)
+
+    def _unindex(self, k):
+        keys = self._index.get(k[0], [])
+        if k in keys:
+            keys.remove(k)
+        if not keys:
+            self._index.pop(k[0], None)
+
+    def invalidate(self, rel, offset, length):
+        "MemoryMap observer that drops instructions overlapping a written area."
+        if rel is not None or not self._cache:
+            return
+        maxlen = self._cpu.disassemble.maxlen
+        sta = offset - maxlen + 1
+        sto = offset + length
+        if (sto - sta) < len(self._index):
+            addrs = [a for a in range(sta, sto) if a in self._index]
+        else:
+            addrs = [a for a in self._index if sta <= a < sto]
+        for a in addrs:
+            for k in self._index.pop(a):
+                i = self._cache[k]
+                if a + i.length > offset:
+                    del self._cache[k]
+                else:
+                    self._index.setdefault(a, []).append(k)
+
+
 # ------------------------------------------------------------------------------
 
 class DefineStub(object):
@@ -344,6 +492,10 @@ class DataIO(object):
     This class simply wraps a binary file or a bytes string and implements
     both the file and bytes interface. It allows an input to be provided as
     files of bytes and manipulated indifferently as a file or a bytes object.
+
+    Files are mapped in memory (with mmap) when possible so that slicing
+    does not seek the file and loaders can map segments without copying
+    their bytes (see :meth:`memory`.)
     """
 
     def __init__(self, f):
@@ -354,8 +506,34 @@ class DataIO(object):
         else:
             self.f = f
         self.view = dataView(dataio=self)
+        self._mm = None
+
+    def memory(self):
+        """returns a read-only memoryview of all bytes of the wrapped file
+        or bytes string, or None if the file can't be mapped in memory.
+        """
+        if hasattr(self.f, "getvalue"):
+            # BytesIO.getvalue doesn't copy the internal buffer:
+            return memoryview(self.f.getvalue())
+        if self._mm is None:
+            try:
+                import mmap
+
+                self._mm = memoryview(
+                    mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+            except (AttributeError, OSError, ValueError):
+                # not a regular file (or empty file...)
+                self._mm = False
+        return self._mm or None
 
     def __getitem__(self, i):
+        m = self.memory()
+        if m is not None:
+            sta = i.start
+            if sta is None:
+                sta = self.f.tell()
+            return m[sta : i.stop].tobytes()
         stay = self.f.tell()
         sta = i.start
         if sta is None:
@@ -559,9 +737,43 @@ class DefineLoader(object):
 
     Here, a reference to function loader_x86 is stored in
     LOADERS['elf'][elf.EM_386].
+
+    Loaders of amoco's systems are not imported until needed: the MODULES
+    table associates a (format, machine constant name) key to the module
+    that defines the corresponding loader, and :meth:`get` imports
+    this module only when a program with this format and machine is loaded.
+    Machine constants are names of the format's module (see FORMATS.)
     """
     LOADERS = {}
 
+    FORMATS = {
+        "elf": "amoco.system.elf",
+        "elf-baremetal": "amoco.system.elf",
+        "pe": "amoco.system.pe",
+        "macho": "amoco.system.macho",
+    }
+
+    MODULES = {
+        ("raw", None): "amoco.system.raw",
+        ("elf", "EM_ARM"): "amoco.system.linux32",
+        ("elf", "EM_386"): "amoco.system.linux32",
+        ("elf", "EM_SPARC"): "amoco.system.linux32",
+        ("elf", "EM_RISCV"): "amoco.system.linux32",
+        ("elf", "EM_SH"): "amoco.system.linux32",
+        ("elf", "EM_MIPS"): "amoco.system.linux32",
+        ("elf", "EM_X86_64"): "amoco.system.linux64",
+        ("elf", "EM_AARCH64"): "amoco.system.linux64",
+        ("elf", "EM_BPF"): "amoco.system.vm",
+        ("pe", "IMAGE_FILE_MACHINE_I386"): "amoco.system.win32",
+        ("pe", "IMAGE_FILE_MACHINE_AMD64"): "amoco.system.win64",
+        ("macho", "X86_64"): "amoco.system.osx",
+        ("elf-baremetal", "EM_AVR"): "amoco.system.baremetal",
+        ("elf-baremetal", "EM_SPARC"): "amoco.system.baremetal",
+        ("elf-baremetal", "EM_RISCV"): "amoco.system.baremetal",
+        ("elf-baremetal", "EM_TRICORE"): "amoco.system.baremetal",
+        ("atmega328p", None): "amoco.system.baremetal.atmega328p",
+    }
+
     def __init__(self, fmt, name=""):
         self.fmt = fmt
         self.name = name
@@ -583,6 +795,44 @@ class DefineLoader(object):
             self.LOADERS[self.fmt] = loader
         return loader
 
+    @classmethod
+    def module(cls, fmt, name=None):
+        "returns the path of the module that defines loader fmt[name] or None"
+        from importlib import import_module
+
+        for (f, n), path in cls.MODULES.items():
+            if f != fmt:
+                continue
+            if n is not None:
+                n = getattr(import_module(cls.FORMATS[f]), n)
+            if n == name:
+                return path
+        return None
+
+    @classmethod
+    def get(cls, fmt, name=None):
+        """
+        returns the loader registered for fmt[name] (or fmt if name is None),
+        possibly importing the module that defines it.
+
+        Raises:
+            KeyError: if no loader is found.
+        """
+        for i in range(2):
+            L = cls.LOADERS.get(fmt, {})
+            if name is None and not isinstance(L, dict):
+                return L
+            if name is not None and name in L:
+                return L[name]
+            path = cls.module(fmt, name)
+            if i > 0 or path is None:
+                break
+            from importlib import import_module
+
+            logger.verbose("import loader module %s" % path)
+            import_module(path)
+        raise KeyError((fmt, name))
+
 
 def load_program(f, cpu=None, loader=None):
     """
@@ -590,7 +840,8 @@ def load_program(f, cpu=None, loader=None):
     the input as a raw "shellcode" if no supported format is recognized,
     and *maps* the program in abstract memory,
     loading the associated "system" (linux/win) and "arch" (x86/arm),
-    based header informations.
+    based header informations. Only the loader module associated with the
+    program's format and machine is imported (see :class:`DefineLoader`.)
 
     Arguments:
         f (str): the program filename or string of bytes.
@@ -602,28 +853,22 @@ def load_program(f, cpu=None, loader=None):
         a Task, ELF/PE (old CoreExec interfaces) or RawExec instance.
     """
 
-    logger.verbose("--- define loaders ---")
-
-    from . import raw
-    from . import linux32
-    from . import linux64
-    from . import win32
-    from . import win64
-    from . import osx
-    from . import baremetal
-
     logger.verbose("--- detect binary format ---")
 
     p = read_program(f)
 
     logger.verbose("--- create task ---")
 
-    Loaders = DefineLoader.LOADERS
-    if loader is not None and (loader in Loaders):
-        x = Loaders[loader](p)
-    if p.is_ELF:
+    get = DefineLoader.get
+    x = None
+    if loader is not None:
+        try:
+            x = get(loader)(p)
+        except KeyError:
+            logger.error("loader %s not found" % loader)
+    elif p.is_ELF:
         try:
-            x = Loaders["elf"][p.Ehdr.e_machine](p)
+            x = get("elf", p.Ehdr.e_machine)(p)
         except KeyError:
             logger.error("ELF machine type not supported")
             x = None
@@ -632,7 +877,7 @@ def load_program(f, cpu=None, loader=None):
             x = None
     elif p.is_PE:
         try:
-            x = Loaders["pe"][p.NT.Machine](p)
+            x = get("pe", p.NT.Machine)(p)
         except KeyError:
             logger.error("PE machine type not supported")
             x = None
@@ -641,15 +886,15 @@ def load_program(f, cpu=None, loader=None):
             x = None
     elif p.is_MachO:
         try:
-            x = Loaders["macho"][p.header.cputype](p)
-        except Exception:
+            x = get("macho", p.header.cputype)(p)
+        except KeyError:
             logger.error("Mach-O machine type not supported")
             x = None
         except Exception:
             logger.error("Mach-O loader error")
             x = None
     else:
-        x = Loaders["raw"](p, cpu)
+        x = get("raw")(p, cpu)
 
     if x is not None:
         logger.info("a new task is loaded %s"%str(x.view))
@@ -657,7 +902,7 @@ def load_program(f, cpu=None, loader=None):
         logger.info("no loader for this program, trying baremetal...")
         if p.is_ELF:
             try:
-                x = Loaders["elf-baremetal"][p.Ehdr.e_machine](p)
+                x = get("elf-baremetal", p.Ehdr.e_machine)(p)
             except KeyError:
                 logger.error("No baremetal for this ELF machine type")
                 x = None
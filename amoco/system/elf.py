@@ -10,10 +10,13 @@ system/elf.py
 
 The system elf module implements Elf classes for both 32/64bits executable format.
 """
+from bisect import bisect_right
+
 from amoco.system.core import BinFormat
-from amoco.system.structs import Consts, StructDefine, StructureError
+from amoco.system.structs import Consts, StructDefine, StructureError, StructTable
 from amoco.system.structs import StructFormatter, token_constant_fmt, token_address_fmt
 
+from amoco.config import conf
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -212,12 +215,22 @@ class Elf(BinFormat):
         self.__file.seek(S.p_offset)
         return self.__file.read(S.p_filesz).ljust(S.p_memsz, b"\x00")
 
+    def __memory(self):
+        try:
+            return self.__file.memory()
+        except AttributeError:
+            return None
+
     def loadsegment(self, S, pagesize=None):
         """
         If S is of type PT_LOAD, returns a dict {base: bytes}
         indicating that segment data bytes (extended to pagesize boundary)
         need to be mapped at virtual base address.
         (Returns None if not a PT_LOAD segment.)
+
+        Note:
+            If the file can be mapped in memory (see DataIO.memory), the
+            returned data is a memoryview of the file rather than bytes.
         """
         ELF_PAGESTART  = lambda _v : (_v)&(~(pagesize-1))
         ELF_PAGEOFFSET = lambda _v : (_v)&( (pagesize-1))
@@ -231,9 +244,14 @@ class Elf(BinFormat):
             off  = S.p_offset - ELF_PAGEOFFSET(S.p_vaddr)
             addr = ELF_PAGESTART(S.p_vaddr)
             size = ELF_PAGEALIGN(size)
-            self.__file.seek(off)
             base = addr
-            bytes_ = self.__file.read(size)
+            m = self.__memory()
+            if m is not None:
+                # map the file pages without copying them:
+                bytes_ = m[off : off + size]
+            else:
+                self.__file.seek(off)
+                bytes_ = self.__file.read(size)
             return {base: bytes_}
         else:
             logger.error("segment not a PT_LOAD [%08x/%0d]" % (S.p_vaddr, S.p_align))
@@ -283,6 +301,11 @@ class Elf(BinFormat):
             raise ElfError("symbol table size mismatch")
         else:
             n = section.sh_size // l
+        if 0 < conf.System.columnar <= n:
+            try:
+                return SymTable(data, l, lbe, x64)
+            except StructureError:
+                logger.verbose("symbol table can't be columnar")
         symtab = []
         offset = 0
         for i in range(n):
@@ -313,6 +336,12 @@ class Elf(BinFormat):
         reltab = []
         x64 = self.Ehdr.e_ident.EI_CLASS == ELFCLASS64
         lbe = ">" if (self.Ehdr.e_ident.EI_DATA == ELFDATA2MSB) else None
+        if 0 < conf.System.columnar <= n:
+            try:
+                rela = section.sh_type == SHT_RELA
+                return RelTable(data, l, lbe, x64, rela)
+            except StructureError:
+                logger.verbose("relocation table can't be columnar")
         offset = 0
         if section.sh_type == SHT_REL:
             rcls = Rel
@@ -380,7 +409,17 @@ class Elf(BinFormat):
         D = {}
         symtab = self.readsection(".symtab") or []
         strtab = self.readsection(".strtab")
-        if strtab:
+        if strtab and isinstance(symtab, SymTable):
+            for i in symtab.select(type=t):
+                value = symtab.value(i, "st_value")
+                if value:
+                    D[value] = (
+                        str(strtab[symtab.value(i, "st_name")].decode()),
+                        symtab.value(i, "st_size"),
+                        symtab.value(i, "st_info"),
+                        symtab.value(i, "st_shndx"),
+                    )
+        elif strtab:
             for sym in symtab:
                 if sym.st_type == t and sym.st_value:
                     D[sym.st_value] = (
@@ -399,7 +438,20 @@ class Elf(BinFormat):
         if dynstr:
             for s in self.Shdr:
                 if s.sh_type in (SHT_REL, SHT_RELA):
-                    for r in self.readsection(s):
+                    reltab = self.readsection(s)
+                    if isinstance(reltab, RelTable):
+                        names = (
+                            dynsym.column("st_name")
+                            if isinstance(dynsym, SymTable)
+                            else [sym.st_name for sym in dynsym]
+                        )
+                        offsets = reltab.column("r_offset")
+                        for o, i in zip(offsets, reltab.r_sym()):
+                            if o:
+                                o = int(o)
+                                D[o] = str(dynstr[int(names[i])].decode())
+                        continue
+                    for r in reltab:
                         if r.r_offset:
                             sym = dynsym[r.r_sym]
                             D[r.r_offset] = str(dynstr[sym.st_name].decode())
@@ -1209,8 +1261,8 @@ class StrTable(object):
         self.x64 = x64
 
     def __getitem__(self, i):
-        z = self.data[i:].index(b"\0")
-        return self.data[i : i + z]
+        z = self.data.index(b"\0", i)
+        return self.data[i:z]
 
     def as_dict(self):
         D = {}
@@ -1224,3 +1276,86 @@ class StrTable(object):
     def __str__(self):
         fmt = "0x%" + "%02dx: %%s" % (16 if self.x64 else 8)
         return "\n".join((fmt % (k, v) for (k, v) in iter(self.as_dict().items())))
+
+
+# Columnar symbol and relocation tables; provided to deal with large tables
+# (see conf.System.columnar). Entries are Sym/Rel/Rela row views, and
+# columns allow to filter symbols or lookup addresses without creating them.
+# ------------------------------------------------------------------------------
+class SymTable(StructTable):
+    """
+    A columnar table of Sym entries.
+
+    Methods:
+        st_type(): column of symbols' types (STT_*).
+        st_bind(): column of symbols' bindings (STB_*).
+        select(type=None, bind=None, shndx=None): indices of symbols that
+            match all provided constraints (shndx can be a list of sections
+            indices.)
+        lookup(addr): index of the symbol that contains address addr or None.
+    """
+
+    def __init__(self, data, entsize=None, order=None, x64=False):
+        super().__init__(lambda: Sym(None, 0, order, x64), data, entsize)
+        self.__index = None
+
+    def st_type(self):
+        return self.map(lambda x: x & 0xF, self.column("st_info"))
+
+    def st_bind(self):
+        return self.map(lambda x: x >> 4, self.column("st_info"))
+
+    def select(self, type=None, bind=None, shndx=None):
+        masks = []
+        if type is not None:
+            masks.append(self.isin(self.st_type(), [type]))
+        if bind is not None:
+            masks.append(self.isin(self.st_bind(), [bind]))
+        if shndx is not None:
+            if isinstance(shndx, int):
+                shndx = [shndx]
+            masks.append(self.isin(self.column("st_shndx"), shndx))
+        if not masks:
+            masks.append([True] * len(self))
+        return self.where(*masks)
+
+    def lookup(self, addr):
+        if self.__index is None:
+            self.__index = self.argsort(self.column("st_value"))
+        values, order = self.__index
+        i = bisect_right(values, addr)
+        # walk back through symbols starting at or before addr, until a
+        # symbol that contains addr is found or a sized symbol ends before:
+        while i > 0:
+            i -= 1
+            j = order[i]
+            v = values[i]
+            sz = self.value(j, "st_size")
+            if v == addr or addr < v + sz:
+                return j
+            if sz > 0:
+                break
+        return None
+
+
+class RelTable(StructTable):
+    """
+    A columnar table of Rel or Rela entries.
+
+    Methods:
+        r_sym(): column of relocations' symbol indices.
+        r_type(): column of relocations' types.
+    """
+
+    def __init__(self, data, entsize=None, order=None, x64=False, rela=False):
+        rcls = Rela if rela else Rel
+        super().__init__(lambda: rcls(None, 0, order, x64), data, entsize)
+        self.x64 = x64
+
+    def r_sym(self):
+        sh = 32 if self.x64 else 8
+        return self.map(lambda x: x >> sh, self.column("r_info"))
+
+    def r_type(self):
+        m = 0xFFFFFFFF if self.x64 else 0xFF
+        return self.map(lambda x: x & m, self.column("r_info"))
@@ -232,18 +232,35 @@ class MachO(BinFormat):
             self.__file.seek(S.offset)
             return self.__file.read(S.size_)
 
+    def __memory(self):
+        try:
+            return self.__file.memory()
+        except AttributeError:
+            return None
+
     def loadsegment(self, S, pagesize=None):
-        "returns padded & aligned data of segment/section S"
-        s = self.readsegment(S)
+        """returns padded & aligned data of segment/section S
+        (as a memoryview of the file if no padding is needed.)"""
         if pagesize is None:
             if hasattr(S,'vmsize'):
                 size = pagesize = S.vmsize
             else:
                 size = S.size_
                 pagesize = S.align
+        else:
+            size = S.vmsize if hasattr(S,'vmsize') else S.size_
         n, r = divmod(size, pagesize)
         if r > 0:
             n += 1
+        m = self.__memory()
+        if m is not None:
+            try:
+                sta, sto = S.fileoffset, S.fileoffset + S.filesize
+            except AttributeError:
+                sta, sto = S.offset, S.offset + S.size_
+            if len(m[sta:sto]) >= n * pagesize:
+                return m[sta:sto]
+        s = self.readsegment(S)
         return s.ljust(n * pagesize, b"\0")
 
     def readsection(self, sect):
@@ -36,15 +36,29 @@ In amoco's Memory model, a MemoryZone holds an ordered list of memory
 objects (see class :class:`mo`) and provides method to locate objects
 within an address range, or insert new objects at a given offset,
 thus allowing the "read" or "write" of expressions of those "values".
+
+The :class:`SortedMemoryZone` subclass provides the same interface but
+maintains its sorted addresses index incrementally, so that writes do not
+rebuild the index of the whole zone. The class used by new MemoryMap zones
+is selected by conf.System.memzone (see :func:`memoryzone`.)
+
+Copies of a MemoryMap are copy-on-write: zones are shared between the
+original map and its copies until one of them writes into a shared zone,
+which is then replaced by a private copy in the writing map only. This
+private copy only copies the list of mo objects of the zone, and the mo
+objects themselves are still shared until they are modified (see
+:meth:`MemoryZone.copy`), so that the cost of the first write after a
+copy is a shallow copy of the list rather than a copy of all objects.
 """
 
 
+from amoco.config import conf
 from amoco.logger import Log
 
 logger = Log(__name__)
 logger.debug("loading module")
 
-from bisect import bisect_left
+from bisect import bisect_left, bisect_right
 from amoco.cas.expressions import exp
 from amoco.ui.views import mmapView
 
@@ -71,29 +85,165 @@ class MemoryMap(object):
         read(address,l): reads l bytes at address. returns a list of
             datadiv values.
 
+        getbuffer(address): returns a memoryview of the raw bytes
+            mapped from address up to the end of the memory object
+            that contains it, or None if these bytes are not raw.
+
         write(address,expr,endian=1): writes given expression at
             given (possibly symbolic) address. Default endianness is 'little'.
             Use endian=-1 to indicate big endian convention.
 
         restruct(): optimize all zones to merge contiguous raw bytes into single
-            mo objects.
+            mo objects (shared zones are replaced by private copies first.)
 
         grep(pattern): find all occurences of the given regular expression in
             the raw bytes objects of all memory zones.
 
+        copy(): returns a copy-on-write copy of the map: zones are shared
+            with the new map until either map writes into them (or until
+            the copy is deleted.)
+
+        zone(rel=None): returns the zone related to rel, replacing it by a
+            private copy if it is currently shared with another map. Callers
+            that modify a zone directly should get it from this method.
+
         merge(other): update this MemoryMap with a new MemoryMap, merging
             overlapping zones with values from the new map.
+
+        subscribe(f): register callable f(rel,offset,length) to be notified
+            of every write in the memory map. (Observers are not copied nor
+            pickled with the map.)
+
+        unsubscribe(f): remove a callable registered with subscribe.
+
+        notify(rel,offset,length): call all observers for the given written
+            area.
+
+        mmio_map(address,size,read=None,write=None): register the MMIO region
+            [address,address+size[ (concrete addresses only) with callbacks
+            read(m,address,size) that returns the expression of the region's
+            value (or None to use the memory content) and write(m,vaddr,v)
+            that replaces the write of expression v at vaddr (m is the mapper
+            that performs the access.) Previous regions that overlap the new
+            one are removed.
+
+        mmio_unmap(address): remove the MMIO region that contains address.
+
+        mmio_at(address,l=1): returns the list of (start,stop,read,write) MMIO
+            regions that overlap the l bytes at given address.
+
+    Note:
+        Writing an ext expression with *mmio_r* or *mmio_w* keyword
+        arguments (see system.baremetal.tricore) registers an MMIO region
+        that calls its stub with mode "r" or "w". Such a region is removed
+        when another write overlaps it. MMIO regions are copied with the map,
+        and are not pickled except for those of ext expressions.
     """
 
-    __slots__ = ["_zones", "misc", "view"]
+    __slots__ = [
+        "_zones",
+        "misc",
+        "view",
+        "_observers",
+        "_mmio",
+        "_mmio_sta",
+        "_mmio_ext",
+    ]
 
     def __init__(self):
-        self._zones = {None: MemoryZone()}
+        self._zones = {None: memoryzone()}
         self.misc = {}
         self.view = mmapView(self)
+        self._observers = []
+        self._mmio = []
+        self._mmio_sta = []
+        self._mmio_ext = frozenset()
+
+    def __getstate__(self):
+        return (self._zones, self.misc)
+
+    def __setstate__(self, state):
+        self._zones, self.misc = state
+        self.view = mmapView(self)
+        self._observers = []
+        self._mmio = []
+        self._mmio_sta = []
+        self._mmio_ext = frozenset()
+        for o in self._zones[None]._map:
+            self.__mmio_ext(o.vaddr, o.data.val)
+
+    def __del__(self):
+        # release the zones that are shared with other maps:
+        for z in self._zones.values():
+            if z._refs > 0:
+                z._refs -= 1
+
+    def mmio_map(self, address, size, read=None, write=None):
+        r, o = self.reference(address)
+        if r is not None:
+            raise MemoryError(address)
+        for x in self.mmio_at(o, size):
+            self.mmio_unmap(x[0])
+        # the registry is never modified in place (see copy):
+        i = bisect_left(self._mmio_sta, o)
+        self._mmio = self._mmio[:i] + [(o, o + size, read, write)] + self._mmio[i:]
+        self._mmio_sta = self._mmio_sta[:i] + [o] + self._mmio_sta[i:]
+
+    def mmio_unmap(self, address):
+        for x in self.mmio_at(address):
+            i = self._mmio.index(x)
+            self._mmio = self._mmio[:i] + self._mmio[i + 1 :]
+            self._mmio_sta = self._mmio_sta[:i] + self._mmio_sta[i + 1 :]
+            self._mmio_ext = self._mmio_ext - {x[0]}
+
+    def mmio_at(self, address, l=1):
+        if not self._mmio:
+            return []
+        try:
+            r, o = self.reference(address)
+        except MemoryError:
+            return []
+        if r is not None:
+            return []
+        res = []
+        i = max(bisect_right(self._mmio_sta, o) - 1, 0)
+        for x in self._mmio[i:]:
+            if x[0] >= o + l:
+                break
+            if x[1] > o:
+                res.append(x)
+        return res
+
+    def __mmio_ext(self, vaddr, x):
+        # update the MMIO regions of ext expressions after x is written at vaddr:
+        if isinstance(x, exp) and x._is_ext:
+            mr = x._subrefs.get("mmio_r", None)
+            mw = x._subrefs.get("mmio_w", None)
+            if mr or mw:
+                read = (lambda m, a, l: x.stub(m, mode="r")) if mr else None
+                write = (lambda m, a, v: x.stub(m, mode="w")) if mw else None
+                self.mmio_map(vaddr, x.length, read, write)
+                self._mmio_ext = self._mmio_ext | {vaddr}
+                return
+        # other writes remove the MMIO regions of ext expressions they overlap:
+        for sta, _, _, _ in self.mmio_at(vaddr, len(x)):
+            if sta in self._mmio_ext:
+                self.mmio_unmap(sta)
+
+    def subscribe(self, f):
+        if f not in self._observers:
+            self._observers.append(f)
+
+    def unsubscribe(self, f):
+        if f in self._observers:
+            self._observers.remove(f)
+
+    def notify(self, r, o, l):
+        for f in self._observers:
+            f(r, o, l)
 
     def newzone(self, label):
-        z = MemoryZone()
+        z = memoryzone()
         z.rel = label
         self._zones[label] = z
         return z
@@ -128,6 +278,12 @@ class MemoryMap(object):
         else:
             raise MemoryError(address)
 
+    def getbuffer(self, address):
+        r, o = self.reference(address)
+        if r in self._zones:
+            return self._zones[r].getbuffer(o)
+        return None
+
     def write(self, address, expr, endian=1):
         r, o = self.reference(address)
         if r is not None and not r._is_def:
@@ -136,8 +292,12 @@ class MemoryMap(object):
         if not r in self._zones:
             z = self.newzone(r)
         else:
-            z = self._zones[r]
+            z = self.zone(r)
         z.write(o, expr, endian)
+        if r is None and (self._mmio or isinstance(expr, exp) and expr._is_ext):
+            self.__mmio_ext(o, expr)
+        if self._observers:
+            self.notify(r, o, len(expr))
 
     def __getitem__(self, i):
         sta, sto = self._zones[None].range()
@@ -149,8 +309,8 @@ class MemoryMap(object):
             return res
 
     def restruct(self):
-        for z in iter(self._zones.values()):
-            z.restruct()
+        for r in list(self._zones.keys()):
+            self.zone(r).restruct()
 
     def grep(self, pattern):
         res = []
@@ -164,19 +324,49 @@ class MemoryMap(object):
     def copy(self):
         mm = self.__class__()
         for k, z in self._zones.items():
-            mm._zones[k] = z.copy()
+            z._refs += 1
+            mm._zones[k] = z
+        mm._mmio = self._mmio
+        mm._mmio_sta = self._mmio_sta
+        mm._mmio_ext = self._mmio_ext
         return mm
 
+    def zone(self, rel=None):
+        z = self._zones[rel]
+        if z._refs > 0:
+            # z is shared with other maps, get our own copy:
+            z._refs -= 1
+            z = self._zones[rel] = z.copy(restruct=False)
+        return z
+
     def merge(self, other):
         for r, z in other._zones.items():
             if r in self._zones:
+                zr = self.zone(r)
                 for o in z._map:
-                    self._zones[r].addtomap(o)
+                    zr.addtomap(o.copy())
             else:
+                z._refs += 1
                 self._zones[r] = z
+            if self._observers:
+                for o in z._map:
+                    self.notify(r, o.vaddr, len(o.data))
+        for sta, sto, read, write in other._mmio:
+            self.mmio_map(sta, sto - sta, read, write)
+            if sta in other._mmio_ext:
+                self._mmio_ext = self._mmio_ext | {sta}
 
 
 # ------------------------------------------------------------------------------
+def memoryzone(rel=None):
+    """returns a new empty zone of the class selected by conf.System.memzone
+    ('list' for :class:`MemoryZone` or 'sorted' for :class:`SortedMemoryZone`.)
+    """
+    if conf.System.memzone == "list":
+        return MemoryZone(rel)
+    return SortedMemoryZone(rel)
+
+
 class MemoryZone(object):
     """A MemoryZone contains mo objects at addresses that are integer offsets
     related to a symbolic expression. A default zone with related address set
@@ -188,11 +378,23 @@ class MemoryZone(object):
     Attributes:
         rel : the relative symbolic expression, or None.
         _map : the ordered list of mo objects of this zone.
+        _refs : the number of other :class:`MemoryMap` objects that share
+            this zone (see MemoryMap.copy.)
+        _tok : the token of mo objects that are owned by this zone. Other mo
+            objects are shared with copies of the zone and are replaced by
+            a private copy before being modified (see :meth:`private`.)
 
     Methods:
         range(): returns the lowest and highest addresses currently used by
             mo objects of this zone.
 
+        copy(restruct=True): returns a new zone that shares all mo objects
+            with this zone until either zone modifies them, optionally
+            restructured.
+
+        private(i): returns the mo object at index i of _map, replaced by a
+            copy if it is shared with another zone.
+
         locate(vaddr): if the given address is within range, return the
             index of the corresponding mo object in _map, otherwise
             return None.
@@ -200,6 +402,13 @@ class MemoryZone(object):
         read(vaddr,l): reads l bytes starting at vaddr. returns a list of
             datadiv values, unmapped areas are returned as *bottom* exp.
 
+        parts(vaddr,l): returns the list of (offset,value,endian) parts that
+            cover the l bytes at vaddr, so that writing them back restores
+            these bytes (unmapped areas are returned as *bottom* exp.)
+
+        getbuffer(vaddr): returns a memoryview of the raw bytes of the mo
+            object that maps vaddr (starting at vaddr), or None.
+
         write(vaddr,data): writes data expression or
             bytes at given (offset) address.
 
@@ -215,11 +424,13 @@ class MemoryZone(object):
             the raw bytes objects of the zone.
     """
 
-    __slots__ = ["rel", "_map", "__cache", "__hist"]
+    __slots__ = ["rel", "_map", "_refs", "_tok", "__cache", "__hist"]
 
     def __init__(self, rel=None):
         self.rel = rel
         self._map = []
+        self._refs = 0
+        self._tok = object()
         self.__cache = []  # speedup locate method
         self.__hist = []
 
@@ -238,12 +449,24 @@ class MemoryZone(object):
     def __update_cache(self):
         self.__cache = [z.vaddr for z in self._map]
 
-    def copy(self):
-        z = MemoryZone(self.rel)
-        z._map = [o.copy() for o in self._map]
-        z.restruct()
+    def copy(self, restruct=True):
+        z = self.__class__(self.rel)
+        z._map = list(self._map)
+        # all mo objects are now shared by both zones:
+        self._tok = object()
+        if restruct:
+            z.restruct()
+        else:
+            z.__update_cache()
         return z
 
+    def private(self, i):
+        o = self._map[i]
+        if o._own is not self._tok:
+            o = self._map[i] = o.copy()
+            o._own = self._tok
+        return o
+
     def locate(self, vaddr):
         p = self.__cache
         if vaddr in p:
@@ -279,7 +502,7 @@ class MemoryZone(object):
                 ll = 0
                 break
             if data is None:
-                vi = self.__cache[i]
+                vi = self._map[i].vaddr
                 if vaddr < vi:
                     l = min(vaddr + ll, vi) - vaddr
                     data = void(l * 8)
@@ -292,6 +515,35 @@ class MemoryZone(object):
         assert ll == 0
         return res
 
+    def parts(self, vaddr, l):
+        res = []
+        end = vaddr + l
+        i = self.locate(vaddr) or 0
+        for o in self._map[i:]:
+            if not o.vaddr < end:
+                break
+            if o.end <= vaddr:
+                continue
+            if o.vaddr > vaddr:
+                res.append((vaddr, exp((o.vaddr - vaddr) * 8), 1))
+                vaddr = o.vaddr
+            sto = min(o.end, end)
+            data, _ = o.data.getpart(vaddr - o.vaddr, sto - vaddr)
+            res.append((vaddr, data, o.data.endian))
+            vaddr = sto
+        if vaddr < end:
+            res.append((vaddr, exp((end - vaddr) * 8), 1))
+        return res
+
+    def getbuffer(self, vaddr):
+        i = self.locate(vaddr)
+        if i is None:
+            return None
+        o = self._map[i]
+        if vaddr in o and o.data._is_raw:
+            return memoryview(o.data.val)[vaddr - o.vaddr :]
+        return None
+
     def read_history(self, vaddr, l):
         H = []
         z = MemoryZone(self.rel)
@@ -305,6 +557,7 @@ class MemoryZone(object):
         self.addtomap(mo(vaddr, data, endian))
 
     def addtomap(self, z):
+        z._own = self._tok
         i = self.locate(z.vaddr)
         j = self.locate(z.end)
         # h = []
@@ -317,9 +570,10 @@ class MemoryZone(object):
             ii = self._map[i].copy()
             ii.trim(z.vaddr)
             # h.insert(0,ii)
-            Z = self._map[i].write(z.vaddr, z.data.val, z.data.endian)
+            Z = self.private(i).write(z.vaddr, z.data.val, z.data.endian)
             i += 1
             for newz in Z:
+                newz._own = self._tok
                 self._map.insert(i, newz)
                 i += 1
             self.__update_cache()
@@ -330,10 +584,7 @@ class MemoryZone(object):
         # delete & update every overwritten zones
         # by adjusting [i,j]:
         if z.end in self._map[j]:
-            jj = self._map[j].copy()
-            jj.setlen(z.end - z.vaddr)
-            # h.insert(0,jj)
-            self._map[j].trim(z.end)
+            self.private(j).trim(z.end)
         else:
             j += 1
         Z = [z]
@@ -344,12 +595,13 @@ class MemoryZone(object):
             ii.trim(z.vaddr)
             # h.insert(0,ii)
             # overright data:
-            Z = self._map[i].write(z.vaddr, z.data.val, z.data.endian)
+            Z = self.private(i).write(z.vaddr, z.data.val, z.data.endian)
         i += 1
         # h = self._map[i:j]+h
         del self._map[i:j]
         # insert new zones:
         for newz in Z:
+            newz._own = self._tok
             self._map.insert(i, newz)
             i += 1
         # if len(h)>0: self.__hist.insert(0,h)
@@ -360,20 +612,24 @@ class MemoryZone(object):
             return
         m = [self._map.pop(0)]
         for z in self._map:
-            rawtype = z.data._is_raw & m[-1].data._is_raw
-            if rawtype and (z.vaddr == m[-1].end):
+            if (z.vaddr == m[-1].end) and mergeable(m[-1].data, z.data):
                 try:
-                    m[-1].data.val += z.data.val
+                    v = m[-1].data.val + z.data.val
                 except TypeError:
                     m.append(z)
+                else:
+                    if m[-1]._own is not self._tok:
+                        m[-1] = m[-1].copy()
+                        m[-1]._own = self._tok
+                    m[-1].data.val = v
             else:
                 m.append(z)
         self._map = m
         self.__update_cache()
 
     def shift(self, offset):
-        for z in self._map:
-            z.vaddr += offset
+        for i in range(len(self._map)):
+            self.private(i).vaddr += offset
         self.__update_cache()
 
     def grep(self, pattern):
@@ -383,11 +639,8 @@ class MemoryZone(object):
         res = []
         for z in self._map:
             if z.data._is_raw:
-                off = 0
-                for s in g.findall(z.data.val):
-                    off = z.data.val.index(s, off)
-                    res.append(z.vaddr + off)
-                    off += len(s)
+                for s in g.finditer(z.data.val):
+                    res.append(z.vaddr + s.start())
         return res
 
     def is_raw(self):
@@ -407,6 +660,80 @@ class MemoryZone(object):
         return b''.join(dump)
 
 
+class SortedMemoryZone(MemoryZone):
+    """A SortedMemoryZone is a :class:`MemoryZone` that keeps the sorted
+    list of its mo objects' addresses up-to-date along with every update
+    of the _map rather than rebuilding it after each write.
+    Locating an address is a single bisection, and writing only updates
+    the range of objects that are overwritten.
+
+    Attributes:
+        _addr : the ordered list of addresses of mo objects in _map.
+    """
+
+    __slots__ = ["_addr"]
+
+    def __init__(self, rel=None):
+        super().__init__(rel)
+        self._addr = []
+
+    def locate(self, vaddr):
+        i = bisect_right(self._addr, vaddr)
+        if i == 0:
+            return None
+        return i - 1
+
+    def addtomap(self, z):
+        m, a = self._map, self._addr
+        z._own = self._tok
+        i = self.locate(z.vaddr)
+        j = self.locate(z.end)
+        if j is None:
+            assert i is None or i==0
+            m.insert(0, z)
+            a.insert(0, z.vaddr)
+            return
+        if j == i:
+            Z = self.private(i).write(z.vaddr, z.data.val, z.data.endian)
+            for newz in Z:
+                newz._own = self._tok
+            i += 1
+            m[i:i] = Z
+            a[i:i] = [o.vaddr for o in Z]
+            return
+        # i!=j cases:
+        # adjust mo at index j if its partially overwritten:
+        if z.end in m[j]:
+            self.private(j).trim(z.end)
+            a[j] = m[j].vaddr
+        else:
+            j += 1
+        Z = [z]
+        if i is None:
+            i = -1
+        elif z.vaddr <= m[i].end:
+            Z = self.private(i).write(z.vaddr, z.data.val, z.data.endian)
+            for newz in Z:
+                newz._own = self._tok
+        i += 1
+        # replace overwritten mo objects by the new ones:
+        m[i:j] = Z
+        a[i:j] = [o.vaddr for o in Z]
+
+    def copy(self, restruct=True):
+        z = super().copy(restruct)
+        z._addr = [o.vaddr for o in z._map]
+        return z
+
+    def restruct(self):
+        super().restruct()
+        self._addr = [o.vaddr for o in self._map]
+
+    def shift(self, offset):
+        super().shift(offset)
+        self._addr = [o.vaddr for o in self._map]
+
+
 # ------------------------------------------------------------------------------
 class mo(object):
     """A mo object essentially associates a datadiv with a memory offset, and
@@ -418,6 +745,8 @@ class mo(object):
         vaddr : a python integer that represents the offset within the memory
             zone that contains this memory object (mo).
         data : the datadiv object located at this offset.
+        _own : the token of the zone that owns this object (see
+            :meth:`MemoryZone.private`), or None.
 
     Methods:
         trim(vaddr): if this mo contains data at given offset, cut out this
@@ -434,11 +763,12 @@ class mo(object):
             inserted in the zone.
     """
 
-    __slots__ = ["vaddr", "data"]
+    __slots__ = ["vaddr", "data", "_own"]
 
     def __init__(self, vaddr, data, endian=1):
         self.vaddr = vaddr
         self.data = datadiv(data, endian)
+        self._own = None
 
     @property
     def end(self):
@@ -494,12 +824,17 @@ class datadiv(object):
     A datadiv represents any data within memory, including symbolic expressions.
 
     Args:
-        data   : either a string of bytes or an amoco expression.
+        data   : either a string of bytes, a memoryview of bytes or an
+                 amoco expression.
         endian : either [-1,1], used when data is any symbolic expression.
                  1 is for little-endian, -1 for big-endian.
 
     Attributes:
-        val : the reference to the data object.
+        val : the reference to the data object. Loaders can provide a
+              memoryview of the (mmap'ed) file data so that segments are not
+              copied until they are read or partially overwritten: reads
+              always return bytes and writes only copy the bytes around the
+              written offset.
         _is_raw : a flag indicating that the data object is a string of bytes.
 
     Methods:
@@ -535,15 +870,29 @@ class datadiv(object):
     def __len__(self):
         return len(self.val)
 
+    def __getstate__(self):
+        v = self.val
+        if isinstance(v, memoryview):
+            v = v.tobytes()
+        return (v, self.endian)
+
+    def __setstate__(self, state):
+        self.val, self.endian = state
+
     def __repr__(self):
-        s = repr(self.val)
+        v = self.val
+        if isinstance(v, memoryview):
+            v = v[:32].tobytes()
+        s = repr(v)
         if len(s) > 32:
             s = s[:32] + "..."
-            if isinstance(self.val, bytes):
+            if self._is_raw:
                 s += "'"
         return "<datadiv:%s>" % s
 
     def __str__(self):
+        if isinstance(self.val, memoryview):
+            return repr(self.val.tobytes())
         return repr(self.val) if self._is_raw else str(self.val)
 
     def cut(self, l):
@@ -568,11 +917,13 @@ class datadiv(object):
             logger.error("invalid fetch (o=%s,l=%s) in %s" % (o, l, repr(self)))
             raise ValueError
         lv = len(self)
-        if o == 0 and l == lv:
-            return (self.val, 0)
         if self._is_raw:
-            res = self.val[o : o + l]
+            res = self.val if (o == 0 and l == lv) else self.val[o : o + l]
+            if isinstance(res, memoryview):
+                res = res.tobytes()
             return (res, l - len(res))
+        if o == 0 and l == lv:
+            return (self.val, 0)
         if o >= lv:
             return (None, l)
         res = self.val.bytes(o, o + l, self.endian)
@@ -583,10 +934,20 @@ class datadiv(object):
         P = [datadiv(data, endian)]
         olv = o + len(data)
         endl = len(self) - olv
+        # (memoryviews are sliced directly to remain lazy.)
+        lazy = isinstance(self.val, memoryview)
         if endl > 0:
-            P.append(datadiv(self.getpart(olv, endl)[0], self.endian))
+            if lazy:
+                v = self.val[olv:]
+            else:
+                v = self.getpart(olv, endl)[0]
+            P.append(datadiv(v, self.endian))
         if o > 0:
-            P.insert(0, datadiv(self.getpart(0, o)[0], self.endian))
+            if lazy:
+                v = self.val[:o]
+            else:
+                v = self.getpart(0, o)[0]
+            P.insert(0, datadiv(v, self.endian))
         # now merge contiguous parts if they have same type:
         return mergeparts(P)
 
@@ -595,7 +956,8 @@ class datadiv(object):
 def mergeparts(P):
     """This function will detect every contiguous raw datadiv objects in the
     input list P, and will return a new list where these objects have been
-    merged into a single raw datadiv object.
+    merged into a single raw datadiv object (memoryviews are never merged
+    to avoid copying the underlying file data.)
 
     Args:
         P (list): input list of datadiv objects.
@@ -606,7 +968,7 @@ def mergeparts(P):
     parts = [P.pop(0)]
     while len(P) > 0:
         p = P.pop(0)
-        if parts[-1]._is_raw and p._is_raw:
+        if mergeable(parts[-1], p):
             try:
                 parts[-1].val += p.val
             except TypeError:
@@ -614,3 +976,10 @@ def mergeparts(P):
         else:
             parts.append(p)
     return parts
+
+
+def mergeable(a, b):
+    "returns True if datadiv b can be appended to datadiv a."
+    if a._is_raw and b._is_raw:
+        return not (isinstance(a.val, memoryview) or isinstance(b.val, memoryview))
+    return False
@@ -53,7 +53,10 @@ class OS(object):
             elif s.cmd == LC_SEGMENT_64:
                 if s.segname.startswith(b"__PAGEZERO\0"):
                     continue
-                data = bprm.readsegment(s).ljust(s.vmsize, b"\0")
+                if s.vmsize:
+                    data = bprm.loadsegment(s)
+                else:
+                    data = bprm.readsegment(s)
                 p.state.mmap.write(s.vmaddr, data)
             elif s.cmd in (LC_THREAD, LC_UNIXTHREAD):
                 if s.flavor == x86_THREAD_STATE64:
@@ -161,6 +161,12 @@ class PE(BinFormat):
             raise ValueError
         return self.loadsegment(s, raw=True)[offset:]
 
+    def __memory(self):
+        try:
+            return self.data.memory()
+        except AttributeError:
+            return None
+
     def loadsegment(self, S, pagesize=0, raw=False):
         """
         returns a dict {base: bytes} (or only bytes if optional arg raw is True,)
@@ -169,6 +175,8 @@ class PE(BinFormat):
 
         Note:
            If S is 0, returns base=0 and the first Opt.SizeOfHeaders bytes.
+           If no padding is needed and the file can be mapped in memory,
+           the section data is a memoryview of the file rather than bytes.
         """
         if S and not S.Characteristics == IMAGE_SCN_LNK_REMOVE:
             addr = self.basemap + S.RVA
@@ -178,10 +186,19 @@ class PE(BinFormat):
             if sta % self.Opt.FileAlignment:
                 logger.warning("bad file alignment for section %s" % S.Name)
             sto = sta + S.SizeOfRawData
-            bytes_ = self.data[sta:sto].ljust(S.VirtualSize)
-            if pagesize:
-                # note: bytes are not truncated, only extended if needed...
-                bytes_ = bytes_.ljust(pagesize, b"\x00")
+            m = self.__memory()
+            if (
+                not raw
+                and m is not None
+                and len(m[sta:sto]) >= max(S.VirtualSize, pagesize)
+            ):
+                # no padding needed: map the file data without copying it.
+                bytes_ = m[sta:sto]
+            else:
+                bytes_ = self.data[sta:sto].ljust(S.VirtualSize)
+                if pagesize:
+                    # note: bytes are not truncated, only extended if needed...
+                    bytes_ = bytes_.ljust(pagesize, b"\x00")
             if raw:
                 return bytes_
             else:
@@ -63,13 +63,13 @@ class RawExec(CoreExec):
             logger.warning("a cpu module must be imported")
         else:
             m = self.state
-            mz = m.mmap._zones[None]
+            mz = m.mmap.zone()
             sta, sto = mz.range()
             delta = vaddr - sta
-            for z in mz._map:
-                z.vaddr += delta
+            mz.shift(delta)
             # force mmap cache update:
             m.restruct()
+            self.icache.clear()
             # create _initmap with new pc as vaddr:
             pc = self.cpu.PC()
             m[pc] = self.cpu.cst(vaddr, pc.size)
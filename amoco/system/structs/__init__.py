@@ -77,6 +77,7 @@ from collections import defaultdict
 from .core import *
 from .fields import *
 from .formatters import *
+from .tables import StructTable
 
 # ------------------------------------------------------------------------------
 
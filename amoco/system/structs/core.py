@@ -4,6 +4,8 @@
 # Copyright (C) 2016 Axel Tillequin (bdcht3@gmail.com)
 # published under GPLv2 license
 
+import struct
+
 from amoco.logger import Log
 logger = Log(__name__)
 logger.debug("loading module")
@@ -20,7 +22,13 @@ class StructCore(object):
     "packed" from given values.)
 
     Each instance of a StructCore child class has its own fields copy and a
-    new "container" for associated attributes' names & unpacked values.
+    "container" for associated attributes' names & unpacked values. The
+    container class is shared by all instances of a StructCore child class
+    and has slots for its fields' names.
+
+    Structures made only of raw fields (no nested struct, bit or variable
+    length fields) are unpacked with a single :class:`struct.Struct` that is
+    compiled once for each layout of fields (see :meth:`codec`.)
 
     Attributes:
         packed (Bool=False): Unless the "packed" attribute is set to True,
@@ -46,10 +54,14 @@ class StructCore(object):
     union  = False
     typedef = False
 
+    _codecs = {}
+
     def __new__(cls, *args, **kargs):
         obj = super(StructCore, cls).__new__(cls)
         obj.fields = [f.copy(obj) for f in cls.fields]
-        t = type("container", (object,), {})
+        t = cls.__dict__.get("_container", None)
+        if t is None:
+            t = cls._container = container_class(cls.fields)
         obj._v = t()
         return obj
 
@@ -150,7 +162,86 @@ class StructCore(object):
     def align_value(cls,psize=0):
         return max([f.align_value(psize) for f in cls.fields])
 
+    def codec(self, psize=0):
+        """
+        Returns the compiled (struct.Struct, plan) codec for the current
+        layout of the instance's fields or None if the structure can't
+        be unpacked with a fixed format (union, typedef, non-raw fields.)
+        Codecs are shared by all structures with the same layout.
+        """
+        if self.union is not False or self.typedef:
+            return None
+        key = (psize, self.packed)
+        key += tuple(
+            (f.__class__, f.typename, f.count, f.order, f.name) for f in self.fields
+        )
+        try:
+            return self._codecs[key]
+        except KeyError:
+            pass
+        fmt = []
+        plan = []
+        order = None
+        offset = 0
+        n = 0
+        for f in self.fields:
+            c = f.codec(psize)
+            if c is None:
+                break
+            fc, kind, nb = c
+            if fc[-1] in "hHiIlLqQefd":
+                # byte ordering matters only for these types:
+                if order is None:
+                    order = f.order
+                elif f.order != order:
+                    break
+            if not self.packed:
+                pad = f.align(offset, psize) - offset
+                if pad:
+                    fmt.append("%dx" % pad)
+                    offset += pad
+            fmt.append(fc)
+            plan.append((f.name, n, n + nb, kind))
+            offset += f.size(psize)
+            n += nb
+        else:
+            try:
+                S = struct.Struct((order or "<") + "".join(fmt))
+            except struct.error:
+                S = None
+            if S is not None and S.size == offset:
+                self._codecs[key] = (S, tuple(plan))
+                return self._codecs[key]
+        self._codecs[key] = None
+        return None
+
     def unpack(self, data, offset=0, psize=0):
+        c = self.codec(psize)
+        if c is not None:
+            S, plan = c
+            try:
+                values = S.unpack_from(data, offset)
+            except TypeError:
+                try:
+                    values = S.unpack(data[offset : offset + S.size])
+                except Exception:
+                    values = None
+            except struct.error:
+                values = None
+            if values is not None:
+                v = self._v
+                for name, i, j, kind in plan:
+                    if not name:
+                        continue
+                    if kind == 0:
+                        x = values[i]
+                    elif kind == 1:
+                        x = values[i:j]
+                    else:
+                        x = b"".join(values[i:j])
+                    setattr(v, name, x)
+                return self
+            # otherwise, let the fields raise the error:
         for f in self.fields:
             if self.union is False and not self.packed:
                 offset = f.align(offset, psize)
@@ -171,7 +262,8 @@ class StructCore(object):
                 elif hasattr(f,'subnames'):
                     # its a bitfield so the unpacked value
                     # is a dict with subnames/subvalues:
-                    self._v.__dict__.update(value)
+                    for k, x in value.items():
+                        setattr(self._v, k, x)
             if self.union is False:
                 offset += f.size(psize)
         return self
@@ -239,6 +331,20 @@ class StructCore(object):
 # ------------------------------------------------------------------------------
 
 
+def container_class(fields):
+    """
+    Returns the class of objects that hold the values of a structure with
+    given fields. Fields' names have their own slot, other attributes are
+    still allowed in the container's __dict__.
+    """
+    names = []
+    for f in fields:
+        for n in getattr(f, "subnames", None) or [f.name]:
+            if n and n.isidentifier() and not n.startswith("__") and n not in names:
+                names.append(n)
+    return type("container", (object,), {"__slots__": tuple(names) + ("__dict__",)})
+
+
 # our data structures exception handler:
 class StructureError(Exception):
     def __init__(self, message):
@@ -42,6 +42,8 @@ class Field(object):
             list of objects of type typename.
         get (data,offset=0) : returns the field name and the unpacked value
             for this field.
+        codec (psize=0) : returns the (format,kind,count) that allows to unpack
+            the field as part of a compiled structure format, or None.
         pack (value) : packs the value with the internal order and returns the
             byte string according to type typename.
     """
@@ -169,6 +171,16 @@ class Field(object):
     def get(self, data, offset=0, psize=0):
         return (self.name, self.unpack(data, offset, psize))
 
+    def codec(self, psize=0):
+        """
+        Returns the (format, kind, count) tuple that allows the structure to
+        unpack this field with a compiled struct format, or None if the field
+        can't be decoded that way. The kind indicates how the count values
+        of the format are returned: 0 for the value itself, 1 for the tuple of
+        values and 2 for the join of bytes values.
+        """
+        return None
+
     def pack(self, value, psize=0):
         if self.count > 0:
             return b"".join([self.type().pack(v,psize) for v in value])
@@ -176,6 +188,12 @@ class Field(object):
 
     def copy(self,obj=None):
         cls = self.__class__
+        if cls is Field or cls is RawField:
+            # these fields have no other state than their attributes:
+            newf = object.__new__(cls)
+            newf.__dict__.update(self.__dict__)
+            newf.instance = obj
+            return newf
         newf = cls(
             self.typename,
             self.count,
@@ -238,6 +256,20 @@ class RawField(Field):
             sz = sz * self.count
         return sz
 
+    def codec(self, psize=0):
+        if self.__class__ is not RawField:
+            return None
+        tn = self.typename
+        if psize and tn in ('P','L','l'):
+            tn = {4:'I',8:'Q',32:'I',64:'Q'}.get(psize,tn)
+        if tn not in "cbB?hHiIlLqQefds" or len(tn) != 1:
+            return None
+        if self.count == 0:
+            return (tn, 0, 1)
+        if tn == "s":
+            return ("%ds" % self.count, 0, 1)
+        return ("%d%s" % (self.count, tn), 2 if tn == "c" else 1, self.count)
+
     def unpack(self, data, offset=0, psize=0):
         pfx = "%d" % self.count if self.count > 0 else ""
         tn = self.typename
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# This code is part of Amoco
+# Copyright (C) 2016 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+import struct
+from array import array
+
+from amoco.logger import Log
+logger = Log(__name__)
+logger.debug("loading module")
+
+from .core import StructureError
+
+try:
+    import numpy as np
+except ImportError:
+    logger.verbose("numpy package not found => tables use array columns")
+    np = None
+
+# ------------------------------------------------------------------------------
+
+
+class StructTable(object):
+    """
+    A StructTable is a *columnar* alternative to a list of StructCore instances
+    for large tables of fixed-layout structures (like ELF symbols or
+    relocations.) All entries are decoded at once from the table's bytes into
+    one column per field (a numpy structured array if numpy is available,
+    otherwise a python array for each field.)
+
+    Entries are still accessible as StructCore instances: indexing or
+    iterating over the table returns a new structure whose values are
+    taken from the columns (rather than unpacked again from bytes.)
+
+    Args:
+        new (callable): returns a new (not unpacked) structure instance with
+                        fields adjusted like the table's entries (byte order,
+                        32/64 bits types, etc.)
+        data (bytes): the table bytes.
+        entsize (int): size in bytes of each entry (defaults to the size of
+                       the structure.)
+        psize (int): pointer size passed to the structure's codec.
+
+    Attributes:
+        use_numpy (Bool): True if columns are held in a numpy structured array.
+        names (tuple): names of fields.
+        columns : numpy structured array or dict of python arrays indexed
+                  by fields' names.
+
+    Raises:
+        StructureError: if the structure has no compiled codec (see
+                        :meth:`StructCore.codec`) or if data does not match
+                        entsize.
+    """
+
+    use_numpy = np is not None
+
+    def __init__(self, new, data, entsize=None, psize=0):
+        self.new = new
+        proto = new()
+        c = proto.codec(psize)
+        if c is None or any(kind != 0 for (_, _, _, kind) in c[1]):
+            raise StructureError("%s has no codec" % proto.__class__.__name__)
+        S, plan = c
+        entsize = entsize or S.size
+        if entsize < S.size or len(data) % entsize:
+            raise StructureError("table size mismatch")
+        self.names = tuple(name for (name, _, _, _) in plan)
+        self.entsize = entsize
+        self.__len = len(data) // entsize
+        fmt = S.format
+        order, fmt = fmt[0], fmt[1:]
+        if self.use_numpy:
+            formats = []
+            offsets = []
+            for (o, _), f in zip(proto.offsets(psize), proto.fields):
+                formats.append(self.__dtype(f.codec(psize)[0], order))
+                offsets.append(o)
+            if None in formats:
+                # numpy would strip bytes fields, use python arrays:
+                self.use_numpy = False
+        if self.use_numpy:
+            dt = np.dtype(
+                {
+                    "names": self.names,
+                    "formats": formats,
+                    "offsets": offsets,
+                    "itemsize": entsize,
+                }
+            )
+            self.columns = np.frombuffer(data, dtype=dt, count=self.__len)
+        else:
+            if entsize > S.size:
+                S = struct.Struct("%s%s%dx" % (order, fmt, entsize - S.size))
+            cols = zip(*S.iter_unpack(data)) if self.__len else [()] * len(plan)
+            self.columns = {}
+            for (name, _, _, _), f, col in zip(plan, proto.fields, cols):
+                tc = self.__typecode(f.codec(psize)[0])
+                self.columns[name] = array(tc, col) if tc else list(col)
+
+    @staticmethod
+    def __dtype(fc, order):
+        if fc[-1] in "sc":
+            return None
+        return order + fc
+
+    @staticmethod
+    def __typecode(fc):
+        tc = {"l": "i", "L": "I"}.get(fc, fc)
+        if len(tc) == 1 and tc in "bBhHiIqQfd":
+            # make sure that the array item can hold the struct value:
+            if array(tc).itemsize >= struct.calcsize("<" + fc):
+                return tc
+            return tc.isupper() and "Q" or "q"
+        return None
+
+    def __len__(self):
+        return self.__len
+
+    def column(self, name):
+        "returns the column (array) of values of given field name"
+        return self.columns[name]
+
+    def value(self, i, name):
+        "returns the value of field name for entry i"
+        x = self.columns[name][i]
+        return x.item() if hasattr(x, "item") else x
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.__len))]
+        if i < 0:
+            i += self.__len
+        if not (0 <= i < self.__len):
+            raise IndexError(i)
+        s = self.new()
+        for name in self.names:
+            setattr(s._v, name, self.value(i, name))
+        return s
+
+    def __iter__(self):
+        for i in range(self.__len):
+            yield self[i]
+
+    def map(self, f, col):
+        """
+        returns the column of f(x) for every x of given column, where f is
+        an arithmetic function that is vectorized by numpy columns.
+        """
+        if self.use_numpy:
+            return f(col)
+        return array(col.typecode, map(f, col))
+
+    def isin(self, col, values):
+        "returns the mask of entries of given column that have one of values"
+        if self.use_numpy:
+            return np.isin(col, list(values))
+        values = set(values)
+        return [x in values for x in col]
+
+    def where(self, *masks):
+        """
+        returns the indices of entries for which all masks are True, where
+        each mask is a numpy boolean array or an iterable of booleans.
+        """
+        if self.use_numpy:
+            m = np.ones(self.__len, dtype=bool)
+            for x in masks:
+                m &= x
+            return np.flatnonzero(m)
+        return array("L", (i for i, m in enumerate(zip(*masks)) if all(m)))
+
+    def argsort(self, col):
+        "returns the list of sorted values of given column and their indices"
+        if self.use_numpy:
+            order = np.argsort(col, kind="stable")
+            return (col[order].tolist(), order.tolist())
+        order = sorted(range(len(col)), key=col.__getitem__)
+        return ([col[i] for i in order], order)
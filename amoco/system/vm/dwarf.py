@@ -296,11 +296,10 @@ class DwarfExec(CoreExec):
         from amoco.cas.mapper import mapper
 
         m = mapper()
-        mz = self.mmap._zones[None]
-        for z in mz._map:
-            z.vaddr += vaddr
+        self.mmap.zone().shift(vaddr)
         # force mmap cache update:
         self.mmap.restruct()
+        self.icache.clear()
         # create _initmap with new pc as vaddr:
         pc = self.cpu.opt_ptr
         m[pc] = self.cpu.cst(vaddr, pc.size)
@@ -16,7 +16,6 @@ import ctypes
 import re
 import multiprocessing as mp
 import queue
-import time
 from amoco.config import conf
 from amoco.ui.render import Token, highlight
 from amoco.ui.cli import cmdcli_builder
@@ -367,19 +366,9 @@ class cmd_continue(object):
     def run(srv, args):
         cmd = args.pop(0)
         if srv.obj:
-            count = 0
-            group = 1000
-            t0 = time.time()
-            for i in srv.obj.iterate():
-                count += 1
-                if count%group==0:
-                    t  = time.time()
-                    avrg = (t-t0)/count
-                    freq = (1./avrg)/group
-                    print("count: %08dk  perf: %2.4f KHz"%(count//group,freq),
-                          end="\r")
-            t = time.time()
-            srv.msgs.put("count: %08d  perf: %2.5f"%(count,(t-t0)/count))
+            count, dt, reason = srv.obj.run()
+            perf = count/dt if dt>0 else 0.
+            srv.msgs.put("count: %08d  perf: %2.4f KHz (%s)"%(count,perf/1000.,reason))
             srv.msgs.put(str(srv.obj.view))
         else:
             srv.msgs.put('error: no task loaded')
@@ -401,21 +390,13 @@ class cmd_trace(object):
     def run(srv, args):
         cmd = args.pop(0)
         if srv.obj:
-            count = 0
             limit = None
             if args:
                 try:
                     limit = int(args.pop(0),0)
                 except Exception:
                     pass
-            for i,ops in srv.obj.iterate(trace=True):
-                count += 1
-                ops_v = ["%s (%s)"%(v,o) for v,o in ops]
-                logger.info("%08x: %s %s"%(i.address,
-                                           "{: <8}".format(i.mnemonic.lower()),
-                                           ", ".join(ops_v)))
-                if count >= limit:
-                    break
+            count, dt, reason = srv.obj.run(limit,trace=True)
             srv.msgs.put("traced %d instruction in server's log (INFO level)"%count)
         else:
             srv.msgs.put('error: no task loaded')
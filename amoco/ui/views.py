@@ -31,7 +31,7 @@ from amoco.logger import Log
 logger = Log(__name__)
 logger.debug("loading module")
 
-from amoco.cas.expressions import regtype
+from amoco.cas.expressions import regtype, ptr
 from amoco.ui.graphics import Engine
 from amoco.ui.render import Token, vltable, tokenrow, icons
 
@@ -410,12 +410,13 @@ class execView(View):
             start = self.of.cpu.cst(start,size=aw)
         if hasattr(start,'etype'):
             cur = self.of.cpu.mem(start,size=w)
+        A = [ptr(cur.a,disp=k*(w//8)) for k in range(nbl*nbc)]
+        V = self.of.state.read_many(A,w)
         for i in range(nbl):
-            r = cur.a.toks() + [(Token.Column,""), (Token.Literal, icons.ver+" ")]
+            r = A[i*nbc].toks() + [(Token.Column,""), (Token.Literal, icons.ver+" ")]
             for j in range(nbc):
-                r.extend(self.of.state(cur).toks())
+                r.extend(V[i*nbc+j].toks())
                 r.append((Token.Column, ""))
-                cur.a.disp += w//8
             r.pop()
             t.addrow(r)
         return t
@@ -591,6 +592,7 @@ class emulView(View):
 
     def __str__(self):
         t = []
+        self.of.sync()
         for f in self.frames:
             try:
                 t.extend(f())
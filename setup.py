@@ -66,6 +66,7 @@ setup(
         'app' : ['click',
                  'pygments',
                  'z3-solver',
+                 'numpy',
                  'tqdm',
                  'ccrawl>=1.9',
                  'PySide6',
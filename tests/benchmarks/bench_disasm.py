@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+bench_disasm.py
+===============
+
+Microbenchmark of the disassembler: linearly decode the bytes of some
+sample files with the specs tree decoder and with the compiled dispatch
+tables decoder (see arch.core.disassembler.compile) and report
+the number of decoded instructions per second.
+
+usage: python tests/benchmarks/bench_disasm.py [maxbytes]
+"""
+
+import os
+import sys
+import time
+import importlib
+
+samples = os.path.join(os.path.dirname(__file__), os.pardir, "samples")
+
+BENCHS = [
+    ("amoco.arch.x86.cpu_x86", "x86/flow.elf", ".text"),
+    ("amoco.arch.x86.cpu_x86", "x86/CoST.exe", None),
+    ("amoco.arch.x64.cpu_x64", "x64/cxx.elf64", ".text"),
+    ("amoco.arch.x64.cpu_x64", "x64/test_full.elf64", None),
+    ("amoco.arch.arm.cpu_armv7", "arm/hw", None),
+    ("amoco.arch.arm.cpu_armv8", "arm/hw", None),
+    ("amoco.arch.riscv.cpu_rv32i", "riscv/TA.elf.signed", ".text"),
+    ("amoco.arch.tricore.cpu", "arm/hw", None),
+]
+
+
+def code(filename, section=None):
+    """returns the bytes of the given ELF section of a sample file,
+    or all its bytes if section is None."""
+    from amoco.system.core import DataIO
+    from amoco.system.elf import Elf
+
+    with open(os.path.join(samples, filename), "rb") as f:
+        if section is None:
+            return f.read()
+        return Elf(DataIO(f)).readsection(section)
+
+
+def sweep(d, data):
+    "decode data linearly, skipping 1 byte when decoding fails"
+    res = []
+    p = 0
+    n = len(data)
+    while p < n:
+        try:
+            i = d(data[p : p + d.maxlen])
+        except Exception:
+            # some spec hooks raise other errors on invalid inputs...
+            i = None
+        if i is None:
+            res.append(None)
+            p += 1
+        else:
+            res.append(i)
+            p += i.length
+    return res
+
+
+def key(i):
+    if i is None:
+        return None
+    return (i.mnemonic, bytes(i.bytes), tuple(str(x) for x in i.operands))
+
+
+def bench(modname, filename, section=None, maxbytes=0x4000):
+    cpu = importlib.import_module(modname)
+    d = cpu.disassemble
+    data = code(filename, section)[:maxbytes]
+    res = {}
+    for mode in ("tree", "compiled"):
+        if mode == "compiled":
+            d.compile()
+        else:
+            d.uncompile()
+        # build tables (compiled mode) and warm up caches:
+        sweep(d, data[:0x400])
+        t0 = time.perf_counter()
+        L = sweep(d, data)
+        t = time.perf_counter() - t0
+        res[mode] = (L, t)
+    d.uncompile()
+    L0, t0 = res["tree"]
+    L1, t1 = res["compiled"]
+    ok = [key(x) for x in L0] == [key(x) for x in L1]
+    count = len([x for x in L0 if x is not None])
+    print(
+        "%-28s %-22s %6d instr  tree: %9.0f i/s  compiled: %9.0f i/s  (x%.2f) %s"
+        % (
+            modname.split(".")[-1],
+            filename,
+            count,
+            count / t0,
+            count / t1,
+            t0 / t1,
+            "ok" if ok else "MISMATCH",
+        )
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    maxbytes = int(sys.argv[1], 0) if len(sys.argv) > 1 else 0x4000
+    ok = all([bench(m, f, s, maxbytes) for (m, f, s) in BENCHS])
+    sys.exit(0 if ok else 1)
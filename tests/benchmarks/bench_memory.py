@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+bench_memory.py
+===============
+
+Microbenchmark of memory zones: replay write-heavy traces (stack-like
+pushes/pops of registers and constants, scattered heap writes) with the
+'list' (MemoryZone) and 'sorted' (SortedMemoryZone) backends of
+system.memory and report the number of writes per second.
+
+usage: python tests/benchmarks/bench_memory.py [nwrites]
+"""
+
+import sys
+import time
+import random
+
+from amoco.config import conf
+from amoco.cas.expressions import cst, reg
+from amoco.system.memory import MemoryMap
+
+
+def stack_trace(n, seed=0):
+    "push/pop 4-bytes values below a moving stack pointer"
+    rnd = random.Random(seed)
+    regs = [reg("r%d" % i, 32) for i in range(8)]
+    sp = 0x10000
+    T = []
+    for _ in range(n):
+        if rnd.random() < 0.55 or sp >= 0x10000:
+            sp -= 4
+        else:
+            sp += 4
+        if rnd.random() < 0.5:
+            v = rnd.choice(regs)
+        else:
+            v = cst(rnd.randrange(1 << 32), 32)
+        T.append((sp, v))
+    return T
+
+
+def heap_trace(n, seed=1):
+    "scattered writes of small raw buffers and symbolic values"
+    rnd = random.Random(seed)
+    T = []
+    for _ in range(n):
+        a = 0x100000 + rnd.randrange(0, 0x40000)
+        if rnd.random() < 0.7:
+            v = bytes(rnd.randrange(256) for _ in range(rnd.choice((1, 2, 4, 8))))
+        else:
+            v = reg("r%d" % rnd.randrange(8), 32)
+        T.append((a, v))
+    return T
+
+
+def replay(T):
+    m = MemoryMap()
+    m.write(0, b"\0" * 16)
+    t0 = time.perf_counter()
+    for a, v in T:
+        m.write(a, v)
+    t = time.perf_counter() - t0
+    return m, t
+
+
+def bench(name, T):
+    res = {}
+    for mode in ("list", "sorted"):
+        conf.System.memzone = mode
+        res[mode] = replay(T)
+    m0, t0 = res["list"]
+    m1, t1 = res["sorted"]
+    z0 = m0._zones[None]
+    z1 = m1._zones[None]
+    ok = [str(o) for o in z0._map] == [str(o) for o in z1._map]
+    n = len(T)
+    print(
+        "%-6s %7d writes  %6d mo  list: %9.0f w/s  sorted: %9.0f w/s  (x%.2f) %s"
+        % (name, n, len(z1._map), n / t0, n / t1, t0 / t1, "ok" if ok else "MISMATCH")
+    )
+    return ok
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1], 0) if len(sys.argv) > 1 else 20000
+    ok = bench("stack", stack_trace(n))
+    ok &= bench("heap", heap_trace(n))
+    sys.exit(0 if ok else 1)
@@ -63,6 +63,39 @@ def sc1():
            b"\x6e\x2f\x73\x68")
     return _sc
 
+@pytest.fixture
+def sc2():
+    '''return a x86 shellcode loop:
+       mov ecx,100 ; xor eax,eax ; mov esp,0x2000
+       L: add eax,ecx ; mov [0x1000],eax ; push eax ; pop eax ; dec ecx ; jnz L'''
+    return bytes.fromhex("b96400000031c0bc0020000001c8a30010000050584975f4f4")
+
+@pytest.fixture
+def sc3():
+    '''return a x86 shellcode that calls a function twice:
+       call F ; call F ; hlt ; F: mov eax,1 ; ret'''
+    return bytes.fromhex("e806000000e801000000f4b801000000c3")
+
+@pytest.fixture
+def sc4():
+    '''return a x86 shellcode with nested calls:
+       call F ; hlt ; F: call G ; ret ; G: mov eax,1 ; ret'''
+    return bytes.fromhex("e801000000f4e801000000c3b801000000c3")
+
+@pytest.fixture
+def rawx86(monkeypatch):
+    '''return a function that loads x86 shellcode in a new RawExec program
+       (conf.Cas.noaliasing is True during the test)'''
+    from amoco.config import conf
+    from amoco.system.core import DataIO, shellcode
+    from amoco.system.raw import RawExec
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    def load(code):
+        p = RawExec(shellcode(DataIO(code)))
+        p.use_x86()
+        return p
+    return load
+
 #------------------------------------------------------------------------------
 
 import os
@@ -58,3 +58,41 @@ def test_decoder_BFI_BFC():
 
 #------------------------------------------------------------------------------
 
+
+def test_decoder_compiled(samples):
+  for f in samples:
+    if f.endswith("arm/sc.bin"):
+      c = open(f,"rb").read()
+  def sweep(ithumb=0):
+    res = []
+    internals["isetstate"] = ithumb
+    for p in range(0,len(c)-4,2):
+      i = cpu.disassemble(c[p:p+4])
+      res.append(str(i) if i is not None else None)
+    internals["isetstate"] = 0
+    return res
+  L = [sweep(0),sweep(1)]
+  cpu.disassemble.compile()
+  try:
+    assert [sweep(0),sweep(1)]==L
+  finally:
+    cpu.disassemble.uncompile()
+
+def test_mapper_STMDB_LDM():
+  from amoco.cas.mapper import mapper
+  # stmdb r0!, {r4, lr}
+  i = cpu.disassemble(struct.pack('<I',0xe9204010))
+  assert i.mnemonic == "STMDB"
+  m = mapper()
+  i(m)
+  assert m[mem(r0-8,32)] == r4
+  assert m[mem(r0-4,32)] == lr
+  assert m(r0) == r0-8
+  # ldm r0!, {r4, lr}
+  i = cpu.disassemble(struct.pack('<I',0xe8b04010))
+  assert i.mnemonic == "LDM"
+  m = mapper()
+  i(m)
+  assert m(r4) == mem(r0,32)
+  assert m(lr) == mem(r0+4,32)
+  assert m(r0) == r0+8
@@ -531,3 +531,133 @@ def test_asm_033(amap):
   assert amap(esp)==0x67452301-4
   assert amap(mem(esp,32))==cst(0x67452301,32)
 
+
+def test_decoder_compiled(sc1):
+  c = sc1 + b'\x66\x0f\x3a\x0f\xc1\x08\xf3\xa4\x2e\x8b\x44\x88\x10\xc7\x04\x24\x01\x00\x00\x00'
+  def sweep():
+    res = []
+    p = 0
+    while p<len(c):
+      i = cpu.disassemble(c[p:p+15],address=p)
+      if i is None:
+        res.append(None)
+        p += 1
+      else:
+        res.append(str(i))
+        p += i.length
+    return res
+  L = sweep()
+  cpu.disassemble.compile()
+  try:
+    assert sweep()==L
+  finally:
+    cpu.disassemble.uncompile()
+  assert None not in L
+
+def test_speccache(tmp_path, sc1):
+  from amoco.arch.core import disassembler, speccache
+  from amoco.arch.x86 import spec_ia32
+  conf.Arch.cachedir = str(tmp_path)
+  entries = speccache.entries
+  try:
+    speccache.entries = {}
+    d1 = disassembler([spec_ia32], iclass=cpu.instruction_x86)
+    assert (tmp_path/"amoco.arch.x86.spec_ia32.specs").exists()
+    # force reload from cache file:
+    speccache.entries = {}
+    d2 = disassembler([spec_ia32], iclass=cpu.instruction_x86)
+    assert speccache.entries["amoco.arch.x86.spec_ia32"]["trees"]
+    for p in range(len(sc1)):
+      i1 = d1(sc1[p:p+15])
+      i2 = d2(sc1[p:p+15])
+      assert str(i1)==str(i2)
+  finally:
+    conf.Arch.cachedir = ""
+    speccache.entries = entries
+
+def test_speccache_module(tmp_path, monkeypatch):
+  import importlib, sys
+  from amoco.arch.core import speccache
+  monkeypatch.setattr(conf.Arch, "cachedir", str(tmp_path))
+  monkeypatch.setattr(speccache, "entries", {})
+  monkeypatch.syspath_prepend(str(tmp_path))
+  (tmp_path/"spec_test.py").write_text(
+    "from amoco.arch.core import *\n"
+    "ISPECS = []\n"
+    "@ispec('8>[ {90} ]', mnemonic='NOP')\n"
+    "def f(obj):\n"
+    "    pass\n"
+  )
+  m = importlib.import_module("spec_test")
+  try:
+    assert m.ISPECS[0].ast is not None
+    assert "8>[ {90} ]" in speccache.entries["spec_test"]["specs"]
+    assert "spec_test" in speccache.dirty
+  finally:
+    speccache.dirty.discard("spec_test")
+    sys.modules.pop("spec_test", None)
+
+def test_lazyflags():
+  from amoco.cas.mapper import mapper
+  # add eax,ebx ; inc eax ; sete al ; sub eax,ecx
+  c = bytes.fromhex("01d8400f94c029c8")
+  I = []
+  while c:
+    i = cpu.disassemble(c)
+    I.append(i)
+    c = c[i.length:]
+  def run(lazy, n):
+    conf.Arch.lazyflags = lazy
+    m = mapper()
+    try:
+      for i in I[:n]:
+        i(m)
+    finally:
+      conf.Arch.lazyflags = False
+    return m
+  m = run(True, 2)
+  assert m.has(eflags) and not m.generation().get(eflags)
+  assert len(m)==len(run(False, 2))
+  m0 = m.copy()
+  # cf is still pending from add:
+  assert m(cf)==run(False, 2)(cf)
+  assert m(zf)==run(False, 2)(zf)
+  # flags are written last in lazy mode:
+  L = lambda m: sorted(str(m).split("\n"))
+  assert L(m0)==L(run(False, 2))
+  assert L(run(True, 4))==L(run(False, 4))
+
+def test_semantics_template():
+  from amoco.cas.mapper import mapper
+  import pickle
+  i = cpu.disassemble(bytes.fromhex("01d8"), address=cst(0x1000,32))
+  assert i._sem[0]=="ADD" and i._sem[1].__name__=="i_ADD"
+  t = i.template()
+  assert i.template() is t
+  m = mapper()
+  i(m)
+  assert str(mapper([i]))==str(m)
+  # mappers built from the template don't modify it:
+  m = mapper([i,i])
+  assert str(i.template())==str(t)
+  assert str(m)!=str(t)
+  conf.Arch.lazyflags = True
+  try:
+    assert i.template() is not t
+  finally:
+    conf.Arch.lazyflags = False
+  j = pickle.loads(pickle.dumps(i))
+  assert j._sem is None and j._tpl is None
+  assert str(mapper([j]))==str(t)
+  # addresses are compared by value:
+  t = i.template()
+  i.address = cst(0x1000,32)
+  assert i.template() is t
+  i.address = cst(0x2000,32)
+  assert i.template() is not t
+
+def test_semantics_template_complexity(monkeypatch):
+  i = cpu.disassemble(bytes.fromhex("01d8"), address=cst(0x1000,32))
+  t = i.template()
+  monkeypatch.setattr(conf.Cas, "complexity", conf.Cas.complexity+1)
+  assert i.template() is not t
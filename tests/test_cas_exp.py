@@ -47,6 +47,23 @@ def test_comp():
     assert c[16:24][4:8] == c[20:24]
     assert c[0:4] == 1
 
+def test_comp_index():
+    c = comp(512)
+    c[0:512] = cst(0,512)
+    for i in range(0,512,64):
+        c[i+8:i+16] = reg('r%d'%i,8)
+    assert c.index==sorted(c.parts.keys())
+    assert len(c.index)==2*8+1
+    assert c.overlaps(8,16)==[(8,16)]
+    assert c.overlaps(12,80)==[(8,16),(16,72),(72,80)]
+    assert c[64+8:64+16] is c.parts[(72,80)]
+    c[4:132] = cst(-1,128)
+    assert c.index[0:3]==[(0,4),(4,132),(132,136)]
+    assert c.index==sorted(c.parts.keys())
+    x = c[0:136]
+    assert x._is_cst and x.size==136
+    assert x.v==(1<<132)-16
+
 def test_slc():
     a = reg('%a',32)
     ah = slc(a,24,8,'%ah')
@@ -225,3 +242,71 @@ def test_pickle_vec(a,b):
     assert y.l[0] == a
     assert y.l[1] == -b
 
+
+def test_hash_cached(a,b):
+    x = (a+b)^cst(3,32)
+    h = hash(x)
+    assert x._hash==h
+    assert hash((a+b)^cst(3,32))==h
+    assert hash((a+b)^cst(4,32))!=h
+    p = pickler(x)
+    y = pickle.loads(p)
+    assert not hasattr(y,'_hash')
+    assert hash(y)==h
+    # in-place simplification clears the cached hash:
+    z = op('+',a,cst(0,32))
+    hash(z)
+    assert z.simplify() is a or not hasattr(z,'_hash')
+
+def test_hashcons(a,b):
+    x = a+b
+    assert x is not a+b
+    conf.Cas.hashcons = True
+    try:
+        x = a+b
+        assert x is a+b
+        assert (x^a)[0:8] is (x^a)[0:8]
+        assert x is not a-b
+    finally:
+        conf.Cas.hashcons = False
+
+def test_hashcons_collision(monkeypatch):
+    from amoco.cas.expressions import identical
+    monkeypatch.setattr(conf.Cas, "hashcons", True)
+    r = reg('rax',64)
+    x = r+cst(1,64)
+    y = r+cst(2**61,64)
+    assert hash(x)==hash(y)
+    assert not identical(x,y)
+    assert y.r.v==2**61
+    assert identical(x,r+cst(1,64))
+    assert x is r+cst(1,64)
+
+def test_simplify_memo(a,b):
+    from amoco.cas.expressions import memo
+    memo.clear()
+    x = (a+b)-cst(3,32)
+    assert x._nf
+    assert x.simplify() is x
+    assert memo.misses>0
+    h = memo.hits
+    y = (a+b)-cst(3,32)
+    assert memo.hits>h
+    assert y==x and y is not x
+    # memoized results are copies:
+    y.sf = True
+    assert ((a+b)-cst(3,32)).sf == x.sf
+    # keys that only differ by the sign flag of a constant do not collide:
+    u = cst(0xffffffff,32)
+    v = cst(-1,32)
+    memo.clear()
+    assert memo.get(('^',b,u,False,conf.Cas.complexity)) is None
+    memo.put(('^',b,u,False,conf.Cas.complexity),b^u,0x4000)
+    assert memo.get(('^',b,v,False,conf.Cas.complexity)) is None
+    assert memo.get(('^',b,cst(0xffffffff,32),False,conf.Cas.complexity)) is not None
+    conf.Cas.memo = 0
+    try:
+        x = (a+b)-cst(3,32)
+        assert not x._nf
+    finally:
+        conf.Cas.memo = 0x4000
@@ -216,3 +216,156 @@ def test_pickle_mapper(a,m):
     assert len(parts)==1
     assert parts[0]==b'\x01'
 
+
+def test_generation_index(m,a,x,y):
+    g = m.generation()
+    m[mem(a,32)] = x
+    assert m.aliasing(mem(a,32,disp=4))==0
+    m[mem(y,32)] = x
+    assert g.ordinal(ptr(a))<g.ordinal(ptr(y))
+    assert m.aliasing(mem(a,32,disp=4))==g.lastw
+    assert m.aliasing(mem(y,32))==0
+    assert m.has(ptr(y)) and not m.has(ptr(x))
+    assert list(g.pointers())==[ptr(a),ptr(y)]
+    m[mem(a,32)] = y
+    assert list(g.pointers())==[ptr(y),ptr(a)]
+    assert m.aliasing(mem(y,32))==g.lastw
+    mc = m.copy()
+    assert list(mc.generation().pointers())==[ptr(y),ptr(a)]
+
+def test_safe_update_rollback(m,a,x,y,monkeypatch):
+    monkeypatch.setattr(conf.Cas, "noaliasing", False)
+    m.clear()
+    m[x] = cst(0x12345678,32)
+    m[mem(a,32)] = y
+    m[mem(y,32)] = x
+    before = str(m)
+    g = m.generation()
+    P = list(g.pointers())
+    class bad(object):
+        address = cst(0,32)
+        def __call__(self,m):
+            m[x[8:16]] = cst(0,8)
+            m[mem(a,32)] = x
+            m[mem(x,32)] = y
+            m[y] = x
+            m.conds.append(x==y)
+            raise ValueError
+    with pytest.raises(ValueError):
+        m.safe_update(bad())
+    assert str(m)==before
+    assert list(g.pointers())==P
+    assert g.lastw==g.ordinal(ptr(y))
+    assert m(x)==0x12345678
+    assert not m.has(y) and len(m.conds)==0
+
+def test_rollback_memory(m,x,y,monkeypatch):
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    m.clear()
+    m[mem(cst(0x1000,32),32,endian=-1)] = x
+    m.mmap.write(0x2000,b"AAAA")
+    before = m.mmap.read(0,0x3000)
+    z = m.mmap._zones[None]
+    c = m.mmap.copy()
+    r = ext("REG",size=32,mmio_r=True)
+    r.stub = lambda env,**kargs: cst(0x55,32)
+    class bad(object):
+        address = cst(0,32)
+        def __call__(self,m):
+            m[mem(cst(0x1001,32),16)] = cst(0xbeef,16)
+            m[mem(y,32)] = x
+            m[mem(cst(0x2000,32),32)] = r
+            raise ValueError
+    # zone None is shared with c:
+    with pytest.raises(ValueError):
+        m.safe_update(bad())
+    assert m.mmap._zones[None] is z and z._refs==1
+    assert y not in m.mmap._zones
+    assert m.mmap.mmio_at(0x2000)==[]
+    assert m.mmap.read(0,0x3000)==before
+    # zone None is not shared anymore, old parts are written back:
+    c.write(0, b"B")
+    assert z._refs==0
+    with pytest.raises(ValueError):
+        m.safe_update(bad())
+    assert m.mmap._zones[None] is z
+    assert m(mem(cst(0x1000,32),32,endian=-1))==x
+    assert m.mmap.mmio_at(0x2000)==[]
+    assert m[mem(cst(0x2000,32),32)]==0x41414141
+
+def test_mmio(m,a,monkeypatch):
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    m.clear()
+    W = []
+    m.mmap.mmio_map(0x1000, 4, read=lambda m_, a_, l: cst(0x11223344,32),
+                    write=lambda m_, a_, v: W.append(v))
+    m[mem(cst(0x1000,32),32)] = cst(0xdeadbeef,32)
+    assert W==[0xdeadbeef]
+    assert m.mmap.read(cst(0x1000,32),4)[0]._is_def==0
+    assert m(mem(cst(0x1000,32),32))==0x11223344
+    assert m(mem(cst(0x1002,32),8))==0x22
+    x = m(mem(cst(0xffe,32),32))
+    assert x[16:32]==0x3344
+    assert m(mem(cst(0x1004,32),32))._is_mem
+    m.mmap.mmio_unmap(0x1000)
+    assert m.mmap.mmio_at(0x1000)==[]
+    n = len(W)
+    m[mem(cst(0x1000,32),32)] = cst(0xdeadbeef,32)
+    assert len(W)==n
+    assert m(mem(cst(0x1000,32),32))==0xdeadbeef
+    assert m.mmap.mmio_at(a)==[]
+
+def test_mmio_ext(m,monkeypatch):
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    m.clear()
+    x = ext("REG",size=32,mmio_r=True)
+    x.stub = lambda env,**kargs: cst(0x55,32)
+    m.mmap.write(0x2000,x)
+    assert m.mmap.mmio_at(0x2000)!=[]
+    assert m[mem(cst(0x2000,32),32)]==0x55
+    C = m.mmap.copy()
+    # a write that overlaps the ext removes its MMIO region:
+    m[mem(cst(0x2002,32),8)] = cst(0xaa,8)
+    assert m.mmap.mmio_at(0x2000)==[]
+    assert m[mem(cst(0x2002,32),8)]==0xaa
+    assert C.mmio_at(0x2000)!=[]
+    # explicit regions are not removed by writes:
+    m.mmap.mmio_map(0x3000, 4, read=lambda m_, a_, l: cst(0x11223344,32))
+    m.mmap.write(0x3000,b"AAAA")
+    assert m.mmap.mmio_at(0x3000)!=[]
+
+def test_read_many(m,a,monkeypatch):
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    m.clear()
+    m.mmap.write(0x1000,b"\x01\x02\x03\x04\x05\x06\x07\x08")
+    m[mem(cst(0x1004,32),16)] = a[0:16]
+    assert m(mem(cst(0x1000,32),32))==0x04030201
+    assert m(mem(cst(0x1000,32),32,endian=-1))==0x01020304
+    A = [cst(0x1000+i,32) for i in range(0,8,2)]+[a]
+    V = m.read_many(A,16)
+    assert V[0]==0x0201
+    assert V[1]==0x0403
+    assert V[2]==a[0:16]
+    assert V[3]==0x0807
+    assert V[4]==m(mem(a,16))
+    assert m.read_many(A[:2],16,endian=-1)==[0x0102,0x0304]
+
+def test_cmapper_rollback(m,x,monkeypatch):
+    from amoco.cas.cmapper import cmapper
+    monkeypatch.setattr(conf.Cas, "noaliasing", True)
+    m.clear()
+    m.mmap.write(0x1000,b"\x01\x02\x03\x04")
+    m[x] = cst(0x12345678,32)
+    c = cmapper(m)
+    c.begin()
+    c.write(0x1000,b"AAAA")
+    c[x] = cst(0,32)
+    c[mem(cst(0x1002,32),16)] = cst(0xbeef,16)
+    c.rollback()
+    assert c.read(0x1000,4)==b"\x01\x02\x03\x04"
+    assert c(x)==0x12345678
+    c.begin()
+    c.write(0x1000,b"AAAA")
+    c.rollback()
+    c.sync()
+    assert m(mem(cst(0x1000,32),32))==0x04030201
@@ -58,3 +58,162 @@ def test_func(ploop):
     assert y.blocks==f.blocks
     assert y.support==f.support
     #assert cfg.signature(y.cfg) == sig
+
+def test_sequence_buffer(ploop):
+    p = amoco.load_program(ploop)
+    z = lsweep(p)
+    L = list(z.sequence(0x804849d))
+    assert len(L)>10
+    loc = p.cpu.cst(0x804849d,32)
+    for i in L:
+        assert i.address==loc
+        j = p.read_instruction(loc)
+        assert j.bytes==i.bytes
+        assert str(j)==str(i)
+        loc += i.length
+    assert p.read_instruction(loc) is None
+    buf = p.state.mmap.getbuffer(0x804849d)
+    D = list(p.cpu.disassemble.iter_buffer(buf[:32],0x804849d))
+    assert [i.bytes for i in D]==[i.bytes for i in L[:len(D)]]
+
+def test_mapcache(ploop,tmp_path):
+    from amoco.config import conf
+    p = amoco.load_program(ploop)
+    z = lsweep(p)
+    c = cfg.mapcache
+    c.clear()
+    n0 = cfg.node(z.getblock(0x80484ac))
+    n1 = cfg.node(z.getblock(0x80484ac))
+    m0 = n0.map
+    hits = c.hits
+    m1 = n1.map
+    assert c.hits==hits+1
+    assert m0 is not m1 and str(m0)==str(m1)
+    m1.clear()
+    assert str(cfg.node(z.getblock(0x80484ac)).map)==str(m0)
+    pc = p.cpu.PC()
+    ma = c.get(n0.data,pc)
+    assert ma(pc)==n0.map.use((pc,n0.data.address))(pc)
+    # on-disk store:
+    cachedir = conf.Code.mapcachedir
+    conf.Code.mapcachedir = str(tmp_path)
+    c.clear()
+    m2 = c.get(n0.data)
+    assert len(list(tmp_path.iterdir()))==1
+    c.clear()
+    hits = c.hits
+    m3 = c.get(n0.data)
+    assert c.hits==hits+1
+    assert str(m2)==str(m3)
+    conf.Code.mapcachedir = cachedir
+    # mappers are different in lazy flags mode:
+    k = c.key(n0.data)
+    conf.Arch.lazyflags = True
+    try:
+        assert c.key(n0.data)!=k
+    finally:
+        conf.Arch.lazyflags = False
+
+def test_lforward(ploop):
+    p = amoco.load_program(ploop)
+    z = lforward(p)
+    G = z.getcfg()
+    assert G.order()>0
+    assert G.C[0].roots()[0].data.address==p.bin.entrypoints[0]
+
+def test_func_makemap(ploop):
+    p = amoco.load_program(ploop)
+    z = lsweep(p)
+    fcfg = cfg.graph()
+    b0 = cfg.node(z.getblock(0x804849d))
+    b1 = cfg.node(z.getblock(0x80484ac))
+    b2 = cfg.node(z.getblock(0x80484d0))
+    b3 = cfg.node(z.getblock(0x80484d8))
+    for e in (cfg.link(b0,b1),cfg.link(b1,b2),cfg.link(b2,b1),cfg.link(b2,b3)):
+        fcfg.add_edge(e)
+    f = code.func(fcfg.C[0])
+    m = f.makemap()
+    assert list(f.misc["heads"].keys())==[b3]
+    assert m is f.misc["heads"][b3]
+    esp = p.cpu.esp
+    assert m(esp)==(b0.map>>b1.map>>b2.map>>b3.map)(esp)
+
+def lbackward_cfg(p, workers=0):
+    if isinstance(p,bytes):
+        p = amoco.load_program(p)
+        p.use_x86()
+    z = lbackward(p)
+    z.policy = dict(z.policy, workers=workers)
+    G = z.getcfg()
+    E = sorted(str(e) for e in G.E())
+    F = dict((v.name,v.misc["func"]) for v in G.V() if v.misc["func"])
+    return E,F
+
+def test_lbackward(sc3):
+    E,F = lbackward_cfg(sc3)
+    assert E==['blck_0x0 ---> func_0xb', 'blck_0x5 ---> func_0xb',
+               'func_0xb ---> blck_0x5', 'func_0xb ---> blck_0xa']
+    assert sorted(F.keys())==['blck_0x0','blck_0xb']
+    fmap = F['blck_0xb'].map
+    from amoco.arch.x86 import cpu_x86 as cpu
+    assert fmap(cpu.eip)==cpu.mem(cpu.esp,32)
+    assert fmap(cpu.eax)==1
+    assert F['blck_0x0'].map(cpu.eax)==1
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_lbackward_workers(sc3,sc4,method):
+    import multiprocessing as mp
+    if method not in mp.get_all_start_methods():
+        pytest.skip("no %s start method"%method)
+    old = mp.get_start_method()
+    mp.set_start_method(method,force=True)
+    try:
+        for sc in (sc3,sc4):
+            E,F = lbackward_cfg(sc)
+            Ew,Fw = lbackward_cfg(sc,workers=2)
+            assert Ew==E
+            assert sorted(Fw.keys())==sorted(F.keys())
+            for k,f in F.items():
+                assert str(Fw[k].map)==str(f.map)
+    finally:
+        mp.set_start_method(old,force=True)
+
+def test_lbackward_workers_elf(ploop):
+    # programs loaded from files hold a file handle and stubs bound
+    # to the task, workers get an image of the memory instead:
+    from amoco.sa.backward import _task_image
+    p = amoco.load_program(ploop)
+    assert loads(dumps(_task_image(p.state.mmap))).read(0x80483a0,1)
+    E,F = lbackward_cfg(p)
+    Ew,Fw = lbackward_cfg(amoco.load_program(ploop),workers=2)
+    assert Ew==E
+    assert sorted(Fw.keys())==sorted(F.keys())
+
+def test_graph_index(ploop):
+    p = amoco.load_program(ploop)
+    z = lsweep(p)
+    G = cfg.graph()
+    b0 = cfg.node(z.getblock(0x804849d))
+    b1 = cfg.node(z.getblock(0x80484ac))
+    b3 = cfg.node(z.getblock(0x80484d8))
+    G.add_edge(cfg.link(b0,b1))
+    G.add_edge(cfg.link(b1,b3))
+    assert G.get_by_name(b1.name) is b1
+    assert G.get_with_address(0x80484d0) is b1
+    assert G.callers(0x80484d8) == [b1]
+    # b2 cuts b1:
+    b2 = G.add_vertex(cfg.node(z.getblock(0x80484d0)))
+    assert b1.misc["cut"]
+    assert G.get_with_address(0x80484d0) is b2
+    assert G.get_with_address(b1.data.address+len(b1)-1) is b1
+    assert G.get_with_address(0x804849c) is None
+    assert G.callees(0x80484ac) == [b2]
+    assert G.callers(b2.data.address) == [b1]
+    assert G.callers(0x80484d8) == [b2]
+    G.remove_edge(b1.e_to(b2))
+    assert G.callers(0x80484d0) == []
+    G.remove_vertex(b0)
+    assert G.get_by_name(b0.name) is None
+    assert G.callers(0x80484ac) == []
+    assert b0 not in G
+    assert b1 in G
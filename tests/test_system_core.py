@@ -73,3 +73,285 @@ def test_pickle_memorymap(a,m):
 
 
 
+def test_icache(sc1):
+    import amoco
+    p = amoco.load_program(sc1)
+    p.use_x86()
+    i0 = p.read_instruction(0)
+    assert p.icache.misses==1
+    i1 = p.read_instruction(p.cpu.cst(0,32))
+    assert i1 is i0
+    assert p.icache.hits==1
+    i2 = p.read_instruction(2)
+    assert i2.mnemonic=='POP'
+    # overwrite 2nd byte of first instruction (jmp) with nops:
+    p.state.mmap.write(1, b'\x90')
+    assert len(p.icache)==1
+    i0 = p.read_instruction(0)
+    assert i0.mnemonic=='JMP'
+    assert i0.operands[0]==-0x70
+    assert p.read_instruction(2) is i2
+
+def test_sorted_memoryzone():
+    import random
+    from amoco.system.memory import MemoryZone, SortedMemoryZone
+    rnd = random.Random(0)
+    z0 = MemoryZone()
+    z1 = SortedMemoryZone()
+    for _ in range(500):
+        a = rnd.randrange(0,0x200)
+        if rnd.random()<0.2:
+            v = cst(rnd.randrange(1<<32),32)
+        else:
+            v = bytes(rnd.randrange(256) for _ in range(rnd.randrange(1,16)))
+        z0.write(a,v)
+        z1.write(a,v)
+        assert z1._addr==[o.vaddr for o in z1._map]
+    assert [str(o) for o in z0._map]==[str(o) for o in z1._map]
+    for a in range(0,0x220,7):
+        assert z0.locate(a)==z1.locate(a)
+        assert [str(x) for x in z0.read(a,9)]==[str(x) for x in z1.read(a,9)]
+
+def test_memorymap_cow(sc1):
+    from amoco.system.memory import MemoryMap
+    M = MemoryMap()
+    M.write(0, sc1)
+    M.write(ptr(reg('r',32)), b'AAAA')
+    C = M.copy()
+    z = M._zones[None]
+    assert C._zones[None] is z
+    assert z._refs==1
+    C.write(2, b'\x90')
+    assert C._zones[None] is not z
+    assert z._refs==0
+    assert M.read(2,1)[0]==sc1[2:3]
+    assert C.read(2,1)[0]==b'\x90'
+    # M is the only owner of zone None and writes in place:
+    M.write(3, b'\x90')
+    assert M._zones[None] is z
+    assert C.read(3,1)[0]==sc1[3:4]
+    assert C._zones[reg('r',32)] is M._zones[reg('r',32)]
+    # untouched mo objects are still shared after the first write:
+    M.write(0x25, b'\xcc')
+    M.write(0x24, b'\xcc')
+    C = M.copy()
+    C.write(0x25, b'\x90')
+    zm, zc = M._zones[None], C._zones[None]
+    assert len(zm._map)==2 and zm._map[0] is zc._map[0]
+    assert M.read(0x25,1)[0]==b'\xcc'
+    # restruct goes through copy-on-write:
+    D = M.copy()
+    M.restruct()
+    assert M._zones[None] is not D._zones[None]
+    assert len(D._zones[None]._map)==2 and len(M._zones[None]._map)==1
+    assert b"".join(D.read(0,0x26))==b"".join(M.read(0,0x26))
+    M.write(0x11, b'\x90')
+    assert D.read(0x11,1)[0]==sc1[0x11:0x12]
+    assert b"".join(C.read(0x24,2))==b'\xcc\x90'
+    import gc
+    # deleted copies release their shared zones:
+    z = M._zones[None]
+    C = M.copy()
+    assert z._refs==1
+    del C
+    # (maps are in reference cycles with their views:)
+    gc.collect()
+    assert z._refs==0
+    M.write(0x12, b'\x90')
+    assert M._zones[None] is z
+
+def test_raw_relocate_cow(rawx86, sc1):
+    p = rawx86(sc1)
+    snap = p.state.copy()
+    p.relocate(0x1000)
+    assert snap.mmap.read(0,3)[0]==sc1[:3]
+    assert p.state.mmap.read(0x1000,3)[0]==sc1[:3]
+
+def test_emul_snapshot(ploop):
+    import amoco
+    from amoco.emu import emul
+    p = amoco.load_program(ploop)
+    e = emul(p)
+    for _ in range(4):
+        e.stepi()
+    pc = p.state(p.cpu.PC())
+    sp = p.state(p.cpu.esp)
+    s = e.snapshot()
+    for _ in range(6):
+        e.stepi()
+    assert p.state(p.cpu.esp)!=sp
+    e.restore(s)
+    assert p.state(p.cpu.PC())==pc
+    assert p.state(p.cpu.esp)==sp
+    assert len(e.hist)==4
+    i = e.stepi()
+    e.restore(s)
+    assert e.stepi().address==i.address
+
+def test_lazy_segments(ploop):
+    import amoco
+    from pickle import dumps, loads
+    p = amoco.load_program(ploop)
+    m = p.state.mmap
+    z = m._zones[None]
+    assert isinstance(z._map[0].data.val, memoryview)
+    b = m.read(0x8048000, 4)[0]
+    assert b == b'\x7fELF' and isinstance(b, bytes)
+    assert 0x8048000 in m.grep(b'\x7fELF')
+    m.write(0x8048001, b'XY')
+    assert b''.join(m.read(0x8048000, 4)) == b'\x7fXYF'
+    assert isinstance(z._map[0].data.val, memoryview)
+    o = loads(dumps(z._map[-2]))
+    assert o.read(o.vaddr, 8) == z._map[-2].read(o.vaddr, 8)
+
+def test_read_instruction_parts(ploop):
+    import amoco
+    p = amoco.load_program(ploop)
+    m = p.state.mmap
+    i = p.read_instruction(0x804849e)
+    m.write(0x804849f, i.bytes[1:2])
+    assert len(m.read(0x804849e, 2))==2
+    j = p.read_instruction(0x804849e)
+    assert j.bytes==i.bytes
+
+def test_emul_concrete(sc2,rawx86):
+    from amoco.emu import emul
+    P = []
+    for concrete in (False,True):
+        p = rawx86(sc2)
+        e = emul(p)
+        if concrete:
+            e.use_concrete()
+        for _ in range(603):
+            i = e.stepi()
+        assert i.mnemonic=='Jcc'
+        e.sync()
+        P.append(p)
+    cpu = P[0].cpu
+    for r in cpu.registers:
+        assert str(P[0].state(r).simplify())==str(P[1].state(r).simplify())
+    m = cpu.mem(cpu.cst(0x1000,32),32)
+    assert P[1].state(m)==sum(range(1,101))
+    assert P[0].state(m)==P[1].state(m)
+
+def test_emul_run(sc2,rawx86):
+    from amoco.emu import emul
+    for concrete in (False,True):
+        p = rawx86(sc2)
+        cpu = p.cpu
+        e = emul(p)
+        if concrete:
+            e.use_concrete()
+        count, dt, reason = e.run(max_steps=10)
+        assert count==10 and reason=="max_steps"
+        # break at "dec ecx":
+        e.breakpoint(0x15)
+        count, dt, reason = e.run()
+        assert count==3 and reason.startswith("breakpoint")
+        e.hooks = []
+        e.watchpoint(cpu.mem(cpu.cst(0x1000,32),32))
+        count, dt, reason = e.run()
+        assert count==4 and reason.startswith("watchpoint")
+        e.sync()
+        assert p.state(cpu.mem(cpu.cst(0x1000,32),32))==sum(range(98,101))
+        e.hooks = []
+        count, dt, reason = e.run(until=lambda e,i: i.mnemonic=='Jcc')
+        assert count==4 and reason=="until"
+        count, dt, reason = e.run(until=0x18)
+        assert count==97*6 and reason=="until"
+        e.sync()
+        assert p.state(cpu.ecx)==0
+
+def test_emul_hooks(sc2,rawx86):
+    from amoco.emu import emul
+    p = rawx86(sc2)
+    cpu = p.cpu
+    e = emul(p)
+    e.use_concrete()
+    for a in range(0x100,0x140):
+        e.breakpoint(a)
+    e.ibreakpoint('DEC')
+    L = list(e.iterate())
+    assert [i.mnemonic for i in L[-2:]]==['POP','DEC']
+    e.sync()
+    assert p.state(cpu.ecx)==99
+    e.hooks.pop()
+    e.breakpoint(0xe)
+    e.watchpoint(0x1ffc)
+    count, dt, reason = e.run()
+    assert count==2 and reason=="breakpoint: (eip==0xe)"
+    count, dt, reason = e.run()
+    assert count==2 and reason=="watchpoint: M8(0x1ffc)"
+    e.hooks = []
+    count, dt, reason = e.run()
+    assert reason.startswith("EmulError")
+    e.sync()
+    assert p.state(cpu.ecx)==0
+
+@pytest.mark.parametrize("concrete",[True,False])
+def test_emul_watchpoint_first(rawx86,concrete):
+    from amoco.emu import emul
+    # mov [0x1000],eax ; mov [0x1000],eax
+    for run in (True,False):
+        p = rawx86(bytes.fromhex("a300100000"*2))
+        p.state.mmap.write(0x1000, b"\0")
+        p.state[p.cpu.eax] = p.cpu.cst(0x41,32)
+        e = emul(p)
+        e.use_concrete(concrete)
+        e.watchpoint(0x1000)
+        if run:
+            count, dt, reason = e.run()
+            assert count==1 and reason=="watchpoint: M8(0x1000)"
+        else:
+            L = list(e.iterate())
+            assert len(L)==1
+        assert e.pcvalue()==5
+
+def test_emul_watchpoint_alias(rawx86):
+    from amoco.emu import emul
+    # nop ; mov [ebx],eax
+    p = rawx86(bytes.fromhex("908903"))
+    e = emul(p)
+    e.watchpoint(0x1000)
+    f = e.hooks[0]
+    calls = []
+    def g(e, prev):
+        calls.append(prev.mnemonic)
+        return f(e, prev)
+    g.range = f.range
+    e.hooks = [g]
+    # the watchpoint is checked only after the write at symbolic address:
+    count, dt, reason = e.run(max_steps=2)
+    assert count==2 and calls==['MOV']
+
+def test_emul_concrete_rollback(rawx86):
+    from amoco.emu import emul
+    # mov esp,0x20000 ; call [0x30000]
+    p = rawx86(bytes.fromhex("bc00000200ff1500000300"))
+    cpu = p.cpu
+    e = emul(p)
+    e.use_concrete()
+    e.stepi()
+    # call pushes its return address and then raises NotConcrete when it
+    # reads the unmapped target, so it is rolled back and done symbolically:
+    e.stepi()
+    e.sync()
+    assert p.state(cpu.esp)==0x1fffc
+    assert p.state(cpu.mem(cpu.cst(0x1fffc,32),32))==0xb
+    assert str(p.state(cpu.eip))=="M32(0x30000)"
+
+def test_emul_concrete_memtrace(rawx86):
+    from amoco.emu import emul
+    # mov eax,0x41 ; mov [0x1000],eax
+    p = rawx86(bytes.fromhex("b841000000a300100000"))
+    cpu = p.cpu
+    m = cpu.mem(cpu.cst(0x1000,32),32)
+    # the initial value is traced in the mapper (conf.Cas.memtrace):
+    p.state[m] = cpu.cst(0,32)
+    e = emul(p)
+    e.use_concrete()
+    e.stepi()
+    e.stepi()
+    e.sync()
+    assert p.state.M(m)==0x41
+    assert p.state(m)==0x41
@@ -19,3 +19,48 @@ def test_parser_elf64(samples):
                 assert p.Ehdr.e_ident.ELFMAG==b'ELF'
                 assert p.Ehdr.e_ident.EI_CLASS==2
 
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_columnar(samples, use_numpy):
+    from amoco.config import conf
+    from amoco.system.elf import SymTable, RelTable, STT_FUNC
+    from amoco.system.structs import StructTable
+    if use_numpy and StructTable.use_numpy is False:
+        pytest.skip("numpy not found")
+    numpy, StructTable.use_numpy = StructTable.use_numpy, use_numpy
+    try:
+        for filename in samples:
+            if filename[-4:]!='.elf' and filename[-6:]!='.elf64':
+                continue
+            with open(filename,'rb') as f:
+                p = Elf(DataIO(f))
+                conf.System.columnar = 1
+                c = Elf(DataIO(f))
+                conf.System.columnar = 0
+            assert c.functions == p.functions
+            assert c.variables == p.variables
+            for n in (".symtab", ".dynsym"):
+                L = p.readsection(n)
+                T = c.readsection(n)
+                if not L:
+                    continue
+                assert isinstance(T,SymTable)
+                assert len(T)==len(L)
+                assert [str(s) for s in T]==[str(s) for s in L]
+                I = [i for i,s in enumerate(L) if s.st_type==STT_FUNC]
+                assert list(T.select(type=STT_FUNC))==I
+                for i in I:
+                    s = L[i]
+                    if s.st_value and s.st_size:
+                        j = T.lookup(s.st_value+s.st_size-1)
+                        assert T.value(j,"st_value") <= s.st_value+s.st_size-1
+                        assert T.lookup(s.st_value) is not None
+            for s in c.Shdr:
+                if s.sh_type in (9,4):
+                    T = c.readsection(s)
+                    assert isinstance(T,RelTable)
+                    L = p.readsection(s)
+                    assert list(T.r_sym())==[r.r_sym for r in L]
+    finally:
+        StructTable.use_numpy = numpy
+        conf.System.columnar = 0
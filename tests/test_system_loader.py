@@ -14,3 +14,15 @@ def test_loader_003(sc1):
     p = amoco.load_program(sc1)
     assert p.bin.dataio.f.getvalue() == sc1
     assert p.bin.filename == '(sc-eb165e31...)'
+
+def test_loader_registry():
+    from amoco.system.core import DefineLoader
+    from amoco.system import elf
+    assert DefineLoader.module("elf",elf.EM_386) == "amoco.system.linux32"
+    assert DefineLoader.module("elf-baremetal",elf.EM_386) is None
+    assert DefineLoader.module("raw") == "amoco.system.raw"
+    f = DefineLoader.get("elf",elf.EM_X86_64)
+    assert f is DefineLoader.LOADERS["elf"][elf.EM_X86_64]
+    assert f.__module__ == "amoco.system.linux64"
+    with pytest.raises(KeyError):
+        DefineLoader.get("elf",0xdead)
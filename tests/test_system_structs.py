@@ -263,6 +263,52 @@ def test_ptr_struct():
     assert s.offsets(psize=4) == [(0, 4), (4, 4), (8, 4)]
     assert s.offsets(psize=8) == [(0, 8), (8, 4), (16, 8)]
 
+def test_struct_codec():
+    @StructDefine("""
+    B   : a
+    I   : b
+    H*3 : c
+    c*4 : d
+    Q   : e
+    s*3 : f
+    """)
+    class stru_codec(StructCore):
+        pass
+    data = bytes(range(40))
+    s = stru_codec()
+    S, plan = s.codec()
+    assert S.size == 35
+    s.unpack(data, 2)
+    # check against fields' own unpacking:
+    o = 2
+    for f in s.fields:
+        o = f.align(o - 2) + 2
+        assert s[f.name] == f.unpack(data, o)
+        o += f.size()
+    assert s.e == int.from_bytes(data[26:34], "little")
+    # the container class is shared and has slots for fields names:
+    t = stru_codec()
+    assert type(t._v) is type(s._v)
+    assert "a" in type(s._v).__slots__
+    # instance fields changes produce another codec:
+    t.fields[1].typename = "Q"
+    assert t.codec()[0].size == 43
+    assert s.codec()[0].size == 35
+    # short data takes the slow path that raises the error:
+    with pytest.raises(StructureError):
+        s.unpack(data[:10])
+    # mixed byte orders have no codec:
+    t.fields[4].order = ">"
+    assert t.codec() is None
+    # a struct with non-raw fields has no codec:
+    @StructDefine("""
+    stru_codec : x
+    I*~ : y
+    """)
+    class stru_nocodec(StructCore):
+        pass
+    assert stru_nocodec().codec() is None
+
 def test_bindedfield():
     @StructDefine("""
     I          : counter